@@ -0,0 +1,78 @@
+import asyncio
+import logging
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, Tuple
+
+logger = logging.getLogger(__name__)
+
+Job = Callable[[], Awaitable]
+
+
+class InboxFull(Exception):
+    pass
+
+
+class RoomActors:
+    """Runs the work for each room one job at a time, in arrival order.
+
+    Handlers await emits and storage in the middle of read-modify-write
+    sequences, so two events for one room could otherwise interleave. Every
+    room gets a bounded inbox drained by its own task; the task exits once
+    the inbox is empty, so idle rooms hold no task, and a slow room never
+    delays another. No locks: a room's state is only touched by its drainer.
+    """
+
+    def __init__(self, max_inbox: int = 256):
+        self.max_inbox = max_inbox
+        self.inboxes: Dict[str, Deque[Tuple[Job, asyncio.Future]]] = {}
+        self.drainers: Dict[str, asyncio.Task] = {}
+        self.overflows = 0
+
+    def __len__(self) -> int:
+        return len(self.inboxes)
+
+    def submit(self, room_id: str, job: Job) -> asyncio.Future:
+        """Queue a job for a room; the future resolves with its result"""
+        inbox = self.inboxes.get(room_id)
+        if inbox is None:
+            inbox = self.inboxes[room_id] = deque()
+            self.drainers[room_id] = asyncio.create_task(self._drain(room_id, inbox))
+        elif len(inbox) >= self.max_inbox:
+            self.overflows += 1
+            raise InboxFull(room_id)
+        future = asyncio.get_running_loop().create_future()
+        inbox.append((job, future))
+        return future
+
+    async def run(self, room_id: str, job: Job):
+        """Run a job in the room's order and wait for it"""
+        if self.drainers.get(room_id) is asyncio.current_task():
+            # Already running as this room's actor - queueing would deadlock
+            return await job()
+        return await self.submit(room_id, job)
+
+    def post(self, room_id: str, job: Job):
+        """Queue a job without waiting; failures are logged"""
+        self.submit(room_id, job).add_done_callback(self._log_failure)
+
+    @staticmethod
+    def _log_failure(future: asyncio.Future):
+        if not future.cancelled() and future.exception() is not None:
+            logger.error("Room job failed", exc_info=future.exception())
+
+    async def _drain(self, room_id: str, inbox: Deque[Tuple[Job, asyncio.Future]]):
+        try:
+            while inbox:
+                job, future = inbox.popleft()
+                try:
+                    result = await job()
+                except Exception as e:
+                    if not future.done():
+                        future.set_exception(e)
+                else:
+                    if not future.done():
+                        future.set_result(result)
+        finally:
+            # Nothing awaits between the empty check and here, so no job can be stranded
+            del self.inboxes[room_id]
+            del self.drainers[room_id]
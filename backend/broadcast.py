@@ -0,0 +1,52 @@
+from collections import OrderedDict
+from typing import Callable, Hashable, List
+
+from engineio import packet as eio_packet
+from socketio import packet
+
+
+class FrameCache:
+    """Encoded Socket.IO frames keyed by the state they were built from.
+
+    Room broadcasts are already encoded once by the client manager, but
+    snapshots sent to a single socket (room_state on join, catch-up patches)
+    are not. With many viewers joining the same room those are identical, so
+    the encoded frame is kept and written straight to each Engine.IO socket.
+    """
+
+    def __init__(self, sio, max_entries: int = 1024):
+        self.sio = sio
+        self.max_entries = max_entries
+        self.frames: "OrderedDict[Hashable, List[eio_packet.Packet]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def _encode(self, key: Hashable, event: str, build: Callable[[], object]) -> List[eio_packet.Packet]:
+        frames = self.frames.get(key)
+        if frames is not None:
+            self.hits += 1
+            self.frames.move_to_end(key)
+            return frames
+        self.misses += 1
+        encoded = self.sio.packet_class(packet.EVENT, namespace='/', data=[event, build()]).encode()
+        if not isinstance(encoded, list):
+            encoded = [encoded]
+        frames = self.frames[key] = [eio_packet.Packet(eio_packet.MESSAGE, p) for p in encoded]
+        if len(self.frames) > self.max_entries:
+            self.frames.popitem(last=False)
+        return frames
+
+    async def send(self, sid: str, key: Hashable, event: str, build: Callable[[], object]):
+        """Send `event` to one socket, reusing the frame cached under `key`"""
+        eio_sid = self.sio.manager.eio_sid_from_sid(sid, '/')
+        if eio_sid is None:
+            # Attached to another worker - let the client manager deliver it
+            await self.sio.emit(event, build(), to=sid)
+            return
+        for frame in self._encode(key, event, build):
+            await self.sio.eio.send_packet(eio_sid, frame)
+
+    def forget(self, room_id: str):
+        # Keys start with the room id
+        for key in [k for k in self.frames if k[0] == room_id]:
+            del self.frames[key]
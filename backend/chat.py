@@ -0,0 +1,124 @@
+import asyncio
+import logging
+from typing import List, Optional, Tuple
+
+from bson import ObjectId
+from bson.errors import InvalidId
+
+logger = logging.getLogger(__name__)
+
+DUPLICATE_KEY = 11000
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class ChatLog:
+    """Chat messages, queued in memory and inserted into MongoDB in batches.
+
+    Messages are not kept on the room; clients page through them newest
+    first with an opaque cursor. The cursor is the timestamp and _id of the
+    oldest message on the previous page, so a page is one range scan on the
+    (room_id, timestamp) index even when timestamps collide.
+    """
+
+    def __init__(self, collection, interval: float = 0.5):
+        self.collection = collection
+        self.interval = interval
+        self.pending: List[dict] = []
+        self._task: Optional[asyncio.Task] = None
+
+    def append(self, room_id: str, message: dict):
+        # _id is assigned up front so unflushed messages already have a cursor position
+        self.pending.append({"_id": ObjectId(), "room_id": room_id, **message})
+
+    async def flush(self) -> int:
+        if not self.pending:
+            return 0
+        from pymongo.errors import BulkWriteError
+
+        batch, self.pending = self.pending, []
+        try:
+            await self.collection.insert_many(batch, ordered=False)
+        except BulkWriteError as e:
+            # Unordered, so everything else went in. A duplicate _id means an
+            # earlier attempt already stored that message; retry only the rest.
+            failed = [batch[err["index"]] for err in e.details["writeErrors"] if err["code"] != DUPLICATE_KEY]
+            self.pending = failed + self.pending
+            if failed:
+                raise
+            return len(batch)
+        except Exception:
+            self.pending = batch + self.pending
+            raise
+        return len(batch)
+
+    @staticmethod
+    def encode_cursor(message: dict) -> str:
+        return f"{message['timestamp']}~{message['_id']}"
+
+    @staticmethod
+    def decode_cursor(cursor: str) -> Tuple[str, ObjectId]:
+        timestamp, _, oid = cursor.rpartition("~")
+        try:
+            return timestamp, ObjectId(oid)
+        except (InvalidId, TypeError):
+            raise InvalidCursor(cursor)
+
+    async def page(self, room_id: str, before: Optional[str] = None, limit: int = 50) -> dict:
+        """Up to `limit` messages older than the cursor, returned oldest first"""
+        query = {"room_id": room_id}
+        position = None
+        if before is not None:
+            position = self.decode_cursor(before)
+            timestamp, oid = position
+            query["$or"] = [
+                {"timestamp": {"$lt": timestamp}},
+                {"timestamp": timestamp, "_id": {"$lt": oid}}
+            ]
+        # One extra document tells whether there is another page
+        stored = await self.collection.find(query, {"room_id": 0}) \
+            .sort([("timestamp", -1), ("_id", -1)]).limit(limit + 1).to_list(None)
+        unflushed = [
+            {k: v for k, v in m.items() if k != "room_id"} for m in self.pending
+            if m["room_id"] == room_id and (position is None or (m["timestamp"], m["_id"]) < position)
+        ]
+        if unflushed:
+            stored = sorted(stored + unflushed, key=lambda m: (m["timestamp"], m["_id"]), reverse=True)
+        messages = stored[:limit]
+        next_cursor = self.encode_cursor(messages[-1]) if len(stored) > limit else None
+        messages.reverse()
+        for message in messages:
+            message["id"] = str(message.pop("_id"))
+        return {"messages": messages, "next_cursor": next_cursor}
+
+    async def ensure_indexes(self):
+        # _id settles ties between equal timestamps without an in-memory sort
+        await self.collection.create_index([("room_id", 1), ("timestamp", 1), ("_id", 1)])
+
+    async def run(self):
+        try:
+            await self.ensure_indexes()
+        except Exception:
+            logger.exception("Could not create chat indexes")
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Failed to persist chat messages")
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
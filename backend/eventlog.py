@@ -0,0 +1,149 @@
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional
+
+from game_room import GameRoom
+
+logger = logging.getLogger(__name__)
+
+DUPLICATE_KEY = 11000
+
+
+def replay(snapshot: dict, events: Iterable[dict], until: Optional[int] = None) -> GameRoom:
+    """Rebuild a room from a snapshot and the events recorded after it"""
+    room = GameRoom.from_snapshot(snapshot)
+    for event in events:
+        if event["version"] <= room.version:
+            continue
+        if until is not None and event["version"] > until:
+            break
+        if event["version"] != room.version + 1:
+            logger.warning(f"Event log of room {room.room_id} has a gap after version {room.version}")
+            break
+        room.apply_op(event)
+    return room
+
+
+class EventLog:
+    """Append-only log of room state changes, written to MongoDB in batches.
+
+    Every versioned op a room records (see GameRoom._record) is an event;
+    broadcast_patch hands each drained patch to append(). A full snapshot is
+    stored every `snapshot_every` versions so a replay starts from the nearest
+    one instead of the first event. Positions are not events - they come from
+    the snapshot - and chat is stored separately (see chat.ChatLog).
+    """
+
+    def __init__(self, events, snapshots, interval: float = 0.5, snapshot_every: int = 100):
+        self.events = events
+        self.snapshots = snapshots
+        self.interval = interval
+        self.snapshot_every = snapshot_every
+        self.pending: List[dict] = []
+        self.pending_snapshots: List[dict] = []
+        self.snapshot_versions: Dict[str, int] = {}  # room_id -> version of the last snapshot taken
+        self._task: Optional[asyncio.Task] = None
+
+    def append(self, room: GameRoom, patch: Optional[dict]):
+        if patch:
+            now = datetime.now(timezone.utc).isoformat()
+            for version, op in enumerate(patch["ops"], patch["base"] + 1):
+                self.pending.append({"room_id": room.room_id, "version": version, "at": now, **op})
+        last = self.snapshot_versions.get(room.room_id)
+        if last is None or room.version - last >= self.snapshot_every:
+            self.snapshot_versions[room.room_id] = room.version
+            self.pending_snapshots.append(
+                {"room_id": room.room_id, "version": room.version, "state": room.to_snapshot()})
+
+    def forget(self, room_id: str):
+        # The next owner takes a fresh snapshot when it first appends
+        self.snapshot_versions.pop(room_id, None)
+
+    async def _insert(self, collection, docs: List[dict]):
+        from pymongo.errors import BulkWriteError
+
+        try:
+            await collection.insert_many(docs, ordered=False)
+        except BulkWriteError as e:
+            # A retried batch may already be partly stored; (room_id, version) is unique
+            if any(err["code"] != DUPLICATE_KEY for err in e.details["writeErrors"]):
+                raise
+
+    async def flush(self) -> int:
+        events, self.pending = self.pending, []
+        snapshots, self.pending_snapshots = self.pending_snapshots, []
+        try:
+            if snapshots:
+                await self._insert(self.snapshots, snapshots)
+            if events:
+                await self._insert(self.events, events)
+        except Exception:
+            self.pending = events + self.pending
+            self.pending_snapshots = snapshots + self.pending_snapshots
+            raise
+        return len(events)
+
+    async def history(self, room_id: str, after: int, until: Optional[int] = None) -> List[dict]:
+        """Events of a room after a version, including ones not flushed yet"""
+        query = {"room_id": room_id, "version": {"$gt": after}}
+        if until is not None:
+            query["version"]["$lte"] = until
+        stored = await self.events.find(query, {"_id": 0}).sort("version", 1).to_list(None)
+        last = stored[-1]["version"] if stored else after
+        stored.extend(e for e in self.pending if e["room_id"] == room_id and e["version"] > last
+                      and (until is None or e["version"] <= until))
+        return stored
+
+    async def fast_forward(self, snapshot: dict) -> dict:
+        """Apply the events logged after a (possibly stale) room snapshot"""
+        events = await self.history(snapshot["room_id"], snapshot["version"])
+        if not events:
+            return snapshot
+        logger.info(f"Replaying {len(events)} events onto room {snapshot['room_id']} from version {snapshot['version']}")
+        return replay(snapshot, events).to_snapshot()
+
+    async def load(self, room_id: str, version: Optional[int] = None) -> Optional[GameRoom]:
+        """Rebuild a room as of `version` (the latest logged state by default)"""
+        query = {"room_id": room_id}
+        if version is not None:
+            query["version"] = {"$lte": version}
+        snapshot = await self.snapshots.find_one(query, {"_id": 0}, sort=[("version", -1)])
+        if snapshot is None:
+            pending = [s for s in self.pending_snapshots if s["room_id"] == room_id
+                       and (version is None or s["version"] <= version)]
+            if not pending:
+                return None
+            snapshot = pending[-1]
+        events = await self.history(room_id, snapshot["version"], version)
+        return replay(snapshot["state"], events, version)
+
+    async def ensure_indexes(self):
+        await self.events.create_index([("room_id", 1), ("version", 1)], unique=True)
+        await self.snapshots.create_index([("room_id", 1), ("version", -1)])
+
+    async def run(self):
+        try:
+            await self.ensure_indexes()
+        except Exception:
+            logger.exception("Could not create event log indexes")
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Failed to write room events")
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
@@ -0,0 +1,358 @@
+import math
+import os
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from geometry import Rect, SpatialHash
+from puzzles import RoomDefinition, load_room_definitions
+
+# Number of recent state ops kept per room so reconnecting clients can catch up with a delta
+PATCH_HISTORY = int(os.environ.get('PATCH_HISTORY', '64'))
+# A player covers at most MAX_MOVE_SPEED px/s, and can bank up to MOVE_BURST px
+# to absorb packets that arrive bunched up; 0 disables the check
+MAX_MOVE_SPEED = float(os.environ.get('MAX_MOVE_SPEED', '300'))
+MOVE_BURST = float(os.environ.get('MOVE_BURST', '120'))
+
+
+def json_pointer(*parts) -> str:
+    return ''.join('/' + str(p).replace('~', '~0').replace('/', '~1') for p in parts)
+
+
+# Room templates - static data shared by every room of a type, keyed by room type
+ROOM_DEFINITIONS: Dict[str, RoomDefinition] = load_room_definitions(os.environ.get('ROOM_DEFINITIONS_DIR'))
+DEFAULT_ROOM_TYPE = os.environ.get('DEFAULT_ROOM_TYPE', 'locked_study')
+
+
+class Player:
+    __slots__ = ("id", "name", "x", "y", "color", "is_host", "sid", "disconnected", "move_budget", "moved_at")
+
+    def __init__(self, player_id: str, name: str, x: float, y: float, color: str, is_host: bool,
+                 sid: Optional[str] = None, disconnected: bool = False):
+        self.id = player_id
+        self.name = name
+        self.x = x
+        self.y = y
+        self.color = color
+        self.is_host = is_host
+        self.sid = sid
+        self.disconnected = disconnected
+        # Distance the player may still move, refilled over time (see move_player)
+        self.move_budget = MOVE_BURST
+        self.moved_at = time.monotonic()
+
+    @property
+    def position(self) -> dict:
+        return {"x": self.x, "y": self.y}
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "name": self.name,
+            "position": {"x": self.x, "y": self.y},
+            "color": self.color,
+            "is_host": self.is_host,
+            "sid": self.sid,
+            "disconnected": self.disconnected
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Player":
+        return cls(data["id"], data["name"], data["position"]["x"], data["position"]["y"],
+                   data["color"], data["is_host"], data.get("sid"), data.get("disconnected", False))
+
+
+# Game State Management
+class GameRoom:
+    __slots__ = (
+        "room_id", "host_id", "definition", "players", "status", "created_at", "inventory",
+        "secrets", "progress", "solved", "flags",
+        "version", "pending_ops", "op_history", "last_activity", "disconnected_since", "motion", "grid",
+        "seq"
+    )
+
+    def __init__(self, room_id: str, host_id: str, definition: Optional[RoomDefinition] = None):
+        self.room_id = room_id
+        self.host_id = host_id
+        self.definition = definition or ROOM_DEFINITIONS[DEFAULT_ROOM_TYPE]
+        self.players: Dict[str, Player] = {}
+        self.status = "lobby"  # lobby, playing, won
+        self.created_at = datetime.now(timezone.utc)
+        self.inventory: List[str] = []  # Shared inventory
+        self.secrets: Dict[str, str] = {name: secret.generate() for name, secret in self.definition.secrets.items()}
+        self.progress: Dict[str, int] = dict.fromkeys(self.definition.pieces, 0)  # one bit per placed piece
+        self.solved = 0  # definition.puzzle_bits
+        self.flags = 0  # definition.flag_bits
+        # Every recorded op bumps the version by exactly one
+        self.version = 0
+        self.pending_ops: List[dict] = []
+        self.op_history: Optional[deque] = None  # (version, op)
+        self.last_activity = time.monotonic()
+        self.disconnected_since: Dict[str, float] = {}  # player_id -> monotonic time
+        self.motion = 0  # bumped on every accepted move, which the version does not track
+        self.grid: Optional[SpatialHash] = None  # player positions, built on the first spatial query
+        self.seq = 0  # stamped on every event broadcast to the room, so clients can spot gaps
+
+    # Read access
+    def is_solved(self, puzzle_id: str) -> bool:
+        return bool(self.solved & self.definition.puzzle_bits[puzzle_id])
+
+    def object_flag(self, object_id: str, flag: str) -> bool:
+        return bool(self.flags & self.definition.flag_bits[object_id][flag])
+
+    def object_clue(self, object_id: str) -> Optional[str]:
+        clue = self.definition.objects[object_id].clue
+        if clue is None:
+            return None
+        secrets = self.definition.secrets
+        return clue.format(**{name: secrets[name].display(value) for name, value in self.secrets.items()})
+
+    def pieces(self, puzzle_id: str) -> List[bool]:
+        mask = self.progress[puzzle_id]
+        return [bool(mask & (1 << i)) for i in range(self.definition.pieces[puzzle_id])]
+
+    # Versioned mutations - paths are JSON pointers into to_dict()
+    def _record(self, op: str, path: str, value=None):
+        self.version += 1
+        entry = {"op": op, "path": path}
+        if op != "remove":
+            entry["value"] = value
+        self.pending_ops.append(entry)
+        if self.op_history is None:
+            self.op_history = deque(maxlen=PATCH_HISTORY)
+        self.op_history.append((self.version, entry))
+
+    def set_status(self, status: str):
+        if self.status != status:
+            self.status = status
+            self._record("replace", "/status", status)
+
+    def add_item(self, item_id: str):
+        self.inventory.append(item_id)
+        self._record("add", "/inventory/-", item_id)
+
+    def remove_item(self, item_id: str):
+        index = self.inventory.index(item_id)
+        del self.inventory[index]
+        self._record("remove", json_pointer("inventory", index))
+
+    def set_solved(self, puzzle_id: str):
+        bit = self.definition.puzzle_bits[puzzle_id]
+        if not self.solved & bit:
+            self.solved |= bit
+            self._record("replace", json_pointer("puzzle_states", puzzle_id, "solved"), True)
+
+    def set_object_flag(self, object_id: str, flag: str, value: bool = True):
+        bit = self.definition.flag_bits[object_id][flag]
+        if bool(self.flags & bit) == value:
+            return
+        self.flags = self.flags | bit if value else self.flags & ~bit
+        op = "replace" if flag in self.definition.objects[object_id].flags else "add"
+        self._record(op, json_pointer("objects_state", object_id, flag), value)
+
+    def place_piece(self, puzzle_id: str, index: int) -> int:
+        """Returns the mask of placed pieces"""
+        mask = self.progress[puzzle_id]
+        if not mask & (1 << index):
+            mask = self.progress[puzzle_id] = mask | 1 << index
+            self._record("replace", json_pointer("progress", puzzle_id), mask)
+        return mask
+
+    def add_player(self, player: Player):
+        self.players[player.id] = player
+        if self.grid is not None:
+            self.grid.move(player.id, player.x, player.y)
+        self._record("add", json_pointer("players", player.id), player.to_dict())
+
+    def remove_player(self, player_id: str):
+        del self.players[player_id]
+        if self.grid is not None:
+            self.grid.remove(player_id)
+        self._record("remove", json_pointer("players", player_id))
+
+    def update_player(self, player_id: str, **fields):
+        # Positions are streamed by the movement ticker and are not versioned
+        player = self.players[player_id]
+        for key, value in fields.items():
+            if getattr(player, key) == value:
+                continue
+            setattr(player, key, value)
+            self._record("replace", json_pointer("players", player_id, key), value)
+
+    def move_player(self, player_id: str, position: dict) -> bool:
+        player = self.players.get(player_id)
+        if player is None or not isinstance(position, dict):
+            return False
+        x = position.get("x", player.x)
+        y = position.get("y", player.y)
+        if not all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in (x, y)):
+            return False
+        layout = self.definition.layout
+        if layout is not None:
+            x, y = layout.clamp(x, y)
+        if MAX_MOVE_SPEED > 0:
+            # Otherwise one packet could put a player next to any object
+            now = time.monotonic()
+            budget = min(MOVE_BURST, player.move_budget + (now - player.moved_at) * MAX_MOVE_SPEED)
+            player.moved_at = now
+            dx, dy = x - player.x, y - player.y
+            distance = math.hypot(dx, dy)
+            if distance > budget:
+                # Go as far towards the target as the player could have
+                if budget <= 0:
+                    player.move_budget = 0.0
+                    return False
+                x, y = player.x + dx * budget / distance, player.y + dy * budget / distance
+                distance = budget
+            player.move_budget = budget - distance
+        player.x = x
+        player.y = y
+        self.motion += 1
+        if self.grid is not None:
+            self.grid.move(player_id, x, y)
+        return True
+
+    # Spatial checks - positions come from the server's copy, not the client's claim
+    def player_grid(self) -> SpatialHash:
+        if self.grid is None:
+            layout = self.definition.layout
+            self.grid = SpatialHash(layout.cell_size if layout is not None else 100)
+            for player in self.players.values():
+                self.grid.move(player.id, player.x, player.y)
+        return self.grid
+
+    def players_in(self, rect: Rect) -> List[str]:
+        """Connected players standing inside rect"""
+        players = self.players
+        return [
+            pid for pid in self.player_grid().query(rect)
+            if not players[pid].disconnected and rect.contains(players[pid].x, players[pid].y)
+        ]
+
+    def in_reach(self, player_id: str, object_id: str) -> bool:
+        layout = self.definition.layout
+        if layout is None:
+            return True
+        player = self.players[player_id]
+        return layout.in_reach(player.x, player.y, object_id)
+
+    def apply_op(self, op: dict):
+        """Replay a recorded op onto the room - the inverse of the mutations above"""
+        keys = [k.replace('~1', '/').replace('~0', '~') for k in op["path"].split('/')[1:]]
+        kind, value = op["op"], op.get("value")
+        if keys[0] == "status":
+            self.status = value
+        elif keys[0] == "progress":
+            self.progress[keys[1]] = value
+        elif keys[0] == "inventory":
+            if kind == "remove":
+                del self.inventory[int(keys[1])]
+            else:
+                self.inventory.append(value)
+        elif keys[0] == "puzzle_states":
+            self.solved |= self.definition.puzzle_bits[keys[1]]
+        elif keys[0] == "objects_state":
+            bit = self.definition.flag_bits[keys[1]][keys[2]]
+            self.flags = self.flags | bit if value else self.flags & ~bit
+        elif keys[0] == "players":
+            if kind == "remove":
+                del self.players[keys[1]]
+            elif len(keys) == 2:
+                self.players[keys[1]] = Player.from_dict(value)
+            else:
+                setattr(self.players[keys[1]], keys[2], value)
+            self.grid = None  # rebuilt on the next spatial query
+        else:
+            raise ValueError(f"Cannot replay op on {op['path']}")
+        self.version += 1
+
+    def drain_patch(self) -> Optional[dict]:
+        if not self.pending_ops:
+            return None
+        ops, self.pending_ops = self.pending_ops, []
+        return {"base": self.version - len(ops), "version": self.version, "ops": ops}
+
+    def patch_since(self, version: int) -> Optional[dict]:
+        """Delta from a client's known version, or None if it fell out of the history window"""
+        if version > self.version:
+            return None
+        if version == self.version:
+            return {"base": version, "version": version, "ops": []}
+        if not self.op_history or self.op_history[0][0] > version + 1:
+            return None
+        ops = [op for v, op in self.op_history if v > version]
+        return {"base": version, "version": self.version, "ops": ops}
+
+    def next_seq(self) -> int:
+        self.seq += 1
+        return self.seq
+
+    def to_snapshot(self) -> dict:
+        """Full internal state, used to hand a room over to another worker"""
+        return {
+            "room_id": self.room_id,
+            "host_id": self.host_id,
+            "room_type": self.definition.room_type,
+            "players": [p.to_dict() for p in self.players.values()],
+            "status": self.status,
+            "created_at": self.created_at.isoformat(),
+            "inventory": list(self.inventory),
+            "secrets": dict(self.secrets),
+            "progress": dict(self.progress),
+            "solved": self.solved,
+            "flags": self.flags,
+            "version": self.version,
+            "seq": self.seq
+        }
+
+    @classmethod
+    def from_snapshot(cls, data: dict) -> "GameRoom":
+        room = cls(data["room_id"], data["host_id"], ROOM_DEFINITIONS[data.get("room_type", DEFAULT_ROOM_TYPE)])
+        room.players = {p["id"]: Player.from_dict(p) for p in data["players"]}
+        room.status = data["status"]
+        room.created_at = datetime.fromisoformat(data["created_at"])
+        room.inventory = list(data["inventory"])
+        if "secrets" in data:
+            room.secrets = dict(data["secrets"])
+            room.progress = dict(data["progress"])
+        else:
+            # Snapshots written before secrets and progress were generic
+            room.secrets = {"code": data["code"], "combination": data["combination"]}
+            room.progress = {"jigsaw": data["jigsaw"]}
+        room.solved = data["solved"]
+        room.flags = data["flags"]
+        # History is not carried over; clients behind this version resync in full
+        room.version = data["version"]
+        room.seq = data.get("seq", 0)
+        return room
+
+    def to_dict(self) -> dict:
+        objects_state = {}
+        for oid, obj in self.definition.objects.items():
+            bits = self.definition.flag_bits[oid]
+            state = {flag: bool(self.flags & bits[flag]) for flag in obj.flags}
+            # Flags outside the template only show up once they have been set
+            for flag, bit in bits.items():
+                if flag not in state and self.flags & bit:
+                    state[flag] = True
+            if obj.clue is not None:
+                state["clue"] = self.object_clue(oid)
+            if obj.contains is not None:
+                state["contains"] = obj.contains
+            if obj.hidden_message is not None:
+                state["hidden_message"] = obj.hidden_message
+            objects_state[oid] = state
+
+        return {
+            "room_id": self.room_id,
+            "host_id": self.host_id,
+            "room_type": self.definition.room_type,
+            "players": {pid: p.to_dict() for pid, p in self.players.items()},
+            "status": self.status,
+            "inventory": self.inventory,
+            "puzzle_states": {pid: {"solved": bool(self.solved & bit)} for pid, bit in self.definition.puzzle_bits.items()},
+            "objects_state": objects_state,
+            "progress": dict(self.progress),
+            "version": self.version
+        }
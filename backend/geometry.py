@@ -0,0 +1,100 @@
+import math
+from typing import Dict, Iterator, NamedTuple, Optional, Set, Tuple
+
+Cell = Tuple[int, int]
+
+
+class Rect(NamedTuple):
+    x: float
+    y: float
+    width: float
+    height: float
+
+    @property
+    def center(self) -> Tuple[float, float]:
+        return self.x + self.width / 2, self.y + self.height / 2
+
+    def contains(self, x: float, y: float) -> bool:
+        return self.x <= x <= self.x + self.width and self.y <= y <= self.y + self.height
+
+
+class SpatialHash:
+    """Uniform grid of points, moved incrementally.
+
+    A move only touches the index when the point crosses into another cell,
+    and a query visits the cells a rectangle overlaps - a handful for the
+    interaction-sized areas queried here - whatever the number of points.
+    """
+
+    def __init__(self, cell_size: float):
+        self.cell_size = cell_size
+        self.cells: Dict[Cell, Set[str]] = {}
+        self.where: Dict[str, Cell] = {}
+
+    def __len__(self) -> int:
+        return len(self.where)
+
+    def _cell(self, x: float, y: float) -> Cell:
+        return int(x // self.cell_size), int(y // self.cell_size)
+
+    def move(self, key: str, x: float, y: float):
+        cell = self._cell(x, y)
+        previous = self.where.get(key)
+        if previous == cell:
+            return
+        if previous is not None:
+            self._leave(key, previous)
+        self.where[key] = cell
+        self.cells.setdefault(cell, set()).add(key)
+
+    def remove(self, key: str):
+        cell = self.where.pop(key, None)
+        if cell is not None:
+            self._leave(key, cell)
+
+    def _leave(self, key: str, cell: Cell):
+        members = self.cells[cell]
+        members.discard(key)
+        if not members:
+            del self.cells[cell]
+
+    def query(self, rect: Rect) -> Iterator[str]:
+        """Keys in the cells the rectangle overlaps; callers check exact bounds"""
+        x0, y0 = self._cell(rect.x, rect.y)
+        x1, y1 = self._cell(rect.x + rect.width, rect.y + rect.height)
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                yield from self.cells.get((cx, cy), ())
+
+
+class RoomLayout(NamedTuple):
+    """Static geometry of a room definition, in canvas pixels"""
+    width: float
+    height: float
+    reach: float  # max distance from a player to an object's center to use it
+    cell_size: float
+    objects: Dict[str, Rect]
+    plates: Dict[str, Rect]  # area a player has to stand in to press each plate
+
+    def clamp(self, x: float, y: float) -> Tuple[float, float]:
+        return min(max(x, 0), self.width), min(max(y, 0), self.height)
+
+    def in_reach(self, x: float, y: float, object_id: str) -> bool:
+        rect = self.objects.get(object_id)
+        if rect is None:
+            return True  # not placed on the map
+        cx, cy = rect.center
+        return math.hypot(x - cx, y - cy) <= self.reach
+
+
+def load_layout(spec: Optional[dict], objects: Dict[str, dict]) -> Optional[RoomLayout]:
+    if spec is None:
+        return None
+    return RoomLayout(
+        width=spec["width"],
+        height=spec["height"],
+        reach=spec["reach"],
+        cell_size=spec.get("cell_size", 100),
+        objects={oid: Rect(*o["bounds"]) for oid, o in objects.items() if "bounds" in o},
+        plates={pid: Rect(*bounds) for pid, bounds in spec.get("plates", {}).items()}
+    )
@@ -0,0 +1,100 @@
+import logging
+import secrets
+import string
+from collections import deque
+from datetime import datetime, timezone
+from typing import Callable, Container, Deque, List
+
+logger = logging.getLogger(__name__)
+
+ALPHABET = string.digits + string.ascii_lowercase
+DUPLICATE_KEY = 11000
+
+
+class RoomIdsExhausted(Exception):
+    pass
+
+
+def random_id(length: int) -> str:
+    """Uniform base-36 id from the OS CSPRNG"""
+    n = secrets.randbelow(36 ** length)
+    chars = []
+    for _ in range(length):
+        n, digit = divmod(n, 36)
+        chars.append(ALPHABET[digit])
+    return ''.join(chars)
+
+
+def player_id_for(taken: Container[str], length: int = 8) -> str:
+    """Player ids only have to be unique within their room"""
+    player_id = random_id(length)
+    while player_id in taken:
+        player_id = random_id(length)
+    return player_id
+
+
+class RoomIdAllocator:
+    """Hands out room ids that are unique across every worker and restart.
+
+    Ids are random, so they reveal nothing about how many rooms exist, and
+    uniqueness comes from reserving them in a MongoDB collection keyed by
+    _id. Reservations are made `batch` at a time for ids this worker owns on
+    the shard ring; allocate() pops from that pool, so a create costs one
+    round trip per batch. Ids that lose a race to another worker are
+    rejected by the _id index and counted in `collisions`; after
+    `max_reservations` batches in a row yield nothing, allocate() gives up.
+    """
+
+    def __init__(self, collection, is_local: Callable[[str], bool], length: int = 6, batch: int = 32,
+                 worker_id: str = "", max_reservations: int = 5):
+        self.collection = collection
+        self.is_local = is_local
+        self.length = length
+        self.batch = batch
+        self.worker_id = worker_id
+        self.max_reservations = max_reservations
+        self.pool: Deque[str] = deque()
+        self.allocated = 0
+        self.collisions = 0
+
+    def _candidates(self) -> List[str]:
+        # Draw until there are enough ids that hash to this worker, without duplicates
+        candidates = {}
+        while len(candidates) < self.batch:
+            room_id = random_id(self.length)
+            if self.is_local(room_id):
+                candidates[room_id] = None
+        return list(candidates)
+
+    async def _reserve(self):
+        from pymongo.errors import BulkWriteError
+
+        candidates = self._candidates()
+        now = datetime.now(timezone.utc).isoformat()
+        rejected = set()
+        try:
+            await self.collection.insert_many(
+                [{"_id": room_id, "worker": self.worker_id, "reserved_at": now} for room_id in candidates],
+                ordered=False
+            )
+        except BulkWriteError as e:
+            errors = e.details["writeErrors"]
+            if any(err["code"] != DUPLICATE_KEY for err in errors):
+                raise
+            rejected = {candidates[err["index"]] for err in errors}
+            self.collisions += len(rejected)
+        self.pool.extend(room_id for room_id in candidates if room_id not in rejected)
+
+    async def allocate(self) -> str:
+        reservations = 0
+        while True:
+            while self.pool:
+                room_id = self.pool.popleft()
+                # The ring may have changed since the id was reserved
+                if self.is_local(room_id):
+                    self.allocated += 1
+                    return room_id
+            if reservations == self.max_reservations:
+                raise RoomIdsExhausted(f"No free room id after {reservations} reservations")
+            reservations += 1
+            await self._reserve()
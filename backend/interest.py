@@ -0,0 +1,97 @@
+from collections import defaultdict
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+# A socket that should receive movement: (sid, wire protocol, x, y)
+Viewer = Tuple[str, str, float, float]
+
+
+class InterestManager:
+    """Decides which movement updates are worth sending, and to whom.
+
+    Positions are snapped to a grid of `quantum` pixels and a player is only
+    included in a tick when its snapped position changed since the last one
+    sent. Rooms with more than `full_view_players` players switch to
+    relevance filtering: the map is split into cells of `radius` pixels and
+    each viewer only receives players in its own and the eight neighbouring
+    cells, so fan-out grows with local density instead of room size squared.
+    """
+
+    def __init__(self, quantum: float = 1.0, radius: float = 400.0, full_view_players: int = 8):
+        self.quantum = quantum
+        self.radius = radius
+        self.full_view_players = full_view_players
+        # room_id -> player_id -> last position sent
+        self.last_sent: Dict[str, Dict[str, dict]] = {}
+        # room_id -> sid -> grid cell each viewer was in at the last filtered send
+        self.viewer_cells: Dict[str, Dict[str, Tuple[int, int]]] = {}
+
+    def quantize(self, position: dict) -> dict:
+        q = self.quantum
+        if q == 1:
+            return {"x": round(position["x"]), "y": round(position["y"])}
+        return {"x": round(position["x"] / q) * q, "y": round(position["y"] / q) * q}
+
+    def changed(self, room_id: str, moves: Dict[str, dict]) -> Dict[str, dict]:
+        """Quantized positions of the players whose position changed since the last send"""
+        sent = self.last_sent.setdefault(room_id, {})
+        changed = {}
+        for player_id, position in moves.items():
+            snapped = self.quantize(position)
+            if sent.get(player_id) != snapped:
+                sent[player_id] = snapped
+                changed[player_id] = snapped
+        return changed
+
+    def forget(self, room_id: str, player_id: str = None):
+        if player_id is None:
+            self.last_sent.pop(room_id, None)
+            self.viewer_cells.pop(room_id, None)
+        elif room_id in self.last_sent:
+            self.last_sent[room_id].pop(player_id, None)
+
+    def _cell(self, x: float, y: float) -> Tuple[int, int]:
+        return int(x // self.radius), int(y // self.radius)
+
+    def _around(self, cell: Tuple[int, int], positions: Dict[Tuple[int, int], Dict[str, dict]]) -> Dict[str, dict]:
+        cx, cy = cell
+        visible = {}
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                visible.update(positions.get((cx + dx, cy + dy), ()))
+        return visible
+
+    def _by_cell(self, positions: Dict[str, dict]) -> Dict[Tuple[int, int], Dict[str, dict]]:
+        cells: Dict[Tuple[int, int], Dict[str, dict]] = defaultdict(dict)
+        for player_id, position in positions.items():
+            cells[self._cell(position["x"], position["y"])][player_id] = position
+        return cells
+
+    def groups(self, room_id: str, viewers: Iterable[Viewer],
+               moves: Dict[str, dict]) -> Iterator[Tuple[str, List[str], Dict[str, dict]]]:
+        """Yield (protocol, sids, moves) so viewers sharing a cell share one encoded packet.
+
+        Players that moved while a viewer was out of range are not resent
+        once they stop, so a viewer entering a new cell gets the last sent
+        position of everyone around it.
+        """
+        movers = self._by_cell(moves)
+        previous = self.viewer_cells.get(room_id, {})
+        cells = self.viewer_cells[room_id] = {}
+        # (cell, entered) -> protocol -> sids
+        audience: Dict[Tuple[Tuple[int, int], bool], Dict[str, List[str]]] = defaultdict(lambda: defaultdict(list))
+        for sid, protocol, x, y in viewers:
+            cell = cells[sid] = self._cell(x, y)
+            entered = sid in previous and previous[sid] != cell
+            audience[(cell, entered)][protocol].append(sid)
+
+        everyone = None
+        for (cell, entered), by_protocol in audience.items():
+            if entered:
+                if everyone is None:
+                    everyone = self._by_cell(self.last_sent.get(room_id, {}))
+                visible = self._around(cell, everyone)
+            else:
+                visible = self._around(cell, movers)
+            if visible:
+                for protocol, sids in by_protocol.items():
+                    yield protocol, sids, visible
@@ -0,0 +1,79 @@
+import hashlib
+from collections import OrderedDict
+from itertools import islice
+from typing import Dict, List, Optional, Tuple
+
+import orjson
+
+
+class LobbyIndex:
+    """Open lobby rooms, bucketed by free slots.
+
+    `buckets[n]` holds the rooms with exactly n free slots in the order they
+    opened, so matchmaking looks at no more than `max_players` buckets
+    instead of scanning every resident room. Entries are kept current by
+    update(), which the server calls whenever a room's players or status
+    change.
+    """
+
+    def __init__(self, max_players: int):
+        self.max_players = max_players
+        self.buckets: List["OrderedDict[str, None]"] = [OrderedDict() for _ in range(max_players + 1)]
+        self.free: Dict[str, int] = {}  # room_id -> free slots
+        self.open: Dict[str, dict] = {}  # room_id -> listing entry, in the order rooms opened
+        # Bumped on every change; serialized listing pages are cached per version
+        self.version = 0
+        self.pages: Dict[Tuple[int, int], Tuple[str, bytes]] = {}
+
+    def __len__(self) -> int:
+        return len(self.open)
+
+    def update(self, room_id: str, entry: Optional[dict]):
+        """Index a room's listing entry, or drop it with None once it is full or has started"""
+        free = self.max_players - entry["players"] if entry is not None else 0
+        if free <= 0:
+            entry = None
+        previous = self.free.get(room_id)
+        if entry is None:
+            if previous is None:
+                return
+            del self.free[room_id]
+            del self.buckets[previous][room_id]
+            del self.open[room_id]
+        else:
+            if self.open.get(room_id) == entry:
+                return
+            if previous != free:
+                if previous is not None:
+                    del self.buckets[previous][room_id]
+                self.buckets[free][room_id] = None
+                self.free[room_id] = free
+            self.open[room_id] = entry
+        self.version += 1
+        self.pages.clear()
+
+    def discard(self, room_id: str):
+        self.update(room_id, None)
+
+    def match(self) -> Optional[str]:
+        """The longest-waiting room among those closest to full"""
+        for bucket in self.buckets[1:]:
+            if bucket:
+                return next(iter(bucket))
+        return None
+
+    def page(self, offset: int, limit: int) -> Tuple[str, bytes]:
+        """ETag and serialized body of one page of the listing"""
+        cached = self.pages.get((offset, limit))
+        if cached is None:
+            if len(self.pages) >= 256:
+                self.pages.clear()
+            total = len(self.open)
+            body = orjson.dumps({
+                "rooms": list(islice(self.open.values(), offset, offset + limit)),
+                "total": total,
+                "next_offset": offset + limit if offset + limit < total else None
+            })
+            etag = f'"{hashlib.blake2b(body, digest_size=12).hexdigest()}"'
+            cached = self.pages[(offset, limit)] = (etag, body)
+        return cached
@@ -0,0 +1,220 @@
+import asyncio
+import bisect
+import contextvars
+import functools
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import socketio
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+FANOUT_BUCKETS = (0, 1, 2, 3, 4, 8, 16, 64, 256)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(label: Optional[str], value: Optional[str], extra: str = "") -> str:
+    parts = [f'{label}="{_escape(value)}"'] if label is not None else []
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Histogram:
+    """Cumulative-bucket histogram with at most one label, rendered in Prometheus text format"""
+
+    def __init__(self, name: str, help: str, buckets: Iterable[float] = LATENCY_BUCKETS, label: Optional[str] = None):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self.label = label
+        # label value -> [per-bucket counts..., +Inf count], sum
+        self.series: Dict[Optional[str], Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, label_value: Optional[str] = None):
+        series = self.series.get(label_value)
+        if series is None:
+            series = self.series[label_value] = ([0] * (len(self.buckets) + 1), [0.0])
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1][0] += value
+
+    def time(self, label_value: Optional[str] = None):
+        """Decorator timing an async function into this histogram"""
+        def decorator(func):
+            @functools.wraps(func)
+            async def timed(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    self.observe(time.perf_counter() - started, label_value)
+            return timed
+        return decorator
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for value, (counts, total) in sorted(self.series.items(), key=lambda s: s[0] or ""):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                le = f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_labels(self.label, value, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.label, value)} {total[0]}")
+            lines.append(f"{self.name}_count{_labels(self.label, value)} {cumulative}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, help: str, label: Optional[str] = None):
+        self.name = name
+        self.help = help
+        self.label = label
+        self.values: Dict[Optional[str], float] = {}
+
+    def inc(self, amount: float = 1, label_value: Optional[str] = None):
+        self.values[label_value] = self.values.get(label_value, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for value, total in sorted(self.values.items(), key=lambda s: s[0] or ""):
+            lines.append(f"{self.name}{_labels(self.label, value)} {total}")
+        return lines
+
+
+class Gauge:
+    """Read at scrape time; `read` returns a number, or a dict of label value -> number"""
+
+    def __init__(self, name: str, help: str, read: Callable[[], object], label: Optional[str] = None,
+                 kind: str = "gauge"):
+        self.name = name
+        self.help = help
+        self.read = read
+        self.label = label
+        self.kind = kind
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        value = self.read()
+        if isinstance(value, dict):
+            for label_value, number in sorted(value.items()):
+                lines.append(f"{self.name}{_labels(self.label, label_value)} {number}")
+        else:
+            lines.append(f"{self.name} {value}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: list = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+handler_latency = registry.register(Histogram(
+    "socketio_handler_duration_seconds", "Time spent in Socket.IO event handlers", label="event"))
+http_latency = registry.register(Histogram(
+    "http_request_duration_seconds", "Time spent serving REST requests", label="route"))
+emit_fanout = registry.register(Histogram(
+    "socketio_emit_recipients", "Local recipients per emitted event", FANOUT_BUCKETS, label="event"))
+outbound_bytes = registry.register(Counter(
+    "socketio_outbound_bytes_total", "Socket.IO payload bytes sent to clients"))
+outbound_messages = registry.register(Counter(
+    "socketio_outbound_messages_total", "Socket.IO packets sent to clients"))
+loop_lag = registry.register(Histogram(
+    "event_loop_lag_seconds", "How late the event loop woke up a periodic timer"))
+
+
+UNHANDLED_EVENT = "unhandled"
+
+# Set while handling an event whose handler runs on the worker owning its room
+_forwarded = contextvars.ContextVar("forwarded", default=False)
+
+
+def mark_forwarded():
+    """Leave the current event's latency to the worker it was forwarded to, which times the handler itself"""
+    _forwarded.set(True)
+
+
+class MeteredAsyncServer(socketio.AsyncServer):
+    """AsyncServer that records handler latency, emit fan-out and outbound bytes"""
+
+    async def _trigger_event(self, event, namespace, *args):
+        # Event names come from clients; only registered ones get their own series
+        label = event if event in self.handlers.get(namespace or '/', {}) else UNHANDLED_EVENT
+        token = _forwarded.set(False)
+        started = time.perf_counter()
+        try:
+            return await super()._trigger_event(event, namespace, *args)
+        finally:
+            if not _forwarded.get():
+                handler_latency.observe(time.perf_counter() - started, label)
+            _forwarded.reset(token)
+
+    async def emit(self, event, data=None, to=None, room=None, skip_sid=None, namespace=None, **kwargs):
+        namespace = namespace or '/'
+        target = to or room
+        if target is not None:
+            # Only recipients on this worker; other workers count their own
+            skipped = skip_sid if isinstance(skip_sid, list) else [skip_sid]
+            recipients = self.manager.get_participants(namespace, target)
+            emit_fanout.observe(sum(1 for sid, _ in recipients if sid not in skipped), event)
+        await super().emit(event, data, to=to, room=room, skip_sid=skip_sid, namespace=namespace, **kwargs)
+
+    async def _send_packet(self, eio_sid, pkt):
+        encoded_packet = pkt.encode()
+        for ep in encoded_packet if isinstance(encoded_packet, list) else [encoded_packet]:
+            self._count(ep)
+            await self.eio.send(eio_sid, ep)
+
+    async def _send_eio_packet(self, eio_sid, eio_pkt):
+        self._count(eio_pkt.data)
+        await super()._send_eio_packet(eio_sid, eio_pkt)
+
+    @staticmethod
+    def _count(data):
+        outbound_messages.inc()
+        # Packets are ASCII-only JSON or raw binary attachments, so len() is the byte count
+        outbound_bytes.inc(len(data) if data is not None else 0)
+
+
+class LoopLagMonitor:
+    """Measures event-loop lag as the overshoot of a periodic sleep"""
+
+    def __init__(self, interval: float = 0.5):
+        self.interval = interval
+        self.last_lag = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            self.last_lag = max(0.0, loop.time() - started - self.interval)
+            loop_lag.observe(self.last_lag)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
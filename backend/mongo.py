@@ -0,0 +1,66 @@
+import asyncio
+import logging
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+class LazyCollection:
+    """Stands in for a collection until it is first used"""
+
+    def __init__(self, mongo: "LazyMongo", name: str):
+        self.mongo = mongo
+        self.name = name
+
+    def __getattr__(self, attr):
+        return getattr(self.mongo.database[self.name], attr)
+
+
+class LazyMongo:
+    """MongoDB database handle that creates its client on first use.
+
+    Collections can be handed out at import time; motor is not imported and
+    nothing connects until one of them is actually used, so a worker starts
+    serving before Mongo is reachable and readiness is reported separately.
+    """
+
+    def __init__(self, url: Optional[str], db_name: Optional[str], timeout: float = 5.0):
+        self.url = url
+        self.db_name = db_name
+        self.timeout = timeout
+        self._client = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            if not self.url or not self.db_name:
+                raise RuntimeError("MONGO_URL and DB_NAME must be set")
+            from motor.motor_asyncio import AsyncIOMotorClient
+
+            self._client = AsyncIOMotorClient(self.url, serverSelectionTimeoutMS=int(self.timeout * 1000))
+        return self._client
+
+    @property
+    def database(self):
+        return self.client[self.db_name]
+
+    def __getattr__(self, name: str) -> LazyCollection:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return LazyCollection(self, name)
+
+    def __getitem__(self, name: str) -> LazyCollection:
+        return LazyCollection(self, name)
+
+    async def ping(self, timeout: Optional[float] = None) -> bool:
+        try:
+            await asyncio.wait_for(self.client.admin.command("ping"), timeout or self.timeout)
+            return True
+        except Exception as e:
+            logger.warning(f"MongoDB is not reachable: {e!r}")
+            return False
+
+    def close(self):
+        if self._client is not None:
+            self._client.close()
+            self._client = None
@@ -0,0 +1,103 @@
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class RoomPersister:
+    """Write-behind persistence of room snapshots to MongoDB.
+
+    Handlers only mark rooms dirty; a background loop turns the dirty set into
+    one unordered bulk_write of upserts every `interval` seconds, so Mongo
+    latency never sits on the per-event path.
+    """
+
+    def __init__(self, collection, snapshot: Callable[[str], Optional[dict]], interval: float = 0.5):
+        self.collection = collection
+        # Looks up a resident room by id and returns its snapshot, or None if it is gone
+        self.snapshot = snapshot
+        self.interval = interval
+        self.dirty: set = set()
+        # Final snapshots of rooms that left memory but are not written yet
+        self.retired: Dict[str, dict] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def mark_dirty(self, room_id: str):
+        self.dirty.add(room_id)
+
+    def retire(self, room_id: str, snapshot: dict):
+        """Queue the last state of a room that is being dropped from memory"""
+        self.retired[room_id] = snapshot
+        self.dirty.add(room_id)
+
+    async def flush(self) -> int:
+        if not self.dirty:
+            return 0
+        # Imported here so pymongo loads with the first write rather than at startup
+        from pymongo import UpdateOne
+
+        dirty, self.dirty = self.dirty, set()
+        now = datetime.now(timezone.utc).isoformat()
+        requests = []
+        retired, self.retired = self.retired, {}
+        for room_id in dirty:
+            # A retired room may have been rehydrated since; the live state wins
+            snapshot = self.snapshot(room_id)
+            if snapshot is None:
+                snapshot = retired.get(room_id)
+            if snapshot is not None:
+                requests.append(UpdateOne(
+                    {"room_id": room_id},
+                    {"$set": {**snapshot, "updated_at": now}},
+                    upsert=True
+                ))
+        if not requests:
+            return 0
+        try:
+            await self.collection.bulk_write(requests, ordered=False)
+        except Exception:
+            # Retry on the next flush; newer changes are picked up from the live room
+            self.dirty |= dirty
+            self.retired = {**retired, **self.retired}
+            raise
+        return len(requests)
+
+    async def load(self, room_id: str) -> Optional[dict]:
+        if room_id in self.retired:
+            return self.retired[room_id]
+        # Rooms created before snapshots were persisted only have id/host/created_at
+        return await self.collection.find_one(
+            {"room_id": room_id, "version": {"$exists": True}},
+            {"_id": 0, "updated_at": 0}
+        )
+
+    async def ensure_indexes(self):
+        await self.collection.create_index("room_id")
+
+    async def run(self):
+        try:
+            await self.ensure_indexes()
+        except Exception:
+            logger.exception("Could not create room indexes")
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Failed to persist room snapshots")
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
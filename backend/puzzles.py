@@ -0,0 +1,273 @@
+import json
+import random
+from pathlib import Path
+from string import Formatter
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from geometry import RoomLayout, load_layout
+
+ROOMS_DIR = Path(__file__).parent / 'rooms'
+
+# Flags set directly by socket handlers rather than by a definition's effects
+HANDLER_FLAGS = ("examined", "cooperative_unlock")
+
+# A validator checks a solve_puzzle payload against the room and returns
+# True (solved), False (wrong answer), None (ignored) or a dict payload for a
+# progress event. Apart from recording puzzle progress they leave the room
+# alone - effects come from the definition - so each can be benchmarked alone.
+Validator = Callable[[object, dict], object]
+
+
+def secret_validator(puzzle_id: str, spec: dict) -> Validator:
+    name = spec["secret"]
+
+    def validate(room, data):
+        return data.get("answer") == room.secrets[name]
+    return validate
+
+
+def exact_validator(puzzle_id: str, spec: dict) -> Validator:
+    expected = spec["answer"]
+
+    def validate(room, data):
+        return data.get("answer") == expected
+    return validate
+
+
+def normalized_validator(puzzle_id: str, spec: dict) -> Validator:
+    expected = spec["answer"].upper().strip()
+
+    def validate(room, data):
+        answer = data.get("answer")
+        return isinstance(answer, str) and answer.upper().strip() == expected
+    return validate
+
+
+def true_validator(puzzle_id: str, spec: dict) -> Validator:
+    # The client runs the puzzle itself and only reports success
+    def validate(room, data):
+        return data.get("answer") is True
+    return validate
+
+
+def pieces_validator(puzzle_id: str, spec: dict) -> Validator:
+    count = spec["count"]
+    complete = (1 << count) - 1
+
+    def validate(room, data):
+        index = data.get("piece_index")
+        if not isinstance(index, int) or isinstance(index, bool) or not 0 <= index < count:
+            return None
+        if room.place_piece(puzzle_id, index) == complete:
+            return True
+        return {"pieces": room.pieces(puzzle_id)}
+    return validate
+
+
+VALIDATORS: Dict[str, Callable[[str, dict], Validator]] = {
+    "secret": secret_validator,
+    "exact": exact_validator,
+    "normalized": normalized_validator,
+    "true": true_validator,
+    "pieces": pieces_validator,
+}
+
+
+class SecretDef(NamedTuple):
+    """A value drawn per room, e.g. a lock code that clues reveal"""
+    length: int
+    alphabet: str = "0123456789"
+    separator: str = ""  # joins the characters when a clue shows the secret
+
+    def generate(self) -> str:
+        return ''.join(random.choices(self.alphabet, k=self.length))
+
+    def display(self, value: str) -> str:
+        return self.separator.join(value) if self.separator else value
+
+
+class ObjectDef(NamedTuple):
+    flags: Tuple[str, ...]  # flags always present in the client view
+    contains: Optional[str] = None
+    clue: Optional[str] = None  # may reference secrets, e.g. {code}
+    hidden_message: Optional[str] = None
+
+
+class PuzzleDef(NamedTuple):
+    puzzle_id: str
+    validate: Optional[Validator]
+    set_flags: Tuple[Tuple[str, str], ...]
+    reward: Optional[str]  # added to the shared inventory
+    item_found: Optional[str]  # reported to clients
+    message: Optional[str]
+    fail_message: Optional[str]
+    progress_event: Optional[str]
+
+
+class ItemUseDef(NamedTuple):
+    item: str
+    target: Optional[str]
+    requires: Tuple[str, ...]
+    consume: Tuple[str, ...]
+    grant: Optional[str]
+    set_flags: Tuple[Tuple[str, str], ...]
+    solve: Optional[str]
+    status: Optional[str]
+    event: str
+    message: Optional[str]
+
+
+class RoomDefinition(NamedTuple):
+    room_type: str  # key in the definition registry, stored in room snapshots
+    name: str
+    secrets: Dict[str, SecretDef]
+    objects: Dict[str, ObjectDef]
+    puzzle_ids: Tuple[str, ...]
+    puzzles: Dict[str, PuzzleDef]  # only puzzles solvable through solve_puzzle
+    pieces: Dict[str, int]  # puzzle_id -> piece count, for puzzles solved piece by piece
+    item_uses: Dict[Tuple[str, Optional[str]], ItemUseDef]
+    flags: Tuple[str, ...]  # handler flags, then every object flag the definition refers to
+    # Puzzle solved flags and object flags are packed into per-room int bitsets
+    puzzle_bits: Dict[str, int]
+    flag_bits: Dict[str, Dict[str, int]]
+    layout: Optional[RoomLayout]  # None for definitions without geometry
+
+    def item_use(self, item_id: str, target_id: Optional[str]) -> Optional[ItemUseDef]:
+        # Uses without a target (e.g. combining items) match any target
+        return self.item_uses.get((item_id, target_id)) or self.item_uses.get((item_id, None))
+
+
+def _flags(objects: Dict[str, ObjectDef], pairs: List[list], where: str) -> Tuple[Tuple[str, str], ...]:
+    for object_id, _ in pairs:
+        if object_id not in objects:
+            raise ValueError(f"{where}: unknown object '{object_id}'")
+    return tuple((object_id, flag) for object_id, flag in pairs)
+
+
+def compile_room(room_type: str, definition: dict) -> RoomDefinition:
+    """Validate a room definition and resolve it into dispatch tables"""
+    secrets = {name: SecretDef(**spec) for name, spec in definition.get("secrets", {}).items()}
+    objects = {
+        oid: ObjectDef(tuple(spec.get("flags", ())), spec.get("contains"), spec.get("clue"), spec.get("hidden_message"))
+        for oid, spec in definition["objects"].items()
+    }
+    for oid, obj in objects.items():
+        if obj.clue is not None:
+            for _, field, _, _ in Formatter().parse(obj.clue):
+                if field is not None and field not in secrets:
+                    raise ValueError(f"object {oid}: clue refers to unknown secret '{field}'")
+
+    puzzles = {}
+    pieces = {}
+    for pid, spec in definition["puzzles"].items():
+        if "validator" not in spec:
+            continue  # solved by an item use, not by solve_puzzle
+        kind = spec["validator"]["type"]
+        if kind not in VALIDATORS:
+            raise ValueError(f"puzzle {pid}: unknown validator '{kind}'")
+        if kind == "secret" and spec["validator"]["secret"] not in secrets:
+            raise ValueError(f"puzzle {pid}: unknown secret '{spec['validator']['secret']}'")
+        if kind == "pieces":
+            pieces[pid] = spec["validator"]["count"]
+        reward_from = spec.get("reward_from")
+        if reward_from is not None and objects.get(reward_from, ObjectDef(())).contains is None:
+            raise ValueError(f"puzzle {pid}: '{reward_from}' does not contain an item")
+        reward = objects[reward_from].contains if reward_from else None
+        puzzles[pid] = PuzzleDef(
+            puzzle_id=pid,
+            validate=VALIDATORS[kind](pid, spec["validator"]),
+            set_flags=_flags(objects, spec.get("set_flags", []), f"puzzle {pid}"),
+            reward=reward,
+            item_found=spec.get("item_found", reward),
+            message=spec.get("message"),
+            fail_message=spec.get("fail_message"),
+            progress_event=spec.get("progress_event")
+        )
+
+    puzzle_ids = tuple(definition["puzzles"])
+    item_uses = {}
+    for spec in definition.get("item_uses", []):
+        use = ItemUseDef(
+            item=spec["item"],
+            target=spec.get("target"),
+            requires=tuple(spec.get("requires", ())),
+            consume=tuple(spec.get("consume", ())),
+            grant=spec.get("grant"),
+            set_flags=_flags(objects, spec.get("set_flags", []), f"item use {spec['item']}"),
+            solve=spec.get("solve"),
+            status=spec.get("status"),
+            event=spec["event"],
+            message=spec.get("message")
+        )
+        if use.solve is not None and use.solve not in puzzle_ids:
+            raise ValueError(f"item use {use.item}: unknown puzzle '{use.solve}'")
+        item_uses[(use.item, use.target)] = use
+
+    flags = list(HANDLER_FLAGS) + [flag for obj in objects.values() for flag in obj.flags]
+    for effect in list(puzzles.values()) + list(item_uses.values()):
+        flags.extend(flag for _, flag in effect.set_flags)
+    flags = tuple(dict.fromkeys(flags))
+    return RoomDefinition(
+        room_type=room_type,
+        name=definition["name"],
+        secrets=secrets,
+        objects=objects,
+        puzzle_ids=puzzle_ids,
+        puzzles=puzzles,
+        pieces=pieces,
+        item_uses=item_uses,
+        flags=flags,
+        puzzle_bits={pid: 1 << i for i, pid in enumerate(puzzle_ids)},
+        flag_bits={
+            oid: {flag: 1 << (i * len(flags) + j) for j, flag in enumerate(flags)}
+            for i, oid in enumerate(objects)
+        },
+        layout=load_layout(definition.get("layout"), definition["objects"])
+    )
+
+
+def load_room_definitions(directory=None) -> Dict[str, RoomDefinition]:
+    """Every definition in a directory, keyed by room type (the file name without .json)"""
+    definitions = {}
+    for path in sorted(Path(directory or ROOMS_DIR).glob('*.json')):
+        with open(path) as f:
+            definitions[path.stem] = compile_room(path.stem, json.load(f))
+    return definitions
+
+
+# Effects - the only place definitions mutate a room
+def apply_puzzle_solution(room, puzzle: PuzzleDef) -> Optional[dict]:
+    """Returns the event payload, or None if the puzzle was already solved"""
+    if room.is_solved(puzzle.puzzle_id):
+        return None
+    room.set_solved(puzzle.puzzle_id)
+    for object_id, flag in puzzle.set_flags:
+        room.set_object_flag(object_id, flag)
+    if puzzle.reward is not None:
+        room.add_item(puzzle.reward)
+    payload = {"puzzle_id": puzzle.puzzle_id, "item_found": puzzle.item_found}
+    if puzzle.message is not None:
+        payload["message"] = puzzle.message
+    return payload
+
+
+def apply_item_use(room, use: ItemUseDef) -> Optional[dict]:
+    """Returns the event payload, or None if the room lacks the required items"""
+    if not all(item in room.inventory for item in use.requires + use.consume):
+        return None
+    for item in use.consume:
+        room.remove_item(item)
+    if use.grant is not None:
+        room.add_item(use.grant)
+    for object_id, flag in use.set_flags:
+        room.set_object_flag(object_id, flag)
+    if use.solve is not None:
+        room.set_solved(use.solve)
+    if use.status is not None:
+        room.set_status(use.status)
+    payload = {}
+    if use.grant is not None:
+        payload["result"] = use.grant
+    if use.message is not None:
+        payload["message"] = use.message
+    return payload
@@ -0,0 +1,167 @@
+import asyncio
+import functools
+import logging
+import time
+from typing import Awaitable, Callable, Dict, Hashable, NamedTuple, Optional, Set, Tuple
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+rate_limited = metrics.registry.register(metrics.Counter(
+    "socketio_rate_limited_total", "Client events dropped or deferred by the rate limiter", label="event"))
+shed_updates = metrics.registry.register(metrics.Counter(
+    "socketio_shed_total", "Updates skipped for sockets with a full send queue", label="event"))
+
+
+class Limit(NamedTuple):
+    rate: float  # tokens per second
+    burst: int
+    # "drop" discards excess events, "coalesce" keeps the latest one and
+    # delivers it once a token is available
+    policy: str = "drop"
+
+
+class TokenBucket:
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self) -> bool:
+        self._refill(time.monotonic())
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def wait_time(self) -> float:
+        self._refill(time.monotonic())
+        return max(0.0, (1 - self.tokens) / self.rate)
+
+
+class RateLimiter:
+    """Token buckets per sid and event name, applied before an event is routed.
+
+    Buckets can also be keyed by something other than the socket (see
+    admit), for limits that must survive a reconnect.
+    """
+
+    def __init__(self, limits: Dict[str, Limit]):
+        self.limits = limits
+        self.buckets: Dict[Hashable, Dict[str, TokenBucket]] = {}  # sid or key -> event -> bucket
+        # (sid, event) -> latest payload held back by a coalescing limit
+        self.held: Dict[Tuple[str, str], dict] = {}
+        self.timers: Dict[Tuple[str, str], asyncio.TimerHandle] = {}
+        # Deferred deliveries in flight; the loop only keeps weak references to tasks
+        self.releasing: Set[asyncio.Task] = set()
+        # Called with (sid, event) when an event is dropped
+        self.on_drop: Optional[Callable[[str, str], Awaitable]] = None
+
+    def _bucket(self, sid: Hashable, event: str) -> TokenBucket:
+        buckets = self.buckets.get(sid)
+        if buckets is None:
+            buckets = self.buckets[sid] = {}
+        bucket = buckets.get(event)
+        if bucket is None:
+            limit = self.limits[event]
+            bucket = buckets[event] = TokenBucket(limit.rate, limit.burst)
+        return bucket
+
+    def allow(self, sid: Hashable, event: str) -> bool:
+        return event not in self.limits or self._bucket(sid, event).take()
+
+    async def admit(self, key: Hashable, event: str, sid: str) -> bool:
+        """Take a token from the bucket of `key` rather than the socket; a drop is reported to `sid`"""
+        if self.allow(key, event):
+            return True
+        rate_limited.inc(1, event)
+        if self.on_drop is not None:
+            await self.on_drop(sid, event)
+        return False
+
+    def limit(self, handler):
+        """Wrap a Socket.IO handler with the limit configured for its event name"""
+        event = handler.__name__
+        if event not in self.limits:
+            return handler
+        coalesce = self.limits[event].policy == "coalesce"
+
+        @functools.wraps(handler)
+        async def limited(sid, data):
+            key = (sid, event)
+            if key not in self.held and self._bucket(sid, event).take():
+                return await handler(sid, data)
+            rate_limited.inc(1, event)
+            if coalesce:
+                # Later packets replace earlier ones; only the newest is worth sending
+                self.held[key] = data
+                if key not in self.timers:
+                    delay = self._bucket(sid, event).wait_time()
+                    self.timers[key] = asyncio.get_running_loop().call_later(
+                        delay, self._schedule_release, key, handler)
+            elif self.on_drop is not None:
+                await self.on_drop(sid, event)
+
+        return limited
+
+    def _schedule_release(self, key: Tuple[str, str], handler):
+        task = asyncio.create_task(self._release(key, handler))
+        self.releasing.add(task)
+        task.add_done_callback(self.releasing.discard)
+
+    async def _release(self, key: Tuple[str, str], handler):
+        self.timers.pop(key, None)
+        data = self.held.pop(key, None)
+        if data is None:
+            return
+        self._bucket(*key).take()
+        try:
+            await handler(key[0], data)
+        except Exception:
+            logger.exception(f"Deferred {key[1]} failed")
+
+    def forget(self, sid: Hashable):
+        for event in self.buckets.pop(sid, ()):
+            key = (sid, event)
+            self.held.pop(key, None)
+            timer = self.timers.pop(key, None)
+            if timer is not None:
+                timer.cancel()
+
+
+class BackpressureServer(metrics.MeteredAsyncServer):
+    """Skips sheddable broadcasts for sockets whose Engine.IO send queue is backed up.
+
+    Engine.IO queues outgoing packets per socket without bound; a client on a
+    slow link would otherwise accumulate every movement snapshot. Newer
+    snapshots supersede older ones, so skipping them is safe.
+    """
+
+    def __init__(self, *args, sheddable=("players_moved",), max_backlog: int = 32, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.sheddable = frozenset(sheddable)
+        self.max_backlog = max_backlog
+
+    async def emit(self, event, data=None, to=None, room=None, skip_sid=None, namespace=None, **kwargs):
+        if event in self.sheddable and (to or room) is not None:
+            # Only sockets attached to this worker can be inspected
+            slow = [
+                sid for sid, eio_sid in self.manager.get_participants(namespace or '/', to or room)
+                if self._backlog(eio_sid) > self.max_backlog
+            ]
+            if slow:
+                shed_updates.inc(len(slow), event)
+                skip_sid = slow + (skip_sid if isinstance(skip_sid, list) else [skip_sid] if skip_sid else [])
+        await super().emit(event, data, to=to, room=room, skip_sid=skip_sid, namespace=namespace, **kwargs)
+
+    def _backlog(self, eio_sid: str) -> int:
+        socket = self.eio.sockets.get(eio_sid)
+        return socket.queue.qsize() if socket is not None else 0
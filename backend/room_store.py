@@ -0,0 +1,276 @@
+import abc
+import asyncio
+import json
+import time
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Tuple
+
+
+class RoomStore(abc.ABC):
+    """Shared room registry: which worker owns a room, plus its latest snapshot.
+
+    Each room is owned by exactly one worker at a time through a renewable
+    lease, so the per-event hot path only touches that worker's memory.
+    """
+
+    @abc.abstractmethod
+    async def claim(self, room_id: str, worker_id: str, ttl: float) -> str:
+        """Take the lease if it is free or already ours; returns the current owner"""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def owner(self, room_id: str) -> Optional[str]:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def renew(self, room_ids: Iterable[str], worker_id: str, ttl: float):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def release(self, room_id: str, worker_id: str):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def save(self, room_id: str, snapshot: dict):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def load(self, room_id: str) -> Optional[dict]:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def delete(self, room_id: str):
+        raise NotImplementedError
+
+    # Worker membership and messaging, used by the shard router
+    @abc.abstractmethod
+    async def heartbeat(self, worker_id: str, ttl: float):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def workers(self) -> List[str]:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def leave(self, worker_id: str):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def publish(self, worker_id: str, message: dict):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def subscribe(self, worker_id: str) -> AsyncIterator[dict]:
+        raise NotImplementedError
+
+    # Each worker's open lobby rooms, merged for listing and quick-match
+    @abc.abstractmethod
+    async def save_lobby(self, worker_id: str, entries: List[dict], ttl: float):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def lobbies(self) -> Dict[str, List[dict]]:
+        """worker_id -> lobby entries, for live workers whose entries have not expired"""
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+
+class LocalRoomStore(RoomStore):
+    """In-process store with the same lease semantics as Redis, for single-node runs and tests"""
+
+    def __init__(self):
+        self.leases: Dict[str, Tuple[str, float]] = {}  # room_id -> (worker_id, expires_at)
+        self.snapshots: Dict[str, str] = {}
+        self.members: Dict[str, float] = {}  # worker_id -> expires_at
+        self.channels: Dict[str, asyncio.Queue] = {}
+        self.lobby_entries: Dict[str, Tuple[str, float]] = {}  # worker_id -> (entries, expires_at)
+
+    def _live_owner(self, room_id: str) -> Optional[str]:
+        lease = self.leases.get(room_id)
+        if lease is None:
+            return None
+        if lease[1] <= time.monotonic():
+            del self.leases[room_id]
+            return None
+        return lease[0]
+
+    async def claim(self, room_id: str, worker_id: str, ttl: float) -> str:
+        owner = self._live_owner(room_id)
+        if owner is None or owner == worker_id:
+            self.leases[room_id] = (worker_id, time.monotonic() + ttl)
+            return worker_id
+        return owner
+
+    async def owner(self, room_id: str) -> Optional[str]:
+        return self._live_owner(room_id)
+
+    async def renew(self, room_ids: Iterable[str], worker_id: str, ttl: float):
+        expires_at = time.monotonic() + ttl
+        for room_id in room_ids:
+            if self._live_owner(room_id) in (None, worker_id):
+                self.leases[room_id] = (worker_id, expires_at)
+
+    async def release(self, room_id: str, worker_id: str):
+        if self._live_owner(room_id) == worker_id:
+            del self.leases[room_id]
+
+    async def save(self, room_id: str, snapshot: dict):
+        # Serialize like the Redis store does so both behave identically
+        self.snapshots[room_id] = json.dumps(snapshot)
+
+    async def load(self, room_id: str) -> Optional[dict]:
+        data = self.snapshots.get(room_id)
+        return json.loads(data) if data is not None else None
+
+    async def delete(self, room_id: str):
+        self.snapshots.pop(room_id, None)
+        self.leases.pop(room_id, None)
+
+    async def heartbeat(self, worker_id: str, ttl: float):
+        self.members[worker_id] = time.monotonic() + ttl
+
+    async def workers(self) -> List[str]:
+        now = time.monotonic()
+        return [w for w, expires_at in self.members.items() if expires_at > now]
+
+    async def leave(self, worker_id: str):
+        self.members.pop(worker_id, None)
+
+    async def publish(self, worker_id: str, message: dict):
+        self.channels.setdefault(worker_id, asyncio.Queue()).put_nowait(json.dumps(message))
+
+    async def subscribe(self, worker_id: str) -> AsyncIterator[dict]:
+        queue = self.channels.setdefault(worker_id, asyncio.Queue())
+        while True:
+            yield json.loads(await queue.get())
+
+    async def save_lobby(self, worker_id: str, entries: List[dict], ttl: float):
+        self.lobby_entries[worker_id] = (json.dumps(entries), time.monotonic() + ttl)
+
+    async def lobbies(self) -> Dict[str, List[dict]]:
+        live = set(await self.workers())
+        now = time.monotonic()
+        return {w: json.loads(entries) for w, (entries, expires_at) in self.lobby_entries.items()
+                if w in live and expires_at > now}
+
+
+class RedisRoomStore(RoomStore):
+    """Redis-backed store shared by every worker and node"""
+
+    # Only extend or drop a lease while we still hold it
+    RENEW_SCRIPT = """
+    local owner = redis.call('GET', KEYS[1])
+    if owner == false or owner == ARGV[1] then
+        redis.call('SET', KEYS[1], ARGV[1], 'PX', ARGV[2])
+        return 1
+    end
+    return 0
+    """
+    RELEASE_SCRIPT = """
+    if redis.call('GET', KEYS[1]) == ARGV[1] then
+        return redis.call('DEL', KEYS[1])
+    end
+    return 0
+    """
+
+    def __init__(self, url: str, prefix: str = "escape_room"):
+        # Optional dependency - only needed when running more than one worker
+        import redis.asyncio as redis
+
+        self.redis = redis.from_url(url, decode_responses=True)
+        self.prefix = prefix
+        self._renew = self.redis.register_script(self.RENEW_SCRIPT)
+        self._release = self.redis.register_script(self.RELEASE_SCRIPT)
+
+    def _owner_key(self, room_id: str) -> str:
+        return f"{self.prefix}:room:{room_id}:owner"
+
+    def _state_key(self, room_id: str) -> str:
+        return f"{self.prefix}:room:{room_id}:state"
+
+    def _channel(self, worker_id: str) -> str:
+        return f"{self.prefix}:worker:{worker_id}"
+
+    async def claim(self, room_id: str, worker_id: str, ttl: float) -> str:
+        key = self._owner_key(room_id)
+        while True:
+            if await self.redis.set(key, worker_id, nx=True, px=int(ttl * 1000)):
+                return worker_id
+            owner = await self.redis.get(key)
+            if owner is not None and owner != worker_id:
+                return owner
+            # Lease expired between the two calls, or we are re-claiming our own
+            # room; the script only takes it if nobody else got there first
+            if await self._renew(keys=[key], args=[worker_id, int(ttl * 1000)]):
+                return worker_id
+
+    async def owner(self, room_id: str) -> Optional[str]:
+        return await self.redis.get(self._owner_key(room_id))
+
+    async def renew(self, room_ids: Iterable[str], worker_id: str, ttl: float):
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for room_id in room_ids:
+                await self._renew(keys=[self._owner_key(room_id)], args=[worker_id, int(ttl * 1000)], client=pipe)
+            await pipe.execute()
+
+    async def release(self, room_id: str, worker_id: str):
+        await self._release(keys=[self._owner_key(room_id)], args=[worker_id])
+
+    async def save(self, room_id: str, snapshot: dict):
+        await self.redis.set(self._state_key(room_id), json.dumps(snapshot))
+
+    async def load(self, room_id: str) -> Optional[dict]:
+        data = await self.redis.get(self._state_key(room_id))
+        return json.loads(data) if data is not None else None
+
+    async def delete(self, room_id: str):
+        await self.redis.delete(self._state_key(room_id), self._owner_key(room_id))
+
+    async def heartbeat(self, worker_id: str, ttl: float):
+        # Members are a sorted set scored by lease expiry (wall clock, shared by all nodes)
+        now = time.time()
+        key = f"{self.prefix}:workers"
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.zadd(key, {worker_id: now + ttl})
+            pipe.zremrangebyscore(key, '-inf', now)
+            await pipe.execute()
+
+    async def workers(self) -> List[str]:
+        return await self.redis.zrangebyscore(f"{self.prefix}:workers", time.time(), '+inf')
+
+    async def leave(self, worker_id: str):
+        await self.redis.zrem(f"{self.prefix}:workers", worker_id)
+
+    async def publish(self, worker_id: str, message: dict):
+        await self.redis.publish(self._channel(worker_id), json.dumps(message))
+
+    async def subscribe(self, worker_id: str) -> AsyncIterator[dict]:
+        pubsub = self.redis.pubsub()
+        await pubsub.subscribe(self._channel(worker_id))
+        try:
+            async for message in pubsub.listen():
+                if message["type"] == "message":
+                    yield json.loads(message["data"])
+        finally:
+            await pubsub.aclose()
+
+    def _lobby_key(self, worker_id: str) -> str:
+        return f"{self.prefix}:lobby:{worker_id}"
+
+    async def save_lobby(self, worker_id: str, entries: List[dict], ttl: float):
+        await self.redis.set(self._lobby_key(worker_id), json.dumps(entries), px=int(ttl * 1000))
+
+    async def lobbies(self) -> Dict[str, List[dict]]:
+        workers = await self.workers()
+        if not workers:
+            return {}
+        values = await self.redis.mget([self._lobby_key(w) for w in workers])
+        return {w: json.loads(v) for w, v in zip(workers, values) if v is not None}
+
+    async def close(self):
+        await self.redis.aclose()
+
+
+def create_room_store(redis_url: Optional[str]) -> RoomStore:
+    return RedisRoomStore(redis_url) if redis_url else LocalRoomStore()
@@ -1,117 +1,475 @@
-from fastapi import FastAPI, APIRouter, WebSocket, WebSocketDisconnect, HTTPException
-from dotenv import load_dotenv
+from fastapi import FastAPI, APIRouter, WebSocket, WebSocketDisconnect, HTTPException, Query
+from fastapi.responses import ORJSONResponse
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
+from starlette.requests import Request
+from starlette.responses import Response
 import socketio
 import os
 import logging
 import json
-import random
-import string
+import socket
+import time
 from pathlib import Path
 from pydantic import BaseModel, Field
-from typing import Dict, List, Optional, Set
+from typing import Dict, List, Optional, Set, Tuple
 from datetime import datetime, timezone
+from collections import Counter, OrderedDict
 import asyncio
+import contextlib
+import functools
+import hashlib
+import hmac
+import orjson
 
 ROOT_DIR = Path(__file__).parent
-load_dotenv(ROOT_DIR / '.env')
 
-# MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+from ticker import MovementTicker
+from room_store import create_room_store
+from sharding import RemoteCallError, ShardRouter
+from persistence import RoomPersister
+from eventlog import EventLog
+from chat import ChatLog, InvalidCursor
+from game_room import DEFAULT_ROOM_TYPE, ROOM_DEFINITIONS, GameRoom, Player
+from puzzles import apply_item_use, apply_puzzle_solution
+from wire import DEFAULT_PROTOCOL, PROTOCOLS, negotiate_protocol, spectator_room, wire_room
+from broadcast import FrameCache
+import metrics
+from sessions import SessionIndex
+from ratelimit import BackpressureServer, Limit, RateLimiter
+from interest import InterestManager
+from lobby import LobbyIndex
+from ids import RoomIdAllocator, RoomIdsExhausted, player_id_for
+from mongo import LazyMongo
+from actors import InboxFull, RoomActors
+
+# MongoDB connection, opened on first use; GET /api/ready reports whether it is reachable
+db = LazyMongo(os.environ.get('MONGO_URL'), os.environ.get('DB_NAME'),
+               timeout=float(os.environ.get('MONGO_TIMEOUT', '5')))
+
+# Multi-worker setup: with REDIS_URL set, emits fan out across workers through
+# Redis pub/sub and rooms are leased to one worker at a time via the room store
+redis_url = os.environ.get('REDIS_URL')
+WORKER_ID = os.environ.get('WORKER_ID') or f"{socket.gethostname()}-{os.getpid()}"
+ROOM_LEASE_TTL = float(os.environ.get('ROOM_LEASE_TTL', '30'))
+room_store = create_room_store(redis_url)
+# Rooms are spread over live workers by consistent hashing on room_id; on the
+# owner, each room's events run one at a time from a bounded inbox
+room_actors = RoomActors(int(os.environ.get('ROOM_INBOX_SIZE', '256')))
+shard_router = ShardRouter(room_store, WORKER_ID, heartbeat_ttl=float(os.environ.get('SHARD_HEARTBEAT_TTL', '10')),
+                           actors=room_actors)
 
 # Socket.IO server
-sio = socketio.AsyncServer(
+sio = BackpressureServer(
     async_mode='asgi',
     cors_allowed_origins='*',
+    client_manager=socketio.AsyncRedisManager(redis_url) if redis_url else None,
     logger=False,
-    engineio_logger=False
+    engineio_logger=False,
+    # Movement snapshots are skipped for sockets with more packets than this waiting to be sent
+    max_backlog=int(os.environ.get('MAX_SEND_BACKLOG', '32'))
+)
+
+# Per-socket token buckets, checked before an event is routed to the room's owner
+rate_limiter = RateLimiter({
+    "player_move": Limit(float(os.environ.get('MOVE_RATE_LIMIT', '60')), 20, "coalesce"),
+    "send_message": Limit(float(os.environ.get('CHAT_RATE_LIMIT', '2')), 5),
+    "quick_chat": Limit(float(os.environ.get('CHAT_RATE_LIMIT', '2')), 5),
+    "examine_object": Limit(5, 10),
+    "pickup_item": Limit(5, 10),
+    "use_item": Limit(5, 10),
+    "check_pressure_plates": Limit(10, 20),
+    "cooperative_door_open": Limit(5, 10),
+    "start_game": Limit(1, 3),
+    "sync_state": Limit(1, 3),
+    "join_room": Limit(1, 5),
+    "spectate_room": Limit(1, 5),
+})
+
+# Puzzle attempts are limited per player on the room's owner, so reconnecting
+# with a new socket does not refill the bucket
+player_rate_limiter = RateLimiter({
+    "solve_puzzle": Limit(float(os.environ.get('PUZZLE_RATE_LIMIT', '1')), 5),
+})
+
+# Per-socket snapshots (room_state, catch-up patches) are encoded once per room state
+frame_cache = FrameCache(sio)
+
+# Movement is coalesced and broadcast at a fixed tick rate instead of per packet
+# Wire protocols clients may negotiate at connect time
+WIRE_PROTOCOLS = [p for p in os.environ.get('WIRE_PROTOCOLS', ','.join(PROTOCOLS)).split(',') if p in PROTOCOLS]
+# Rooms larger than INTEREST_FULL_VIEW players only send each socket the movement near it
+movement_interest = InterestManager(
+    quantum=float(os.environ.get('MOVE_QUANTUM', '1')),
+    radius=float(os.environ.get('INTEREST_RADIUS', '400')),
+    full_view_players=int(os.environ.get('INTEREST_FULL_VIEW', '8'))
 )
+movement_ticker = MovementTicker(sio, tick_rate=float(os.environ.get('MOVE_TICK_RATE', '20')),
+                                 protocols=WIRE_PROTOCOLS, interest=movement_interest)
 
-# FastAPI app
-app = FastAPI(title="The Locked Study - Multiplayer Escape Room")
 api_router = APIRouter(prefix="/api")
 
-# Wrap with Socket.IO - mount on /api/socket.io path
-socket_app = socketio.ASGIApp(sio, app, socketio_path='/api/socket.io')
-
-# Game State Management
-class GameRoom:
-    def __init__(self, room_id: str, host_id: str):
-        self.room_id = room_id
-        self.host_id = host_id
-        self.players: Dict[str, dict] = {}
-        self.status = "lobby"  # lobby, playing, won
-        self.created_at = datetime.now(timezone.utc)
-        self.inventory: List[str] = []  # Shared inventory
-        self.puzzle_states = {
-            "code_lock": {"solved": False, "code": self._generate_code(4)},
-            "safe": {"solved": False, "combination": self._generate_code(3)},
-            "jigsaw": {"solved": False, "pieces": [False] * 9},
-            "uv_light": {"solved": False, "revealed": False},
-            "clock": {"solved": False, "target_time": "3:15"},
-            "cipher": {"solved": False, "answer": "BENEATH RUG"},
-            "color_mix": {"solved": False},
-            "slider": {"solved": False},
-            "door": {"unlocked": False}
-        }
-        self.objects_state = {
-            "book": {"examined": False, "clue": None},
-            "painting": {"examined": False, "clue": None},
-            "note": {"examined": False, "uv_revealed": False},
-            "drawer": {"open": False, "contains": "key_piece_1"},
-            "safe": {"open": False, "contains": "key_piece_2"},
-            "jigsaw_table": {"complete": False, "contains": "key_piece_3"},
-            "uv_lamp": {"picked_up": False},
-            "door": {"unlocked": False},
-            "clock": {"examined": False, "contains": "clock_hint"},
-            "cipher_book": {"examined": False},
-            "lamp_panel": {"examined": False},
-            "slider_box": {"open": False, "contains": "hidden_compartment_key"},
-            "fireplace": {"examined": False, "clue": "When shadows meet at quarter past three, the answer you will see."}
-        }
-        self._generate_clues()
-        self.messages: List[dict] = []
-        
-    def _generate_code(self, length: int) -> str:
-        return ''.join(random.choices('0123456789', k=length))
-    
-    def _generate_clues(self):
-        # Book reveals code lock hint
-        self.objects_state["book"]["clue"] = f"The old diary mentions: 'My lucky number is {self.puzzle_states['code_lock']['code']}'"
-        # Painting reveals safe combination
-        self.objects_state["painting"]["clue"] = f"Behind the frame: {'-'.join(self.puzzle_states['safe']['combination'])}"
-        # Note has hidden message revealed by UV
-        self.objects_state["note"]["hidden_message"] = "The key lies in unity - combine the three pieces"
-    
-    def to_dict(self) -> dict:
-        # Handle puzzle states with different key names
-        puzzle_states_dict = {}
-        for k, v in self.puzzle_states.items():
-            if k == "door":
-                puzzle_states_dict[k] = {"solved": v.get("unlocked", False)}
-            else:
-                puzzle_states_dict[k] = {"solved": v.get("solved", False)}
-        
-        return {
-            "room_id": self.room_id,
-            "host_id": self.host_id,
-            "players": self.players,
-            "status": self.status,
-            "inventory": self.inventory,
-            "puzzle_states": puzzle_states_dict,
-            "objects_state": self.objects_state
-        }
-
-# Store active rooms
-game_rooms: Dict[str, GameRoom] = {}
-player_sessions: Dict[str, str] = {}  # sid -> room_id
+# Rooms idle for longer than the TTL of their status are evicted from memory
+ROOM_TTLS = {
+    "lobby": float(os.environ.get('ROOM_TTL_LOBBY', '1800')),
+    "playing": float(os.environ.get('ROOM_TTL_PLAYING', '7200')),
+    "won": float(os.environ.get('ROOM_TTL_WON', '600'))
+}
+PLAYER_DISCONNECT_TTL = float(os.environ.get('PLAYER_DISCONNECT_TTL', '900'))
+MAX_RESIDENT_ROOMS = int(os.environ.get('MAX_RESIDENT_ROOMS', '10000'))
+REAP_INTERVAL = float(os.environ.get('REAP_INTERVAL', '30'))
+# POST /api/admin/drain hands every room off before a restart; disabled unless a token is set
+DRAIN_TOKEN = os.environ.get('DRAIN_TOKEN')
+DRAIN_RETRY_MS = int(os.environ.get('DRAIN_RETRY_MS', '1000'))  # base client reconnect delay
+draining = False
+
+# Rooms owned by this worker, least recently active first
+game_rooms: "OrderedDict[str, GameRoom]" = OrderedDict()
+room_evictions: Counter = Counter()  # reason -> count
+sessions = SessionIndex()  # sid <-> (room_id, player_id) for rooms owned by this worker
+# Read-only viewers of rooms owned by this worker
+spectators: Dict[str, Set[str]] = {}  # room_id -> sids
+spectating: Dict[str, str] = {}  # sid -> room_id
+# room_id -> ((version, motion), etag, body) for GET /api/rooms/{room_id}
+room_views: Dict[str, Tuple[Tuple[int, int], str, bytes]] = {}
+wire_protocols: Dict[str, str] = {}  # sid -> protocol, for sockets attached to this worker
+
+MAX_PLAYERS = int(os.environ.get('MAX_PLAYERS', '4'))
+# Joinable lobby rooms owned by this worker; every worker publishes its own to
+# the room store, and GET /api/rooms and quick-match read the merged listing
+lobby = LobbyIndex(MAX_PLAYERS)
+listing = LobbyIndex(MAX_PLAYERS)
+LOBBY_SYNC_INTERVAL = float(os.environ.get('LOBBY_SYNC_INTERVAL', '1'))
+
+def movement_viewers(room_id: str):
+    """Bound sockets and their positions, or None while the room is small enough to broadcast"""
+    room = game_rooms.get(room_id)
+    if room is None or len(room.players) <= movement_interest.full_view_players:
+        return None
+    viewers = []
+    for sid in sessions.room_sids(room_id):
+        session = sessions.get(sid)
+        player = room.players.get(session.player_id)
+        if player is not None:
+            viewers.append((sid, session.protocol, player.x, player.y))
+    return viewers
+
+movement_ticker.viewers = movement_viewers
+
+loop_lag_monitor = metrics.LoopLagMonitor()
+metrics.registry.register(metrics.Gauge(
+    "active_rooms", "Rooms resident on this worker", lambda: len(game_rooms)))
+metrics.registry.register(metrics.Gauge(
+    "active_players", "Connected players in resident rooms",
+    lambda: sum(1 for room in game_rooms.values() for p in room.players.values() if not p.disconnected)))
+metrics.registry.register(metrics.Gauge(
+    "active_sessions", "Sockets attached to this worker", lambda: len(wire_protocols)))
+metrics.registry.register(metrics.Gauge(
+    "active_spectators", "Spectators of resident rooms", lambda: len(spectating)))
+metrics.registry.register(metrics.Gauge(
+    "frame_cache_hits_total", "Per-socket snapshots served from an already encoded frame",
+    lambda: frame_cache.hits, kind="counter"))
+metrics.registry.register(metrics.Gauge(
+    "active_room_actors", "Rooms with queued or running events", lambda: len(room_actors)))
+metrics.registry.register(metrics.Gauge(
+    "room_inbox_overflows_total", "Events dropped because a room's inbox was full",
+    lambda: room_actors.overflows, kind="counter"))
+metrics.registry.register(metrics.Gauge(
+    "event_loop_lag_last_seconds", "Most recent event-loop lag sample", lambda: loop_lag_monitor.last_lag))
+metrics.registry.register(metrics.Gauge(
+    "room_evictions_total", "Rooms dropped from memory", lambda: dict(room_evictions), label="reason", kind="counter"))
+
+def snapshot_resident_room(room_id: str) -> Optional[dict]:
+    room = game_rooms.get(room_id)
+    return room.to_snapshot() if room is not None else None
+
+# Dirty rooms are upserted to Mongo in batches, off the event path
+room_persister = RoomPersister(
+    db.rooms,
+    snapshot_resident_room,
+    interval=float(os.environ.get('PERSIST_INTERVAL_MS', '500')) / 1000
+)
+
+# Append-only log of every state op, with a full snapshot every EVENT_SNAPSHOT_EVERY versions
+event_log = EventLog(
+    db.room_events,
+    db.room_snapshots,
+    interval=float(os.environ.get('PERSIST_INTERVAL_MS', '500')) / 1000,
+    snapshot_every=int(os.environ.get('EVENT_SNAPSHOT_EVERY', '100'))
+)
+
+# Room ids are reserved in Mongo in batches so no two workers can hand out the same one
+room_ids = RoomIdAllocator(db.room_ids, shard_router.is_local, worker_id=WORKER_ID)
+
+# Chat is not kept on rooms; messages are inserted in batches and paged from Mongo
+chat_log = ChatLog(db.messages, interval=float(os.environ.get('PERSIST_INTERVAL_MS', '500')) / 1000)
+
+async def resolve_room(room_id: str) -> Optional[GameRoom]:
+    """Return a room owned by this worker, adopting it from the store if its lease is free"""
+    room = game_rooms.get(room_id)
+    if room is not None:
+        room.last_activity = time.monotonic()
+        game_rooms.move_to_end(room_id)
+        return room
+    if draining:
+        return None
+    snapshot = await room_store.load(room_id)
+    handed_off = False
+    if snapshot is not None:
+        # Set by release_room; any other shared copy was left by an owner that crashed
+        handed_off = snapshot.pop("handed_off", False)
+    else:
+        # Not handed over by another worker - rehydrate from the last persisted state
+        snapshot = await room_persister.load(room_id)
+        if snapshot is not None:
+            # After a crash the snapshot can trail the event log, which is written separately
+            snapshot = await event_log.fast_forward(snapshot)
+    if snapshot is None:
+        return None
+    owner = await room_store.claim(room_id, WORKER_ID, ROOM_LEASE_TTL)
+    if owner != WORKER_ID:
+        # Sticky routing should have sent this request to the owner
+        logging.warning(f"Room {room_id} is owned by worker {owner}, not {WORKER_ID}")
+        return None
+    # Another event may have adopted the room while we were awaiting the store
+    room = game_rooms.get(room_id)
+    if room is None:
+        room = GameRoom.from_snapshot(snapshot)
+        await add_resident_room(room, handed_off)
+    return room
+
+async def add_resident_room(room: GameRoom, handed_off: bool = False):
+    """Keep a room in memory; handed_off means its previous owner released it in order"""
+    game_rooms[room.room_id] = room
+    stale = []
+    for pid, player in room.players.items():
+        if player.sid is not None and not player.disconnected:
+            if handed_off:
+                # Sockets bound on the previous owner stay connected; pick them up from the snapshot
+                sessions.bind(player.sid, room.room_id, pid)
+                continue
+            # The previous owner crashed, and no disconnect will arrive for its sockets
+            stale.append(player.sid)
+            room.update_player(pid, sid=None, disconnected=True)
+        if player.disconnected:
+            # Restart the reconnect window; it is not part of the snapshot
+            room.disconnected_since.setdefault(pid, time.monotonic())
+    update_lobby(room)
+    if room.pending_ops:
+        await broadcast_patch(room)
+    elif handed_off:
+        # Clear the hand-off mark, so a later crash is not taken for a hand-off
+        await room_store.save(room.room_id, room.to_snapshot())
+    # Any of those sockets still alive is sent through the client's reconnect path
+    for sid in stale:
+        await sio.emit('server_draining', {"retry_after_ms": DRAIN_RETRY_MS}, to=sid)
+    # Over the cap, the least recently active rooms go back to storage. This
+    # runs on the adopting room's actor, so each eviction is queued on its
+    # own room's actor rather than awaited.
+    for room_id in list(game_rooms)[:max(0, len(game_rooms) - MAX_RESIDENT_ROOMS)]:
+        try:
+            room_actors.post(room_id, functools.partial(evict_lru_room, room_id))
+        except InboxFull:
+            pass  # busy rooms are not worth evicting; a later adoption retries
+
+async def evict_lru_room(room_id: str):
+    if len(game_rooms) > MAX_RESIDENT_ROOMS:
+        await evict_room(room_id, "lru")
+
+async def evict_room(room_id: str, reason: str):
+    """Drop a room from memory; its last state is persisted and can be rehydrated"""
+    room = game_rooms.pop(room_id, None)
+    if room is None:
+        return
+    for pid in room.players:
+        player_rate_limiter.forget((room_id, pid))
+    movement_ticker.discard(room_id)
+    # Sockets still attached would have their events ignored; send them
+    # through the client's reconnect path, whose join_room rehydrates the room
+    attached = sessions.drop_room(room_id) + list(spectators.get(room_id, ()))
+    drop_spectators(room_id)
+    event_log.forget(room_id)
+    room_views.pop(room_id, None)
+    unlist_room(room_id)
+    room_persister.retire(room_id, room.to_snapshot())
+    # The persister now holds the latest state; drop the lease and shared copy
+    await room_store.delete(room_id)
+    for sid in attached:
+        await sio.emit('server_draining', {"retry_after_ms": DRAIN_RETRY_MS}, to=sid)
+    room_evictions[reason] += 1
+    logging.info(f"Evicted room {room_id} ({reason})")
+
+async def reap_rooms():
+    """Evict idle rooms and drop players that never came back"""
+    for room_id in list(game_rooms):
+        try:
+            await room_actors.run(room_id, functools.partial(reap_room, room_id))
+        except InboxFull:
+            pass  # a backed-up room is not idle
+        except Exception:
+            logging.exception(f"Failed to reap room {room_id}")
+
+async def reap_room(room_id: str):
+    room = game_rooms.get(room_id)
+    if room is None:
+        return
+    now = time.monotonic()
+    if now - room.last_activity > ROOM_TTLS.get(room.status, ROOM_TTLS["lobby"]):
+        await evict_room(room_id, f"idle_{room.status}")
+        return
+    gone = [pid for pid, since in room.disconnected_since.items() if now - since > PLAYER_DISCONNECT_TTL]
+    for pid in gone:
+        del room.disconnected_since[pid]
+        if pid in room.players:
+            room.remove_player(pid)
+            room_evictions["player"] += 1
+    if gone:
+        await broadcast_patch(room)
+
+async def run_reaper():
+    while True:
+        await asyncio.sleep(REAP_INTERVAL)
+        try:
+            await reap_rooms()
+        except Exception:
+            logging.exception("Room reaper failed")
+
+async def resolve_session(sid: str):
+    """Room and player bound to a socket by join_room; ids in the payload are not trusted"""
+    session = sessions.get(sid)
+    if session is None:
+        return None, None
+    room = await resolve_room(session.room_id)
+    if room is None or session.player_id not in room.players:
+        return None, None
+    return room, session.player_id
+
+async def resolve_viewer(sid: str) -> Optional[GameRoom]:
+    """Room a socket may read: its player's room or the room it spectates"""
+    room, _ = await resolve_session(sid)
+    if room is None and sid in spectating:
+        room = await resolve_room(spectating[sid])
+    return room
+
+def bound_room(sid: str) -> Optional[str]:
+    """Room a socket is bound to on this worker, as a player or a spectator"""
+    session = sessions.get(sid)
+    return session.room_id if session is not None else spectating.get(sid)
+
+shard_router.locate = bound_room
+
+def drop_spectators(room_id: str):
+    for sid in spectators.pop(room_id, ()):
+        spectating.pop(sid, None)
+    frame_cache.forget(room_id)
+
+async def send_room_state(sid: str, room: GameRoom):
+    key = (room.room_id, "room_state", room.version, room.motion)
+    await frame_cache.send(sid, key, 'room_state', room.to_dict)
+
+async def resolve_room_or_404(room_id: str) -> GameRoom:
+    if draining:
+        raise HTTPException(status_code=503, detail="Server is restarting, try again")
+    room = await resolve_room(room_id)
+    if room is not None:
+        return room
+    owner = await room_store.owner(room_id)
+    if owner is not None and owner != WORKER_ID:
+        raise HTTPException(status_code=409, detail="Room is hosted on another worker",
+                            headers={"X-Room-Worker": owner})
+    raise HTTPException(status_code=404, detail="Room not found")
+
+async def call_owner(room_id: str, handler, payload: dict) -> dict:
+    """Run a registered call handler on the worker that owns room_id"""
+    try:
+        return await shard_router.call(room_id, handler.__name__, payload)
+    except RemoteCallError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+
+async def release_room(room_id: str):
+    """Drop a room from memory, leaving its latest state for whichever worker adopts it next"""
+    room = game_rooms.pop(room_id, None)
+    if room is None:
+        return
+    for pid in room.players:
+        player_rate_limiter.forget((room_id, pid))
+    movement_ticker.discard(room_id)
+    sessions.drop_room(room_id)
+    drop_spectators(room_id)
+    event_log.forget(room_id)
+    room_views.pop(room_id, None)
+    unlist_room(room_id)
+    snapshot = room.to_snapshot()
+    room_persister.retire(room_id, snapshot)
+    # Tells the next owner the sockets in the snapshot are still connected
+    await room_store.save(room_id, {**snapshot, "handed_off": True})
+    await room_store.release(room_id, WORKER_ID)
+
+async def hand_off_rooms():
+    """After the shard ring changes, give up rooms that now belong to another worker"""
+    for room_id in [rid for rid in game_rooms if not shard_router.is_local(rid)]:
+        try:
+            await room_actors.run(room_id, functools.partial(release_room, room_id))
+        except Exception:
+            logging.exception(f"Failed to hand off room {room_id}")
+            continue
+        logging.info(f"Handed room {room_id} to worker {shard_router.owner(room_id)}")
+
+async def drain_room(room_id: str):
+    room = game_rooms.get(room_id)
+    if room is None:
+        return
+    # Players are all about to reconnect; join_room marks them connected again
+    for pid, player in room.players.items():
+        if not player.disconnected:
+            room.update_player(pid, sid=None, disconnected=True)
+    await broadcast_patch(room)
+    await release_room(room_id)
+
+async def drain_worker() -> int:
+    """Hand every room off before this process stops, so a restart loses no games.
+
+    New rooms and connections are refused from here on and /api/ready fails.
+    Each room's state goes to the room store and MongoDB, after the events
+    already queued for it; clients are then told to reconnect, and join_room
+    resumes the room on whichever worker serves it next.
+    """
+    global draining
+    if draining:
+        return 0
+    draining = True
+    # Peers stop routing rooms here; with Redis they adopt them on their next join
+    await shard_router.leave()
+    room_ids = list(game_rooms)
+    for room_id in room_ids:
+        try:
+            await room_actors.run(room_id, functools.partial(drain_room, room_id))
+        except Exception:
+            logging.exception(f"Failed to hand off room {room_id}")
+    for writer in (room_persister, event_log, chat_log):
+        try:
+            await writer.flush()
+        except Exception:
+            logging.exception(f"Failed to flush {type(writer).__name__} while draining")
+    for sid in list(wire_protocols):
+        await sio.emit('server_draining', {"retry_after_ms": DRAIN_RETRY_MS}, to=sid)
+        await sio.disconnect(sid)
+    logging.info(f"Drained {len(room_ids)} rooms")
+    return len(room_ids)
+
+shard_router.on_rebalance = hand_off_rooms
+
+async def renew_room_leases():
+    while True:
+        await asyncio.sleep(ROOM_LEASE_TTL / 3)
+        try:
+            await room_store.renew(list(game_rooms), WORKER_ID, ROOM_LEASE_TTL)
+        except Exception:
+            logging.exception("Failed to renew room leases")
 
 # Pydantic Models
 class CreateRoomRequest(BaseModel):
     player_name: str
+    room_type: str = DEFAULT_ROOM_TYPE
 
 class JoinRoomRequest(BaseModel):
     player_name: str
@@ -122,12 +480,61 @@ class RoomResponse(BaseModel):
     player_id: str
     share_link: str
 
-# Helper functions
-def generate_room_id() -> str:
-    return ''.join(random.choices(string.ascii_lowercase + string.digits, k=6))
+def update_lobby(room: GameRoom):
+    """Refresh a room's lobby listing; only lobby rooms whose host is present are joinable"""
+    host = room.players.get(room.host_id)
+    if room.status != "lobby" or host is None:
+        unlist_room(room.room_id)
+        return
+    entry = {
+        "room_id": room.room_id,
+        "host": host.name,
+        "room_type": room.definition.room_type,
+        "players": len(room.players),
+        "max_players": MAX_PLAYERS
+    }
+    lobby.update(room.room_id, entry)
+    listing.update(room.room_id, entry)
+
+def unlist_room(room_id: str):
+    lobby.discard(room_id)
+    listing.discard(room_id)
+
+async def sync_lobby():
+    """Publish this worker's open rooms and merge in everyone else's"""
+    await room_store.save_lobby(WORKER_ID, list(lobby.open.values()), LOBBY_SYNC_INTERVAL * 3)
+    remote = {
+        entry["room_id"]: entry
+        for worker_id, entries in (await room_store.lobbies()).items() if worker_id != WORKER_ID
+        for entry in entries if entry["room_id"] not in lobby.open
+    }
+    for room_id in [rid for rid in listing.open if rid not in remote and rid not in lobby.open]:
+        listing.discard(room_id)
+    for room_id, entry in remote.items():
+        listing.update(room_id, entry)
+
+async def run_lobby_sync():
+    while True:
+        try:
+            await sync_lobby()
+        except Exception:
+            logging.exception("Failed to sync the lobby listing")
+        await asyncio.sleep(LOBBY_SYNC_INTERVAL)
+
+async def emit_to_room(room: GameRoom, event: str, payload: dict, skip_sid: Optional[str] = None):
+    """Broadcast to the room's sockets, stamped with the room's next sequence number"""
+    await sio.emit(event, {**payload, "seq": room.next_seq()}, room=room.room_id, skip_sid=skip_sid)
 
-def generate_player_id() -> str:
-    return ''.join(random.choices(string.ascii_lowercase + string.digits, k=8))
+async def broadcast_patch(room: GameRoom):
+    """Send the ops recorded since the last flush as a single state_patch"""
+    patch = room.drain_patch()
+    event_log.append(room, patch)
+    if patch:
+        update_lobby(room)
+        await emit_to_room(room, 'state_patch', {"room_id": room.room_id, **patch})
+        # Keep the shared snapshot current so another worker can take the room over
+        await room_store.save(room.room_id, room.to_snapshot())
+        room_persister.mark_dirty(room.room_id)
 
 # REST API Endpoints
 @api_router.get("/")
@@ -136,25 +543,26 @@ async def root():
 
 @api_router.post("/rooms/create", response_model=RoomResponse)
 async def create_room(request: CreateRoomRequest):
-    room_id = generate_room_id()
-    player_id = generate_player_id()
-    
-    room = GameRoom(room_id, player_id)
-    room.players[player_id] = {
-        "id": player_id,
-        "name": request.player_name,
-        "position": {"x": 400, "y": 300},
-        "color": "#D4AF37",
-        "is_host": True
-    }
-    game_rooms[room_id] = room
+    if draining:
+        raise HTTPException(status_code=503, detail="Server is restarting, try again")
+    definition = ROOM_DEFINITIONS.get(request.room_type)
+    if definition is None:
+        raise HTTPException(status_code=400, detail="Unknown room type")
+    # Reserved ids hash to this worker, so the new room never needs forwarding
+    try:
+        room_id = await room_ids.allocate()
+    except RoomIdsExhausted:
+        logging.exception("Could not allocate a room id")
+        raise HTTPException(status_code=503, detail="Could not create a room, try again")
+    player_id = player_id_for(())
     
-    # Store in MongoDB
-    await db.rooms.insert_one({
-        "room_id": room_id,
-        "host_id": player_id,
-        "created_at": datetime.now(timezone.utc).isoformat()
-    })
+    room = GameRoom(room_id, player_id, definition)
+    room.add_player(Player(player_id, request.player_name, 400, 300, "#D4AF37", True))
+    event_log.append(room, room.drain_patch())  # nobody is subscribed yet
+    await add_resident_room(room)
+    await room_store.claim(room_id, WORKER_ID, ROOM_LEASE_TTL)
+    await room_store.save(room_id, room.to_snapshot())
+    room_persister.mark_dirty(room_id)
     
     return RoomResponse(
         room_id=room_id,
@@ -162,90 +570,256 @@ async def create_room(request: CreateRoomRequest):
         share_link=f"/room/{room_id}"
     )
 
-@api_router.post("/rooms/join", response_model=RoomResponse)
-async def join_room(request: JoinRoomRequest):
-    room_id = request.room_id.lower()
+@shard_router.call_handler
+async def add_player_to_room(data: dict) -> dict:
+    room = await resolve_room_or_404(data["room_id"])
     
-    if room_id not in game_rooms:
-        raise HTTPException(status_code=404, detail="Room not found")
-    
-    room = game_rooms[room_id]
-    
-    if len(room.players) >= 4:
+    if len(room.players) >= MAX_PLAYERS:
         raise HTTPException(status_code=400, detail="Room is full")
     
     if room.status == "playing":
         raise HTTPException(status_code=400, detail="Game already in progress")
     
-    player_id = generate_player_id()
+    player_id = player_id_for(room.players)
     colors = ["#ffffff", "#10b981", "#ef4444", "#3b82f6"]
     player_color = colors[len(room.players) % len(colors)]
     
-    room.players[player_id] = {
-        "id": player_id,
-        "name": request.player_name,
-        "position": {"x": 400 + len(room.players) * 50, "y": 300},
-        "color": player_color,
-        "is_host": False
-    }
+    room.add_player(Player(player_id, data["player_name"], 400 + len(room.players) * 50, 300, player_color, False))
+    await broadcast_patch(room)
+    return {"player_id": player_id}
+
+@api_router.get("/rooms")
+async def list_rooms(request: Request, offset: int = Query(0, ge=0), limit: int = Query(20, ge=1, le=100)):
+    """Open lobby rooms on every worker, oldest first"""
+    etag, body = listing.page(offset, limit)
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=2"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
+
+QUICK_MATCH_ATTEMPTS = 3
+
+@api_router.post("/rooms/quick-match", response_model=RoomResponse)
+async def quick_match(request: CreateRoomRequest):
+    """Join the open room closest to full, or create one when there is none"""
+    # Entries from other workers can be a sync interval old; skip rooms that filled up since
+    for _ in range(QUICK_MATCH_ATTEMPTS):
+        room_id = listing.match()
+        if room_id is None:
+            break
+        try:
+            result = await call_owner(room_id, add_player_to_room, {
+                "room_id": room_id,
+                "player_name": request.player_name
+            })
+        except HTTPException as e:
+            if e.status_code not in (400, 404, 409):
+                raise
+            listing.discard(room_id)
+            continue
+        return RoomResponse(
+            room_id=room_id,
+            player_id=result["player_id"],
+            share_link=f"/room/{room_id}"
+        )
+    return await create_room(request)
+
+@api_router.post("/rooms/join", response_model=RoomResponse)
+async def join_room(request: JoinRoomRequest):
+    room_id = request.room_id.lower()
+    result = await call_owner(room_id, add_player_to_room, {
+        "room_id": room_id,
+        "player_name": request.player_name
+    })
     
     return RoomResponse(
         room_id=room_id,
-        player_id=player_id,
+        player_id=result["player_id"],
         share_link=f"/room/{room_id}"
     )
 
+def room_view(room: GameRoom):
+    """ETag and serialized to_dict(), rebuilt only when the room's state changes"""
+    key = (room.version, room.motion)
+    cached = room_views.get(room.room_id)
+    if cached is None or cached[0] != key:
+        body = orjson.dumps(room.to_dict())
+        # Content hash: version and motion restart when a room is rehydrated
+        etag = f'"{hashlib.blake2b(body, digest_size=12).hexdigest()}"'
+        cached = room_views[room.room_id] = (key, etag, body)
+    return cached[1], cached[2]
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = [t.strip().removeprefix("W/") for t in if_none_match.split(",")]
+    return "*" in tags or etag in tags
+
+async def resident_room_view(room_id: str):
+    """room_view of a room this worker owns; run on the room's actor, since resolving may adopt it"""
+    return room_view(await resolve_room_or_404(room_id))
+
+@shard_router.call_handler
+async def room_state_for_client(data: dict) -> dict:
+    etag, body = await resident_room_view(data["room_id"])
+    # Skip shipping the body back when the caller's copy is current
+    return {"etag": etag, "body": None if etag_matches(data.get("etag"), etag) else body.decode()}
+
 @api_router.get("/rooms/{room_id}")
-async def get_room(room_id: str):
-    if room_id not in game_rooms:
-        raise HTTPException(status_code=404, detail="Room not found")
-    return game_rooms[room_id].to_dict()
+async def get_room(room_id: str, request: Request):
+    if_none_match = request.headers.get("if-none-match")
+    if shard_router.is_local(room_id):
+        try:
+            etag, body = await room_actors.run(room_id, functools.partial(resident_room_view, room_id))
+        except InboxFull:
+            raise HTTPException(status_code=503, detail="Room is busy, try again")
+    else:
+        view = await call_owner(room_id, room_state_for_client, {"room_id": room_id, "etag": if_none_match})
+        etag, body = view["etag"], view["body"]
+    # no-cache: browsers keep the copy but revalidate every poll, which the ETag makes cheap
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
+
+@api_router.get("/rooms/{room_id}/messages")
+async def get_messages(room_id: str, before: Optional[str] = None, limit: int = Query(50, ge=1, le=200)):
+    """Chat history, newest page first; pass next_cursor back as `before` for older messages"""
+    try:
+        return await chat_log.page(room_id, before, limit)
+    except InvalidCursor:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+@api_router.get("/rooms/{room_id}/replay")
+async def replay_room(room_id: str, version: Optional[int] = None):
+    """Room state rebuilt from the event log as of `version`, or the latest logged one"""
+    room = await event_log.load(room_id, version)
+    if room is None:
+        raise HTTPException(status_code=404, detail="No events logged for this room")
+    return room.to_dict()
+
+@api_router.get("/ready")
+async def ready():
+    """Readiness probe: 503 until MongoDB answers a ping, and again once draining"""
+    if draining:
+        return ORJSONResponse({"status": "draining"}, status_code=503)
+    if await db.ping(timeout=float(os.environ.get('READY_TIMEOUT', '1'))):
+        return {"status": "ready"}
+    return ORJSONResponse({"status": "waiting for MongoDB"}, status_code=503)
+
+@api_router.post("/admin/drain")
+async def drain(request: Request):
+    """Hand all rooms off ahead of a restart; call before stopping the process"""
+    if not DRAIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not hmac.compare_digest(request.headers.get("authorization", ""), f"Bearer {DRAIN_TOKEN}"):
+        raise HTTPException(status_code=401, detail="Invalid drain token")
+    return {"rooms": await drain_worker()}
+
+@api_router.get("/metrics")
+async def get_metrics():
+    """Prometheus text exposition of this worker's metrics"""
+    return Response(metrics.registry.render(), media_type=metrics.CONTENT_TYPE)
 
 # Socket.IO Events
 @sio.event
 async def connect(sid, environ):
-    logging.info(f"Client connected: {sid}")
+    if draining:
+        return False
+    wire_protocols[sid] = negotiate_protocol(environ, WIRE_PROTOCOLS)
+    logging.info(f"Client connected: {sid} ({wire_protocols[sid]})")
 
 @sio.event
 async def disconnect(sid):
     logging.info(f"Client disconnected: {sid}")
-    if sid in player_sessions:
-        room_id = player_sessions[sid]
-        if room_id in game_rooms:
-            room = game_rooms[room_id]
-            # Find player by sid
-            player_to_remove = None
-            for pid, player in room.players.items():
-                if player.get("sid") == sid:
-                    player_to_remove = pid
-                    break
-            
-            # Only remove player if game hasn't started (lobby only)
-            # During game, just clear the sid to allow reconnection
-            if player_to_remove:
-                if room.status == "lobby":
-                    del room.players[player_to_remove]
-                    await sio.emit('player_left', {
-                        "player_id": player_to_remove,
-                        "players": room.players
-                    }, room=room_id)
-                else:
-                    # Game in progress - mark as disconnected but don't remove
-                    room.players[player_to_remove]["sid"] = None
-                    room.players[player_to_remove]["disconnected"] = True
-        del player_sessions[sid]
+    # While draining, sockets leave to reconnect elsewhere; their players stay in the room
+    if not draining:
+        # Routed to the socket's room, if it has one
+        await player_disconnected(sid, {})
+    shard_router.connections.pop(sid, None)
+    wire_protocols.pop(sid, None)
+    rate_limiter.forget(sid)
+
+@shard_router.event
+async def player_disconnected(sid, data):
+    """Runs on the room's owner for a socket that disconnected from any worker"""
+    room_id = data["room_id"]
+    if spectating.get(sid) == room_id:
+        del spectating[sid]
+        spectators[room_id].discard(sid)
+        if not spectators[room_id]:
+            del spectators[room_id]
+    # Only sockets bound here have a player to update; anything else must not rehydrate the room
+    session = sessions.get(sid)
+    if session is None or session.room_id != room_id:
+        return
+    sessions.unbind(sid)
+    room = await resolve_room(room_id)
+    if room is None:
+        return
+    
+    # Only remove player if game hasn't started (lobby only)
+    # During game, just clear the sid to allow reconnection
+    player_to_remove = session.player_id
+    if player_to_remove in room.players:
+        if room.status == "lobby":
+            room.remove_player(player_to_remove)
+            movement_ticker.discard(room_id, player_to_remove)
+            await broadcast_patch(room)
+            await emit_to_room(room, 'player_left', {
+                "player_id": player_to_remove
+            })
+        else:
+            # Game in progress - mark as disconnected but don't remove
+            room.update_player(player_to_remove, sid=None, disconnected=True)
+            room.disconnected_since[player_to_remove] = time.monotonic()
+            await broadcast_patch(room)
+
+async def notify_rate_limited(sid: str, event: str):
+    await sio.emit('rate_limited', {"event": event}, to=sid)
+
+rate_limiter.on_drop = notify_rate_limited
+player_rate_limiter.on_drop = notify_rate_limited
+shard_router.on_overflow = notify_rate_limited
+
+def with_protocol(handler):
+    """Attach the protocol negotiated by this worker before the event is routed to the owner"""
+    @functools.wraps(handler)
+    async def wrapper(sid, data):
+        if isinstance(data, dict):
+            data = {**data, "protocol": wire_protocols.get(sid, DEFAULT_PROTOCOL)}
+        return await handler(sid, data)
+    return wrapper
+
+def binds_once(handler):
+    """A socket joins or spectates one room for its lifetime; moving it would strand its old binding"""
+    @functools.wraps(handler)
+    async def wrapper(sid, data):
+        bound = shard_router.connections.get(sid)
+        if isinstance(data, dict) and bound is not None and bound != data.get("room_id"):
+            await sio.emit('error', {"message": "This connection is already in another room"}, to=sid)
+            return
+        return await handler(sid, data)
+    return wrapper
 
 @sio.event
+@rate_limiter.limit
+@binds_once
+@with_protocol
+@shard_router.event(binds=True)
 async def join_room(sid, data):
     room_id = data.get("room_id")
     player_id = data.get("player_id")
     player_name = data.get("player_name", "Player")
     
-    if room_id not in game_rooms:
-        await sio.emit('error', {"message": "Room not found"}, to=sid)
+    if sid in spectating:
+        await sio.emit('error', {"message": "Spectators cannot join as players"}, to=sid)
         return
     
-    room = game_rooms[room_id]
+    room = await resolve_room(room_id)
+    if room is None:
+        await sio.emit('error', {"message": "Room not found"}, to=sid)
+        return
     
     # Check if player exists - if not and game is in progress, allow reconnection
     if player_id not in room.players:
@@ -258,325 +832,253 @@ async def join_room(sid, data):
             await sio.emit('error', {"message": "Player not in room"}, to=sid)
             return
     
-    # Store session info and reconnect
-    player_sessions[sid] = room_id
-    room.players[player_id]["sid"] = sid
-    room.players[player_id]["disconnected"] = False
+    # Bind the socket to the player; a previous socket of the same player stops being trusted
+    sessions.bind(sid, room_id, player_id, data.get("protocol", DEFAULT_PROTOCOL))
+    room.update_player(player_id, sid=sid, disconnected=False)
+    room.disconnected_since.pop(player_id, None)
     
-    # Join socket room
+    # Join socket room, plus the per-protocol room used for movement updates
     await sio.enter_room(sid, room_id)
+    await sio.enter_room(sid, wire_room(room_id, data.get("protocol", DEFAULT_PROTOCOL)))
     
-    # Send current state to joining player
-    await sio.emit('room_state', room.to_dict(), to=sid)
+    # Send current state to joining player; the patch below is already reflected in it
+    await send_room_state(sid, room)
+    await broadcast_patch(room)
     
     # Notify others
-    await sio.emit('player_joined', {
-        "player": room.players[player_id],
-        "players": room.players
-    }, room=room_id, skip_sid=sid)
+    await emit_to_room(room, 'player_joined', {
+        "player": room.players[player_id].to_dict()
+    }, skip_sid=sid)
 
 @sio.event
-async def start_game(sid, data):
+@rate_limiter.limit
+@shard_router.event
+async def sync_state(sid, data):
+    """Client detected a version gap - send the missing ops or a full snapshot"""
+    version = data.get("version")
+    
+    room = await resolve_viewer(sid)
+    if room is None:
+        return
+    room_id = room.room_id
+    patch = room.patch_since(version) if isinstance(version, int) else None
+    if patch is not None:
+        key = (room_id, "state_patch", version, room.version)
+        await frame_cache.send(sid, key, 'state_patch', lambda: {"room_id": room_id, **patch})
+    else:
+        await send_room_state(sid, room)
+
+@sio.event
+@rate_limiter.limit
+@binds_once
+@with_protocol
+@shard_router.event(binds=True)
+async def spectate_room(sid, data):
+    """Watch a room read-only: the same broadcasts as its players, but no game actions"""
     room_id = data.get("room_id")
-    player_id = data.get("player_id")
+    protocol = data.get("protocol", DEFAULT_PROTOCOL)
+    
+    if sessions.get(sid) is not None:
+        await sio.emit('error', {"message": "Players cannot spectate"}, to=sid)
+        return
     
-    if room_id not in game_rooms:
+    room = await resolve_room(room_id)
+    if room is None:
+        await sio.emit('error', {"message": "Room not found"}, to=sid)
         return
     
-    room = game_rooms[room_id]
+    spectating[sid] = room_id
+    spectators.setdefault(room_id, set()).add(sid)
+    await sio.enter_room(sid, room_id)
+    await sio.enter_room(sid, wire_room(room_id, protocol))
+    await sio.enter_room(sid, wire_room(spectator_room(room_id), protocol))
+    await send_room_state(sid, room)
+
+@sio.event
+@rate_limiter.limit
+@shard_router.event
+async def start_game(sid, data):
+    room, player_id = await resolve_session(sid)
+    if room is None:
+        return
     
     if room.host_id != player_id:
         await sio.emit('error', {"message": "Only host can start the game"}, to=sid)
         return
     
-    room.status = "playing"
-    await sio.emit('game_started', {"status": "playing"}, room=room_id)
+    room.set_status("playing")
+    await broadcast_patch(room)
+    await emit_to_room(room, 'game_started', {"status": "playing"})
 
 @sio.event
+@rate_limiter.limit
+@shard_router.event
 async def player_move(sid, data):
-    room_id = data.get("room_id")
-    player_id = data.get("player_id")
     position = data.get("position")
     
-    if room_id not in game_rooms:
+    room, player_id = await resolve_session(sid)
+    if room is None:
         return
+    room_id = room.room_id
     
-    room = game_rooms[room_id]
-    
-    if player_id in room.players:
-        room.players[player_id]["position"] = position
-        await sio.emit('player_moved', {
-            "player_id": player_id,
-            "position": position
-        }, room=room_id, skip_sid=sid)
+    if room.move_player(player_id, position):
+        movement_ticker.queue(room_id, player_id, room.players[player_id].position)
 
 @sio.event
+@rate_limiter.limit
+@shard_router.event
 async def examine_object(sid, data):
-    room_id = data.get("room_id")
-    player_id = data.get("player_id")
     object_id = data.get("object_id")
     
-    if room_id not in game_rooms:
+    room, player_id = await resolve_session(sid)
+    if room is None:
         return
     
-    room = game_rooms[room_id]
-    
-    if object_id in room.objects_state:
-        obj = room.objects_state[object_id]
-        obj["examined"] = True
+    if object_id in room.definition.objects and room.in_reach(player_id, object_id):
+        room.set_object_flag(object_id, "examined")
+        await broadcast_patch(room)
         
         response = {"object_id": object_id, "examined": True}
         
-        if "clue" in obj and obj["clue"]:
-            response["clue"] = obj["clue"]
+        clue = room.object_clue(object_id)
+        if clue:
+            response["clue"] = clue
         
-        await sio.emit('object_examined', response, room=room_id)
+        await emit_to_room(room, 'object_examined', response)
 
 @sio.event
+@rate_limiter.limit
+@shard_router.event
 async def pickup_item(sid, data):
-    room_id = data.get("room_id")
-    player_id = data.get("player_id")
     item_id = data.get("item_id")
     
-    if room_id not in game_rooms:
+    room, player_id = await resolve_session(sid)
+    if room is None:
         return
     
-    room = game_rooms[room_id]
-    
-    # Check if item can be picked up
-    if item_id == "uv_lamp" and not room.objects_state["uv_lamp"]["picked_up"]:
-        room.objects_state["uv_lamp"]["picked_up"] = True
-        room.inventory.append("uv_lamp")
-        await sio.emit('item_picked', {
+    # Objects with a picked_up flag can be carried off, once
+    obj = room.definition.objects.get(item_id)
+    if obj is not None and "picked_up" in obj.flags and not room.object_flag(item_id, "picked_up") \
+            and room.in_reach(player_id, item_id):
+        room.set_object_flag(item_id, "picked_up")
+        room.add_item(item_id)
+        await broadcast_patch(room)
+        await emit_to_room(room, 'item_picked', {
             "item_id": item_id,
-            "inventory": room.inventory,
             "player_id": player_id
-        }, room=room_id)
+        })
 
 @sio.event
+@rate_limiter.limit
+@shard_router.event
 async def use_item(sid, data):
-    room_id = data.get("room_id")
-    player_id = data.get("player_id")
     item_id = data.get("item_id")
     target_id = data.get("target_id")
     
-    if room_id not in game_rooms:
+    room, player_id = await resolve_session(sid)
+    if room is None:
         return
     
-    room = game_rooms[room_id]
-    
-    # UV lamp on note
-    if item_id == "uv_lamp" and target_id == "note":
-        room.objects_state["note"]["uv_revealed"] = True
-        room.puzzle_states["uv_light"]["revealed"] = True
-        room.puzzle_states["uv_light"]["solved"] = True
-        await sio.emit('uv_revealed', {
-            "message": room.objects_state["note"]["hidden_message"]
-        }, room=room_id)
-    
-    # Combine key pieces
-    if item_id == "combine_keys":
-        required = ["key_piece_1", "key_piece_2", "key_piece_3"]
-        if all(k in room.inventory for k in required):
-            for k in required:
-                room.inventory.remove(k)
-            room.inventory.append("master_key")
-            await sio.emit('items_combined', {
-                "result": "master_key",
-                "inventory": room.inventory
-            }, room=room_id)
-    
-    # Use master key on door
-    if item_id == "master_key" and target_id == "door":
-        if "master_key" in room.inventory:
-            room.objects_state["door"]["unlocked"] = True
-            room.puzzle_states["door"]["unlocked"] = True
-            room.status = "won"
-            await sio.emit('game_won', {
-                "message": "You've escaped The Locked Study!"
-            }, room=room_id)
+    use = room.definition.item_use(item_id, target_id)
+    if use is None or (use.target is not None and not room.in_reach(player_id, use.target)):
+        return
+    
+    payload = apply_item_use(room, use)
+    if payload is not None:
+        await broadcast_patch(room)
+        await emit_to_room(room, use.event, payload)
 
 @sio.event
+@rate_limiter.limit
+@shard_router.event
 async def check_pressure_plates(sid, data):
     """Check if both pressure plates are pressed for cooperative door opening"""
-    room_id = data.get("room_id")
-    plate_states = data.get("plate_states", {})
-    
-    if room_id not in game_rooms:
+    room, _ = await resolve_session(sid)
+    if room is None:
+        return
+    layout = room.definition.layout
+    plates = layout.plates if layout is not None else {}
+    if not plates or "door" not in room.definition.objects:
         return
     
-    room = game_rooms[room_id]
-    
-    # If both plates pressed, unlock door temporarily
-    if plate_states.get("plate1") and plate_states.get("plate2"):
-        room.objects_state["door"]["cooperative_unlock"] = True
-        await sio.emit('cooperative_unlock', {
+    # Plates are judged from the server's player positions; the client's plate_states are not trusted
+    if all(room.players_in(area) for area in plates.values()):
+        room.set_object_flag("door", "cooperative_unlock")
+        await broadcast_patch(room)
+        await emit_to_room(room, 'cooperative_unlock', {
             "message": "Both pressure plates activated! The door clicks open!",
             "door_unlocked": True
-        }, room=room_id)
+        })
     else:
-        room.objects_state["door"]["cooperative_unlock"] = False
+        room.set_object_flag("door", "cooperative_unlock", False)
+        await broadcast_patch(room)
 
 @sio.event
+@rate_limiter.limit
+@shard_router.event
 async def cooperative_door_open(sid, data):
     """Open door when cooperatively unlocked"""
-    room_id = data.get("room_id")
-    player_id = data.get("player_id")
-    
-    if room_id not in game_rooms:
+    room, player_id = await resolve_session(sid)
+    if room is None or "door" not in room.definition.objects or not room.in_reach(player_id, "door"):
         return
     
-    room = game_rooms[room_id]
-    
     # Check if door can be opened (either master key or cooperative)
     has_master_key = "master_key" in room.inventory
-    cooperative_unlocked = room.objects_state.get("door", {}).get("cooperative_unlock", False)
+    cooperative_unlocked = room.object_flag("door", "cooperative_unlock")
     
     if has_master_key or cooperative_unlocked:
-        room.objects_state["door"]["unlocked"] = True
-        room.puzzle_states["door"]["unlocked"] = True
-        room.status = "won"
-        await sio.emit('game_won', {
-            "message": "🎉 You've escaped The Locked Study through teamwork!"
-        }, room=room_id)
+        room.set_object_flag("door", "unlocked")
+        room.set_solved("door")
+        room.set_status("won")
+        await broadcast_patch(room)
+        await emit_to_room(room, 'game_won', {
+            "message": f"🎉 You've escaped {room.definition.name} through teamwork!"
+        })
 
 @sio.event
+@rate_limiter.limit
+@shard_router.event
 async def solve_puzzle(sid, data):
-    room_id = data.get("room_id")
-    player_id = data.get("player_id")
     puzzle_id = data.get("puzzle_id")
-    answer = data.get("answer")
     
-    if room_id not in game_rooms:
+    room, player_id = await resolve_session(sid)
+    if room is None:
+        return
+    puzzle = room.definition.puzzles.get(puzzle_id)
+    if puzzle is None or room.is_solved(puzzle_id):
+        return
+    if not await player_rate_limiter.admit((room.room_id, player_id), "solve_puzzle", sid):
         return
     
-    room = game_rooms[room_id]
-    
-    if puzzle_id == "code_lock":
-        if answer == room.puzzle_states["code_lock"]["code"]:
-            room.puzzle_states["code_lock"]["solved"] = True
-            room.objects_state["drawer"]["open"] = True
-            item = room.objects_state["drawer"]["contains"]
-            room.inventory.append(item)
-            await sio.emit('puzzle_solved', {
-                "puzzle_id": puzzle_id,
-                "item_found": item,
-                "inventory": room.inventory
-            }, room=room_id)
-        else:
-            await sio.emit('puzzle_failed', {
-                "puzzle_id": puzzle_id,
-                "message": "Wrong code!"
-            }, to=sid)
-    
-    elif puzzle_id == "safe":
-        if answer == room.puzzle_states["safe"]["combination"]:
-            room.puzzle_states["safe"]["solved"] = True
-            room.objects_state["safe"]["open"] = True
-            item = room.objects_state["safe"]["contains"]
-            room.inventory.append(item)
-            await sio.emit('puzzle_solved', {
-                "puzzle_id": puzzle_id,
-                "item_found": item,
-                "inventory": room.inventory
-            }, room=room_id)
-        else:
-            await sio.emit('puzzle_failed', {
-                "puzzle_id": puzzle_id,
-                "message": "Wrong combination!"
-            }, to=sid)
-    
-    elif puzzle_id == "jigsaw":
-        piece_index = data.get("piece_index")
-        if piece_index is not None and 0 <= piece_index < 9:
-            room.puzzle_states["jigsaw"]["pieces"][piece_index] = True
-            
-            if all(room.puzzle_states["jigsaw"]["pieces"]):
-                room.puzzle_states["jigsaw"]["solved"] = True
-                room.objects_state["jigsaw_table"]["complete"] = True
-                item = room.objects_state["jigsaw_table"]["contains"]
-                room.inventory.append(item)
-                await sio.emit('puzzle_solved', {
-                    "puzzle_id": puzzle_id,
-                    "item_found": item,
-                    "inventory": room.inventory
-                }, room=room_id)
-            else:
-                await sio.emit('jigsaw_progress', {
-                    "pieces": room.puzzle_states["jigsaw"]["pieces"]
-                }, room=room_id)
-    
-    elif puzzle_id == "clock":
-        target_time = room.puzzle_states["clock"]["target_time"]
-        if answer == target_time:
-            room.puzzle_states["clock"]["solved"] = True
-            await sio.emit('puzzle_solved', {
-                "puzzle_id": puzzle_id,
-                "item_found": None,
-                "inventory": room.inventory,
-                "message": "The clock chimes... a secret compartment opens!"
-            }, room=room_id)
-        else:
-            await sio.emit('puzzle_failed', {
-                "puzzle_id": puzzle_id,
-                "message": "The clock ticks, but nothing happens..."
-            }, to=sid)
-    
-    elif puzzle_id == "cipher":
-        correct_answer = room.puzzle_states["cipher"]["answer"]
-        if answer.upper().strip() == correct_answer:
-            room.puzzle_states["cipher"]["solved"] = True
-            await sio.emit('puzzle_solved', {
-                "puzzle_id": puzzle_id,
-                "item_found": None,
-                "inventory": room.inventory,
-                "message": "The message decoded! Look beneath the rug..."
-            }, room=room_id)
-        else:
-            await sio.emit('puzzle_failed', {
-                "puzzle_id": puzzle_id,
-                "message": "That doesn't seem right. Try again."
-            }, to=sid)
-    
-    elif puzzle_id == "color_mix":
-        # answer is True if correct colors were mixed
-        if answer == True:
-            room.puzzle_states["color_mix"]["solved"] = True
-            await sio.emit('puzzle_solved', {
-                "puzzle_id": puzzle_id,
-                "item_found": None,
-                "inventory": room.inventory,
-                "message": "The darkness reveals a hidden pattern!"
-            }, room=room_id)
-        else:
+    outcome = puzzle.validate(room, data)
+    if outcome is True:
+        payload = apply_puzzle_solution(room, puzzle)
+        await broadcast_patch(room)
+        if payload is not None:
+            await emit_to_room(room, 'puzzle_solved', payload)
+    elif outcome is False:
+        if puzzle.fail_message is not None:
             await sio.emit('puzzle_failed', {
                 "puzzle_id": puzzle_id,
-                "message": "That's not the color of shadow..."
+                "message": puzzle.fail_message
             }, to=sid)
-    
-    elif puzzle_id == "slider":
-        # answer is True if puzzle was solved
-        if answer == True:
-            room.puzzle_states["slider"]["solved"] = True
-            room.objects_state["slider_box"]["open"] = True
-            await sio.emit('puzzle_solved', {
-                "puzzle_id": puzzle_id,
-                "item_found": "hidden_compartment_key",
-                "inventory": room.inventory,
-                "message": "The puzzle box clicks open!"
-            }, room=room_id)
+    elif isinstance(outcome, dict):
+        # Partial progress (placed pieces) is versioned state too
+        await broadcast_patch(room)
+        if puzzle.progress_event is not None:
+            await emit_to_room(room, puzzle.progress_event, outcome)
 
 @sio.event
+@rate_limiter.limit
+@shard_router.event
 async def send_message(sid, data):
-    room_id = data.get("room_id")
-    player_id = data.get("player_id")
     message = data.get("message")
     
-    if room_id not in game_rooms:
+    room, player_id = await resolve_session(sid)
+    if room is None:
         return
-    
-    room = game_rooms[room_id]
-    player_name = room.players.get(player_id, {}).get("name", "Unknown")
+    room_id = room.room_id
+    player_name = room.players[player_id].name
     
     chat_message = {
         "player_id": player_id,
@@ -585,31 +1087,31 @@ async def send_message(sid, data):
         "timestamp": datetime.now(timezone.utc).isoformat()
     }
     
-    room.messages.append(chat_message)
-    await sio.emit('new_message', chat_message, room=room_id)
+    chat_log.append(room_id, chat_message)
+    await emit_to_room(room, 'new_message', chat_message)
+
+QUICK_MESSAGES = {
+    "look": "Look here!",
+    "found": "I found something!",
+    "help": "I need help!",
+    "idea": "I have an idea!",
+    "yes": "Yes!",
+    "no": "No!"
+}
 
 @sio.event
+@rate_limiter.limit
+@shard_router.event
 async def quick_chat(sid, data):
-    room_id = data.get("room_id")
-    player_id = data.get("player_id")
     quick_message = data.get("quick_message")
     
-    if room_id not in game_rooms:
+    room, player_id = await resolve_session(sid)
+    if room is None:
         return
+    room_id = room.room_id
+    player_name = room.players[player_id].name
     
-    room = game_rooms[room_id]
-    player_name = room.players.get(player_id, {}).get("name", "Unknown")
-    
-    quick_messages = {
-        "look": "Look here!",
-        "found": "I found something!",
-        "help": "I need help!",
-        "idea": "I have an idea!",
-        "yes": "Yes!",
-        "no": "No!"
-    }
-    
-    message_text = quick_messages.get(quick_message, quick_message)
+    message_text = QUICK_MESSAGES.get(quick_message, quick_message)
     
     chat_message = {
         "player_id": player_id,
@@ -619,30 +1121,89 @@ async def quick_chat(sid, data):
         "timestamp": datetime.now(timezone.utc).isoformat()
     }
     
-    room.messages.append(chat_message)
-    await sio.emit('new_message', chat_message, room=room_id)
+    chat_log.append(room_id, chat_message)
+    await emit_to_room(room, 'new_message', chat_message)
 
-# Include the router
-app.include_router(api_router)
+# Events routed here from other workers skip Socket.IO dispatch, so time them separately;
+# the worker that forwarded them does not (see metrics.mark_forwarded)
+for name, handler in shard_router.handlers.items():
+    shard_router.handlers[name] = metrics.handler_latency.time(name)(handler)
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_credentials=True,
-    allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
 logger = logging.getLogger(__name__)
 
-@app.on_event("shutdown")
+background_tasks: List[asyncio.Task] = []
+
+async def start_background_tasks():
+    movement_ticker.start()
+    loop_lag_monitor.start()
+    room_persister.start()
+    event_log.start()
+    chat_log.start()
+    await shard_router.refresh_members()
+    background_tasks.append(asyncio.create_task(renew_room_leases()))
+    background_tasks.append(asyncio.create_task(run_reaper()))
+    background_tasks.append(asyncio.create_task(shard_router.run_membership()))
+    background_tasks.append(asyncio.create_task(shard_router.listen()))
+    background_tasks.append(asyncio.create_task(run_lobby_sync()))
+
 async def shutdown_db_client():
-    client.close()
+    # Hand owned rooms back so another worker can adopt them immediately. By
+    # now the server has closed its sockets; POST /api/admin/drain beforehand
+    # also keeps lobby players, who are otherwise removed on disconnect.
+    await drain_worker()
+    await movement_ticker.stop()
+    await loop_lag_monitor.stop()
+    for task in background_tasks:
+        task.cancel()
+    await room_persister.stop()
+    await event_log.stop()
+    await chat_log.stop()
+    await room_store.close()
+    db.close()
+
+@contextlib.asynccontextmanager
+async def lifespan(app: FastAPI):
+    await start_background_tasks()
+    yield
+    await shutdown_db_client()
+
+async def time_requests(request: Request, call_next):
+    started = time.perf_counter()
+    response = await call_next(request)
+    # Label by route template so room ids do not create a series each
+    route = request.scope.get("route")
+    metrics.http_latency.observe(time.perf_counter() - started, route.path if route is not None else "unmatched")
+    return response
 
-# Export socket_app for uvicorn
-app = socket_app
+def create_app():
+    """Build the ASGI app: `uvicorn --factory server:create_app`.
+
+    Importing this module only defines handlers and state; .env, logging,
+    the HTTP app and background tasks are set up here, and MongoDB is
+    connected on first use. Settings read at import time come from the
+    process environment, so pass `--env-file .env` to uvicorn to set them
+    from the file.
+    """
+    from dotenv import load_dotenv
+
+    load_dotenv(ROOT_DIR / '.env')
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    app = FastAPI(
+        title="The Locked Study - Multiplayer Escape Room",
+        default_response_class=ORJSONResponse,
+        lifespan=lifespan
+    )
+    app.include_router(api_router)
+    app.middleware("http")(time_requests)
+    app.add_middleware(
+        CORSMiddleware,
+        allow_credentials=True,
+        allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+    # Socket.IO is mounted on /api/socket.io
+    return socketio.ASGIApp(sio, app, socketio_path='/api/socket.io')
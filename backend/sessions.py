@@ -0,0 +1,61 @@
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+
+
+class Session(NamedTuple):
+    room_id: str
+    player_id: str
+    protocol: str = "json"  # wire protocol negotiated by the socket
+
+
+class SessionIndex:
+    """Bidirectional sid <-> (room_id, player_id) index for rooms owned by this worker.
+
+    Handlers resolve the caller from its sid instead of trusting ids sent in
+    the payload; a player has at most one bound socket, so reconnecting from
+    a new socket unbinds the old one.
+    """
+
+    def __init__(self):
+        self.by_sid: Dict[str, Session] = {}
+        self.by_player: Dict[Tuple[str, str], str] = {}  # (room_id, player_id) -> sid
+        self.by_room: Dict[str, Set[str]] = {}  # room_id -> bound sids
+
+    def __len__(self) -> int:
+        return len(self.by_sid)
+
+    def get(self, sid: str) -> Optional[Session]:
+        return self.by_sid.get(sid)
+
+    def sid_for(self, room_id: str, player_id: str) -> Optional[str]:
+        return self.by_player.get((room_id, player_id))
+
+    def bind(self, sid: str, room_id: str, player_id: str, protocol: str = "json") -> Optional[str]:
+        """Bind a socket to a player; returns the player's previous sid, if it had one"""
+        self.unbind(sid)
+        previous = self.by_player.get((room_id, player_id))
+        if previous is not None:
+            self.unbind(previous)
+        self.by_sid[sid] = Session(room_id, player_id, protocol)
+        self.by_player[(room_id, player_id)] = sid
+        self.by_room.setdefault(room_id, set()).add(sid)
+        return previous
+
+    def unbind(self, sid: str) -> Optional[Session]:
+        session = self.by_sid.pop(sid, None)
+        if session is None:
+            return None
+        del self.by_player[(session.room_id, session.player_id)]
+        sids = self.by_room[session.room_id]
+        sids.discard(sid)
+        if not sids:
+            del self.by_room[session.room_id]
+        return session
+
+    def room_sids(self, room_id: str) -> Set[str]:
+        return self.by_room.get(room_id, set())
+
+    def drop_room(self, room_id: str) -> List[str]:
+        sids = list(self.by_room.get(room_id, ()))
+        for sid in sids:
+            self.unbind(sid)
+        return sids
@@ -0,0 +1,275 @@
+import asyncio
+import bisect
+import functools
+import hashlib
+import logging
+import uuid
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Set
+
+import metrics
+from actors import InboxFull, RoomActors
+
+logger = logging.getLogger(__name__)
+
+
+class HashRing:
+    """Consistent hash ring mapping room ids to worker shards.
+
+    Each shard is placed on the ring at `replicas` points so that adding or
+    removing one only moves roughly 1/N of the rooms.
+    """
+
+    def __init__(self, nodes: Iterable[str] = (), replicas: int = 160):
+        self.replicas = replicas
+        self.nodes: Set[str] = set()
+        self._hashes: List[int] = []
+        self._owners: List[str] = []
+        for node in nodes:
+            self.add(node)
+
+    @staticmethod
+    def _hash(key: str) -> int:
+        return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), 'big')
+
+    def add(self, node: str):
+        if node in self.nodes:
+            return
+        self.nodes.add(node)
+        for i in range(self.replicas):
+            point = self._hash(f"{node}#{i}")
+            index = bisect.bisect(self._hashes, point)
+            self._hashes.insert(index, point)
+            self._owners.insert(index, node)
+
+    def remove(self, node: str):
+        if node not in self.nodes:
+            return
+        self.nodes.discard(node)
+        kept = [(h, o) for h, o in zip(self._hashes, self._owners) if o != node]
+        self._hashes = [h for h, _ in kept]
+        self._owners = [o for _, o in kept]
+
+    def owner(self, key: str) -> Optional[str]:
+        if not self._hashes:
+            return None
+        index = bisect.bisect(self._hashes, self._hash(key)) % len(self._hashes)
+        return self._owners[index]
+
+
+class RemoteCallError(Exception):
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+class ShardRouter:
+    """Routes room traffic to the worker that owns the room on the hash ring.
+
+    Socket.IO events for a room owned elsewhere are published to the owner,
+    which runs the handler with the original sid; replies reach the client
+    through the shared Socket.IO client manager. Workers discover each other
+    through heartbeats in the room store and rebuild the ring when the set
+    of live workers changes. On the owner, every event and call for a room
+    runs through that room's actor, so they apply one at a time in order.
+    """
+
+    def __init__(self, store, worker_id: str, heartbeat_ttl: float = 10.0, call_timeout: float = 5.0,
+                 actors: Optional[RoomActors] = None):
+        self.store = store
+        self.worker_id = worker_id
+        self.heartbeat_ttl = heartbeat_ttl
+        self.call_timeout = call_timeout
+        self.ring = HashRing([worker_id])
+        self.handlers: Dict[str, Callable[..., Awaitable]] = {}
+        self.binding: Set[str] = set()  # handlers that bind a socket to the room in their payload
+        self.calls: Dict[str, Callable[[dict], Awaitable[dict]]] = {}
+        # sid -> room_id joined or spectated by sockets attached to this worker, wherever the room lives
+        self.connections: Dict[str, str] = {}
+        # Returns the room a socket is bound to on this worker, if any
+        self.locate: Optional[Callable[[str], Optional[str]]] = None
+        self.pending: Dict[str, asyncio.Future] = {}
+        self.actors = actors if actors is not None else RoomActors()
+        self.on_rebalance: Optional[Callable[[], Awaitable]] = None
+        self.left = False
+        self._membership: Optional[asyncio.Task] = None
+        # Called with (sid, event) when an event is dropped because its room's inbox is full
+        self.on_overflow: Optional[Callable[[str, str], Awaitable]] = None
+
+    def owner(self, room_id: str) -> str:
+        return self.ring.owner(room_id) or self.worker_id
+
+    def is_local(self, room_id: str) -> bool:
+        return self.owner(room_id) == self.worker_id
+
+    def room_of(self, sid: str) -> Optional[str]:
+        """Room a socket's events belong to: its bound room here, else the one it joined through this worker"""
+        room_id = self.locate(sid) if self.locate is not None else None
+        return room_id if room_id is not None else self.connections.get(sid)
+
+    def event(self, handler=None, *, binds: bool = False):
+        """Wrap a Socket.IO handler so it runs on the shard owning the socket's room.
+
+        The room comes from the socket's session, not the payload; only
+        handlers that bind a socket to a room (binds=True) read
+        data['room_id'], which then routes the socket's later events.
+        Handlers get the routed room in data['room_id'].
+        """
+        if handler is None:
+            return functools.partial(self.event, binds=binds)
+        name = handler.__name__
+        self.handlers[name] = handler
+        if binds:
+            self.binding.add(name)
+
+        @functools.wraps(handler)
+        async def routed(sid, data):
+            data = data if isinstance(data, dict) else {}
+            if binds:
+                room_id = data.get("room_id")
+                if room_id is None:
+                    return await handler(sid, data)
+                self.connections[sid] = room_id
+            else:
+                room_id = self.room_of(sid)
+                if room_id is None:
+                    return
+                data = {**data, "room_id": room_id}
+            owner = self.owner(room_id)
+            if owner == self.worker_id:
+                try:
+                    return await self.actors.run(room_id, lambda: handler(sid, data))
+                except InboxFull:
+                    logger.warning(f"Dropped {name} from {sid}: room {room_id} is backed up")
+                    if self.on_overflow is not None:
+                        await self.on_overflow(sid, name)
+                    return
+            metrics.mark_forwarded()
+            await self.store.publish(owner, {"type": "event", "event": name, "sid": sid, "data": data})
+
+        return routed
+
+    async def _run_routed(self, name: str, sid: str, data: dict):
+        # The sending worker routed by the room it knows for the socket; if the
+        # socket is bound to another room here, running it would touch that room
+        # outside its actor
+        room_id = data["room_id"]
+        bound = self.locate(sid) if self.locate is not None else None
+        if name not in self.binding and bound is not None and bound != room_id:
+            logger.warning(f"Dropped routed {name} from {sid}: bound to room {bound}, not {room_id}")
+            return
+        await self.handlers[name](sid, data)
+
+    def call_handler(self, handler):
+        """Register a request/reply handler that can be invoked on the owning shard"""
+        self.calls[handler.__name__] = handler
+        return handler
+
+    async def call(self, room_id: str, name: str, payload: dict) -> dict:
+        owner = self.owner(room_id)
+        if owner == self.worker_id:
+            try:
+                return await self.actors.run(room_id, lambda: self.calls[name](payload))
+            except InboxFull:
+                raise RemoteCallError(503, "Room is busy, try again")
+        call_id = uuid.uuid4().hex
+        future = asyncio.get_running_loop().create_future()
+        self.pending[call_id] = future
+        try:
+            await self.store.publish(owner, {
+                "type": "call", "call": name, "data": payload, "room_id": room_id,
+                "call_id": call_id, "reply_to": self.worker_id
+            })
+            return await asyncio.wait_for(future, self.call_timeout)
+        except asyncio.TimeoutError:
+            raise RemoteCallError(503, f"Worker {owner} did not respond")
+        finally:
+            self.pending.pop(call_id, None)
+
+    async def _dispatch(self, message: dict):
+        kind = message.get("type")
+        if kind == "event":
+            # Run the handler here without re-routing - that could bounce between
+            # workers whose rings briefly disagree during a rebalance. Queueing
+            # rather than awaiting lets other rooms' messages through meanwhile.
+            name, sid, data = message["event"], message["sid"], message["data"]
+            try:
+                self.actors.post(data["room_id"], lambda: self._run_routed(name, sid, data))
+            except InboxFull:
+                logger.warning(f"Dropped routed {message['event']} from {sid}: room {data['room_id']} is backed up")
+        elif kind == "call":
+            try:
+                self.actors.post(message["room_id"], lambda: self._answer(message))
+            except InboxFull:
+                await self.store.publish(message["reply_to"], {
+                    "type": "reply", "call_id": message["call_id"], "error": [503, "Room is busy, try again"]
+                })
+        elif kind == "reply":
+            future = self.pending.get(message["call_id"])
+            if future is not None and not future.done():
+                if "error" in message:
+                    future.set_exception(RemoteCallError(*message["error"]))
+                else:
+                    future.set_result(message["result"])
+
+    async def _answer(self, message: dict):
+        reply = {"type": "reply", "call_id": message["call_id"]}
+        try:
+            reply["result"] = await self.calls[message["call"]](message["data"])
+        except Exception as e:
+            reply["error"] = [getattr(e, "status_code", 500), getattr(e, "detail", str(e))]
+        await self.store.publish(message["reply_to"], reply)
+
+    async def listen(self, max_backoff: float = 5.0):
+        # Messages are queued in arrival order, so events for a room keep their order
+        backoff = 0.1
+        while True:
+            try:
+                async for message in self.store.subscribe(self.worker_id):
+                    backoff = 0.1
+                    try:
+                        await self._dispatch(message)
+                    except Exception:
+                        logger.exception(f"Failed to handle routed message {message.get('type')}")
+            except Exception:
+                logger.exception(f"Lost the routing subscription, resubscribing in {backoff:.1f}s")
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, max_backoff)
+
+    async def refresh_members(self):
+        if self.left:
+            return
+        await self.store.heartbeat(self.worker_id, self.heartbeat_ttl)
+        live = set(await self.store.workers()) | {self.worker_id}
+        if live == self.ring.nodes:
+            return
+        added, removed = live - self.ring.nodes, self.ring.nodes - live
+        for node in added:
+            self.ring.add(node)
+        for node in removed:
+            self.ring.remove(node)
+        logger.info(f"Shard ring changed: +{sorted(added)} -{sorted(removed)}")
+        if self.on_rebalance is not None:
+            await self.on_rebalance()
+
+    async def run_membership(self):
+        self._membership = asyncio.current_task()
+        while not self.left:
+            try:
+                await self.refresh_members()
+            except Exception:
+                logger.exception("Failed to refresh shard membership")
+            await asyncio.sleep(self.heartbeat_ttl / 3)
+
+    async def leave(self):
+        """Stop heartbeating and drop out of the ring; peers stop routing rooms here"""
+        self.left = True
+        # A heartbeat landing after the removal would put this worker back
+        if self._membership is not None and self._membership is not asyncio.current_task():
+            self._membership.cancel()
+            try:
+                await self._membership
+            except asyncio.CancelledError:
+                pass
+            self._membership = None
+        await self.store.leave(self.worker_id)
@@ -0,0 +1,95 @@
+import asyncio
+import logging
+from typing import Callable, Dict, Iterable, List, Optional
+
+from interest import InterestManager, Viewer
+from wire import PROTOCOLS, pack_positions, spectator_room, wire_room
+
+logger = logging.getLogger(__name__)
+
+
+class MovementTicker:
+    """Coalesces player_move packets and broadcasts one snapshot per room per tick"""
+
+    def __init__(self, sio, tick_rate: float = 20.0, protocols: Iterable[str] = PROTOCOLS,
+                 interest: Optional[InterestManager] = None):
+        self.sio = sio
+        self.binary = "binary" in protocols
+        self.interest = interest or InterestManager()
+        # Returns the sockets to filter movement for, or None to broadcast to the whole room
+        self.viewers: Callable[[str], Optional[List[Viewer]]] = lambda room_id: None
+        self.tick_rate = tick_rate
+        self.interval = 1.0 / tick_rate
+        # room_id -> {player_id: latest position}
+        self.pending: Dict[str, Dict[str, dict]] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def queue(self, room_id: str, player_id: str, position: dict):
+        # Later packets for the same player overwrite earlier ones within a tick
+        self.pending.setdefault(room_id, {})[player_id] = position
+
+    def discard(self, room_id: str, player_id: Optional[str] = None):
+        if player_id is None:
+            self.pending.pop(room_id, None)
+        elif room_id in self.pending:
+            self.pending[room_id].pop(player_id, None)
+        self.interest.forget(room_id, player_id)
+
+    async def flush(self):
+        if not self.pending:
+            return
+        # Swap the buffer first so packets arriving mid-flush land in the next tick
+        pending, self.pending = self.pending, {}
+        for room_id, moves in pending.items():
+            moves = self.interest.changed(room_id, moves)
+            if not moves:
+                continue
+            viewers = self.viewers(room_id)
+            if viewers is None:
+                await self.send(moves, "json", wire_room(room_id, "json"))
+                if self.binary:
+                    await self.send(moves, "binary", wire_room(room_id, "binary"))
+                continue
+            for protocol, sids, visible in self.interest.groups(room_id, viewers, moves):
+                await self.send(visible, protocol, sids)
+            # Spectators are not placed on the map and watch everything
+            await self.send(moves, "json", wire_room(spectator_room(room_id), "json"))
+            if self.binary:
+                await self.send(moves, "binary", wire_room(spectator_room(room_id), "binary"))
+
+    async def send(self, moves: Dict[str, dict], protocol: str, to):
+        if protocol == "binary":
+            # Sent as a raw binary attachment, no JSON or base64 on the wire
+            await self.sio.emit('players_moved', pack_positions(moves), to=to)
+        else:
+            await self.sio.emit('players_moved', {"positions": moves}, to=to)
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        next_tick = loop.time()
+        while True:
+            next_tick += self.interval
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Movement tick failed")
+            delay = next_tick - loop.time()
+            if delay < 0:
+                # Fell behind - skip missed ticks instead of bursting to catch up
+                next_tick = loop.time()
+                delay = 0
+            await asyncio.sleep(delay)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
@@ -0,0 +1,57 @@
+import struct
+from typing import Dict, Iterable
+from urllib.parse import parse_qs
+
+# Wire protocols a client can ask for with ?protocol=... when it connects.
+# "binary" only changes the high-frequency players_moved stream; every other
+# event stays JSON so older clients and tooling keep working.
+PROTOCOLS = ("json", "binary")
+DEFAULT_PROTOCOL = "json"
+
+# players_moved frame: repeated [id length: u8][id: utf-8][x: f32][y: f32], little endian
+_ID_LENGTH = struct.Struct("<B")
+_POSITION = struct.Struct("<ff")
+
+
+def negotiate_protocol(environ: dict, enabled: Iterable[str] = PROTOCOLS) -> str:
+    """Pick the protocol requested in the connect query string, falling back to JSON"""
+    requested = parse_qs(environ.get("QUERY_STRING", "")).get("protocol", [DEFAULT_PROTOCOL])[0]
+    return requested if requested in enabled else DEFAULT_PROTOCOL
+
+
+def wire_room(room_id: str, protocol: str) -> str:
+    """Socket.IO room holding the members of a game room that use one protocol"""
+    return f"{room_id}:{protocol}"
+
+
+def spectator_room(room_id: str) -> str:
+    """Pseudo game room whose wire rooms hold a room's spectators"""
+    return f"{room_id}:spectators"
+
+
+def pack_positions(positions: Dict[str, dict]) -> bytes:
+    parts = []
+    for player_id, position in positions.items():
+        encoded = player_id.encode()
+        if len(encoded) > 255:
+            raise ValueError(f"Player id {player_id!r} is too long for a players_moved frame")
+        parts.append(_ID_LENGTH.pack(len(encoded)))
+        parts.append(encoded)
+        parts.append(_POSITION.pack(position["x"], position["y"]))
+    return b"".join(parts)
+
+
+def unpack_positions(data: bytes) -> Dict[str, dict]:
+    positions = {}
+    offset = 0
+    while offset < len(data):
+        (length,) = _ID_LENGTH.unpack_from(data, offset)
+        offset += _ID_LENGTH.size
+        if offset + length + _POSITION.size > len(data):
+            raise ValueError(f"Truncated players_moved frame at byte {offset}")
+        player_id = data[offset:offset + length].decode()
+        offset += length
+        x, y = _POSITION.unpack_from(data, offset)
+        offset += _POSITION.size
+        positions[player_id] = {"x": x, "y": y}
+    return positions
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""Cold-start check for the backend.
+
+Measures, in fresh interpreters, how long `import server` plus
+create_app() takes, then starts uvicorn and times process spawn to the
+first answered request. The numbers depend heavily on the machine and on
+what else is installed (socketio imports aiohttp's client whenever aiohttp
+is present). The exit status is non-zero when the median spawn-to-first-
+request time is over the budget: 1.5 s by default, against a median of
+about 0.9-1.1 s on a development machine. Pass one measured on the target
+image to gate a deploy:
+
+    python cold_start.py --runs 5 --budget 1.2
+
+MongoDB does not have to be running; the first request does not touch it.
+Time to readiness (GET /api/ready) is reported when --ready is given.
+"""
+
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+
+BACKEND = Path(__file__).parent / "backend"
+
+IMPORT_PROBE = """
+import time
+started = time.perf_counter()
+import server
+imported = time.perf_counter()
+server.create_app()
+print(imported - started, time.perf_counter() - imported)
+"""
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def env() -> dict:
+    return {**os.environ, "MONGO_URL": os.environ.get("MONGO_URL", "mongodb://localhost:27017"),
+            "DB_NAME": os.environ.get("DB_NAME", "escape_room")}
+
+
+def measure_import():
+    out = subprocess.run([sys.executable, "-c", IMPORT_PROBE], cwd=BACKEND, env=env(),
+                         capture_output=True, text=True, check=True).stdout.split()
+    return float(out[-2]), float(out[-1])
+
+
+def wait_for(url: str, deadline: float, status: int = 200) -> bool:
+    while time.perf_counter() < deadline:
+        try:
+            with urllib.request.urlopen(url, timeout=1) as response:
+                if response.status == status:
+                    return True
+        except (urllib.error.URLError, ConnectionError, OSError):
+            pass
+        time.sleep(0.005)
+    return False
+
+
+def measure_first_request(timeout: float, ready: bool):
+    port = free_port()
+    started = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "--factory", "server:create_app",
+         "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND, env=env(), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        base = f"http://127.0.0.1:{port}/api"
+        if not wait_for(f"{base}/", started + timeout):
+            raise RuntimeError(f"server did not answer within {timeout}s")
+        first = time.perf_counter() - started
+        ready_at = None
+        if ready and wait_for(f"{base}/ready", started + timeout):
+            ready_at = time.perf_counter() - started
+        return first, ready_at
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget", type=float, default=1.5,
+                        help="fail when the median seconds from spawn to first request exceed this")
+    parser.add_argument("--timeout", type=float, default=15.0)
+    parser.add_argument("--ready", action="store_true", help="also time until /api/ready reports MongoDB")
+    args = parser.parse_args()
+
+    imports = [measure_import() for _ in range(args.runs)]
+    starts = [measure_first_request(args.timeout, args.ready) for _ in range(args.runs)]
+
+    first = statistics.median(s[0] for s in starts)
+    print(f"import server: median {statistics.median(i[0] for i in imports) * 1000:.0f} ms, "
+          f"create_app: {statistics.median(i[1] for i in imports) * 1000:.1f} ms")
+    print(f"spawn to first request: median {first * 1000:.0f} ms, max {max(s[0] for s in starts) * 1000:.0f} ms "
+          f"(budget {args.budget * 1000:.0f} ms)")
+    readies = [s[1] for s in starts if s[1] is not None]
+    if args.ready:
+        if readies:
+            print(f"spawn to ready: median {statistics.median(readies) * 1000:.0f} ms")
+        else:
+            print("never ready: MongoDB was not reachable")
+    return 0 if first <= args.budget else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
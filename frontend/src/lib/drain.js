@@ -0,0 +1,25 @@
+// A restarting server sends server_draining, hands its rooms off and closes
+// the socket; so does a server evicting an idle room from memory. Reconnect
+// after a jittered delay; the "connect" handler re-sends join_room, which
+// resumes the room on whichever instance now serves it.
+// Connections refused while the old instance is still draining are retried.
+
+const jitter = (ms) => ms + Math.random() * ms;
+
+export function reconnectOnDrain(socket) {
+  let draining = false;
+
+  socket.on("server_draining", (data) => {
+    draining = true;
+    socket.disconnect();
+    setTimeout(() => socket.connect(), jitter(data.retry_after_ms || 1000));
+  });
+
+  socket.on("connect", () => {
+    draining = false;
+  });
+
+  socket.on("connect_error", () => {
+    if (draining) setTimeout(() => socket.connect(), jitter(1000));
+  });
+}
@@ -0,0 +1,36 @@
+// Room state deltas from the server are JSON-patch style ops. Each op bumps
+// the room version by one, so ops already reflected locally are skipped.
+
+const parsePointer = (path) =>
+  path.split("/").slice(1).map((part) => part.replace(/~1/g, "/").replace(/~0/g, "~"));
+
+const applyOp = (node, keys, op, value) => {
+  const [key, ...rest] = keys;
+  if (Array.isArray(node)) {
+    const copy = [...node];
+    const index = key === "-" ? copy.length : Number(key);
+    if (rest.length) copy[index] = applyOp(copy[index], rest, op, value);
+    else if (op === "add") copy.splice(index, 0, value);
+    else if (op === "remove") copy.splice(index, 1);
+    else copy[index] = value;
+    return copy;
+  }
+  const copy = { ...(node || {}) };
+  if (rest.length) copy[key] = applyOp(copy[key], rest, op, value);
+  else if (op === "remove") delete copy[key];
+  else copy[key] = value;
+  return copy;
+};
+
+// Returns the patched room, the same room if the patch is stale, or null when
+// ops are missing and the caller has to request a resync.
+export function applyStatePatch(room, patch) {
+  if (!room) return room;
+  const current = room.version ?? 0;
+  if (patch.version <= current) return room;
+  if (patch.base > current) return null;
+  const next = patch.ops
+    .slice(current - patch.base)
+    .reduce((state, { op, path, value }) => applyOp(state, parsePointer(path), op, value), room);
+  return { ...next, version: patch.version };
+}
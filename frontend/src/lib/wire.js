@@ -0,0 +1,20 @@
+// Binary players_moved frames: repeated [id length: u8][id: utf-8][x: f32][y: f32],
+// little endian. Must match backend/wire.py.
+
+const decoder = new TextDecoder();
+
+export function unpackPositions(buffer) {
+  const view = new DataView(buffer);
+  const bytes = new Uint8Array(buffer);
+  const positions = {};
+  let offset = 0;
+  while (offset < view.byteLength) {
+    const length = view.getUint8(offset);
+    offset += 1;
+    const id = decoder.decode(bytes.subarray(offset, offset + length));
+    offset += length;
+    positions[id] = { x: view.getFloat32(offset, true), y: view.getFloat32(offset + 4, true) };
+    offset += 8;
+  }
+  return positions;
+}
@@ -16,6 +16,9 @@ import ColorMixModal from "../components/puzzles/ColorMixModal";
 import SliderPuzzleModal from "../components/puzzles/SliderPuzzleModal";
 import WinModal from "../components/WinModal";
 import axios from "axios";
+import { applyStatePatch } from "../lib/roomState";
+import { unpackPositions } from "../lib/wire";
+import { reconnectOnDrain } from "../lib/drain";
 
 const API = `${process.env.REACT_APP_BACKEND_URL}/api`;
 const SOCKET_URL = process.env.REACT_APP_BACKEND_URL;
@@ -61,12 +64,15 @@ const GamePage = () => {
   useEffect(() => {
     const fetchRoom = async () => {
       try {
-        const response = await axios.get(`${API}/rooms/${roomId}`);
+        const [response, chat] = await Promise.all([
+          axios.get(`${API}/rooms/${roomId}`),
+          axios.get(`${API}/rooms/${roomId}/messages`)
+        ]);
         if (response.data.status === "lobby") {
           navigate(`/room/${roomId}`);
           return;
         }
-        setRoom(response.data);
+        setRoom({ ...response.data, messages: chat.data.messages });
         setIsLoading(false);
       } catch (error) {
         toast.error("Room not found");
@@ -82,7 +88,10 @@ const GamePage = () => {
 
     const newSocket = io(SOCKET_URL, {
       transports: ["websocket", "polling"],
-      path: "/api/socket.io"
+      path: "/api/socket.io",
+      // Lets a load balancer pin every connection for a room to the same worker
+      // Movement updates arrive as compact binary frames; the server falls back to JSON if it has binary disabled
+      query: { room_id: roomId, protocol: "binary" }
     });
 
     newSocket.on("connect", () => {
@@ -90,29 +99,35 @@ const GamePage = () => {
       newSocket.emit("join_room", { room_id: roomId, player_id: playerId });
     });
 
-    newSocket.on("room_state", (data) => {
-      setRoom(data);
-    });
+    reconnectOnDrain(newSocket);
 
-    newSocket.on("player_joined", (data) => {
-      setRoom(prev => ({ ...prev, players: data.players }));
+    newSocket.on("room_state", (data) => {
+      // Chat is not part of room state; keep what was already loaded
+      setRoom(prev => ({ ...data, messages: prev?.messages || [] }));
     });
 
-    newSocket.on("player_left", (data) => {
-      setRoom(prev => ({ ...prev, players: data.players }));
+    newSocket.on("state_patch", (patch) => {
+      setRoom(prev => {
+        const next = applyStatePatch(prev, patch);
+        if (next === null) {
+          newSocket.emit("sync_state", { room_id: roomId, version: prev.version });
+          return prev;
+        }
+        return next;
+      });
     });
 
-    newSocket.on("player_moved", (data) => {
-      setRoom(prev => ({
-        ...prev,
-        players: {
-          ...prev.players,
-          [data.player_id]: {
-            ...prev.players[data.player_id],
-            position: data.position
-          }
-        }
-      }));
+    newSocket.on("players_moved", (data) => {
+      const positions = data instanceof ArrayBuffer ? unpackPositions(data) : data.positions;
+      setRoom(prev => {
+        const players = { ...prev.players };
+        Object.entries(positions).forEach(([id, position]) => {
+          // Our own position is already applied locally
+          if (id === playerId || !players[id]) return;
+          players[id] = { ...players[id], position };
+        });
+        return { ...prev, players };
+      });
     });
 
     newSocket.on("object_examined", (data) => {
@@ -120,32 +135,13 @@ const GamePage = () => {
         setCurrentClue(data.clue);
         toast.info(data.clue, { duration: 5000 });
       }
-      setRoom(prev => ({
-        ...prev,
-        objects_state: {
-          ...prev.objects_state,
-          [data.object_id]: {
-            ...prev.objects_state?.[data.object_id],
-            examined: true
-          }
-        }
-      }));
     });
 
     newSocket.on("item_picked", (data) => {
-      setRoom(prev => ({ ...prev, inventory: data.inventory }));
       toast.success(`Picked up ${data.item_id.replace(/_/g, " ")}`);
     });
 
     newSocket.on("puzzle_solved", (data) => {
-      setRoom(prev => ({
-        ...prev,
-        inventory: data.inventory,
-        puzzle_states: {
-          ...prev.puzzle_states,
-          [data.puzzle_id]: { solved: true }
-        }
-      }));
       if (data.item_found) {
         toast.success(`Found ${data.item_found?.replace(/_/g, " ")}!`);
       } else {
@@ -165,6 +161,11 @@ const GamePage = () => {
       toast.error(data.message);
     });
 
+    newSocket.on("rate_limited", (data) => {
+      if (data.event === "solve_puzzle") toast.error("Too many attempts - wait a moment");
+      else if (data.event === "send_message" || data.event === "quick_chat") toast.error("You're sending messages too fast");
+    });
+
     newSocket.on("jigsaw_progress", (data) => {
       setJigsawPieces(data.pieces);
     });
@@ -175,7 +176,6 @@ const GamePage = () => {
     });
 
     newSocket.on("items_combined", (data) => {
-      setRoom(prev => ({ ...prev, inventory: data.inventory }));
       toast.success("Created the Master Key!");
     });
 
@@ -43,6 +43,32 @@ const LandingPage = () => {
     }
   };
 
+  const handleQuickMatch = async () => {
+    if (!playerName.trim()) {
+      toast.error("Please enter your name");
+      return;
+    }
+    
+    setIsLoading(true);
+    try {
+      // Joins the open room closest to full, or starts a new one
+      const response = await axios.post(`${API}/rooms/quick-match`, {
+        player_name: playerName.trim()
+      });
+      
+      const { room_id, player_id } = response.data;
+      localStorage.setItem("playerId", player_id);
+      localStorage.setItem("playerName", playerName.trim());
+      
+      navigate(`/room/${room_id}`);
+    } catch (error) {
+      toast.error(error.response?.data?.detail || "Failed to find a room");
+      console.error(error);
+    } finally {
+      setIsLoading(false);
+    }
+  };
+
   const handleJoinRoom = async () => {
     if (!playerName.trim()) {
       toast.error("Please enter your name");
@@ -55,10 +81,11 @@ const LandingPage = () => {
     
     setIsLoading(true);
     try {
+      const roomId = roomCode.trim().toLowerCase();
       const response = await axios.post(`${API}/rooms/join`, {
         player_name: playerName.trim(),
-        room_id: roomCode.trim().toLowerCase()
-      });
+        room_id: roomId
+      }, { params: { room_id: roomId } });
       
       const { room_id, player_id } = response.data;
       localStorage.setItem("playerId", player_id);
@@ -251,6 +278,15 @@ const LandingPage = () => {
             >
               {isLoading ? "Joining..." : "Join Room"}
             </Button>
+            <Button 
+              data-testid="quick-match-btn"
+              onClick={handleQuickMatch}
+              disabled={isLoading}
+              variant="outline"
+              className="w-full btn-outline rounded-sm py-6"
+            >
+              No code? Quick Match
+            </Button>
           </div>
         </DialogContent>
       </Dialog>
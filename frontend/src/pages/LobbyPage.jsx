@@ -6,6 +6,8 @@ import { Copy, Users, Crown, Play, ArrowLeft } from "lucide-react";
 import { Button } from "../components/ui/button";
 import { io } from "socket.io-client";
 import axios from "axios";
+import { applyStatePatch } from "../lib/roomState";
+import { reconnectOnDrain } from "../lib/drain";
 
 const API = `${process.env.REACT_APP_BACKEND_URL}/api`;
 const SOCKET_URL = process.env.REACT_APP_BACKEND_URL;
@@ -42,7 +44,9 @@ const LobbyPage = () => {
     // Connect to Socket.IO
     const newSocket = io(SOCKET_URL, {
       transports: ["websocket", "polling"],
-      path: "/api/socket.io"
+      path: "/api/socket.io",
+      // Lets a load balancer pin every connection for a room to the same worker
+      query: { room_id: roomId }
     });
 
     newSocket.on("connect", () => {
@@ -50,18 +54,26 @@ const LobbyPage = () => {
       newSocket.emit("join_room", { room_id: roomId, player_id: playerId });
     });
 
+    reconnectOnDrain(newSocket);
+
     newSocket.on("room_state", (data) => {
       setRoom(data);
       setIsHost(data.host_id === playerId);
     });
 
-    newSocket.on("player_joined", (data) => {
-      setRoom(prev => ({ ...prev, players: data.players }));
-      toast.success(`${data.player.name} joined the room!`);
+    newSocket.on("state_patch", (patch) => {
+      setRoom(prev => {
+        const next = applyStatePatch(prev, patch);
+        if (next === null) {
+          newSocket.emit("sync_state", { room_id: roomId, version: prev.version });
+          return prev;
+        }
+        return next;
+      });
     });
 
-    newSocket.on("player_left", (data) => {
-      setRoom(prev => ({ ...prev, players: data.players }));
+    newSocket.on("player_joined", (data) => {
+      toast.success(`${data.player.name} joined the room!`);
     });
 
     newSocket.on("game_started", () => {
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""Benchmark for the room id allocator.
+
+Allocates ids from several simulated shards against an in-memory stand-in
+for the reservation collection, which enforces _id uniqueness the way the
+MongoDB index does. Reports allocation cost, the collisions rejected by the
+index as the id space fills, and how many silent duplicates the old
+unchecked random.choices scheme would have produced for the same volume.
+
+    python id_benchmark.py --ids 1000000 --shards 4 --prefill 2000000
+"""
+
+import argparse
+import asyncio
+import random
+import string
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Set
+
+from pymongo.errors import BulkWriteError
+
+sys.path.insert(0, str(Path(__file__).parent / "backend"))
+from ids import DUPLICATE_KEY, RoomIdAllocator, random_id  # noqa: E402
+from sharding import HashRing  # noqa: E402
+
+
+class ReservationCollection:
+    """insert_many with a unique _id, optionally with a simulated round trip"""
+
+    def __init__(self, rtt: float = 0.0):
+        self.ids: Set[str] = set()
+        self.rtt = rtt
+        self.round_trips = 0
+
+    async def insert_many(self, docs: List[dict], ordered: bool = True):
+        self.round_trips += 1
+        if self.rtt:
+            await asyncio.sleep(self.rtt)
+        errors = []
+        for index, doc in enumerate(docs):
+            if doc["_id"] in self.ids:
+                errors.append({"index": index, "code": DUPLICATE_KEY})
+            else:
+                self.ids.add(doc["_id"])
+        if errors:
+            raise BulkWriteError({"writeErrors": errors})
+
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def naive_duplicates(count: int) -> int:
+    """Duplicates the unchecked 6-character random.choices ids would have produced"""
+    alphabet = string.ascii_lowercase + string.digits
+    seen = set()
+    duplicates = 0
+    for _ in range(count):
+        room_id = ''.join(random.choices(alphabet, k=6))
+        if room_id in seen:
+            duplicates += 1
+        seen.add(room_id)
+    return duplicates
+
+
+async def allocate(allocator: RoomIdAllocator, count: int, latencies: List[float], ids: List[str]):
+    for _ in range(count):
+        started = time.perf_counter()
+        ids.append(await allocator.allocate())
+        latencies.append(time.perf_counter() - started)
+
+
+async def run(args) -> Dict:
+    collection = ReservationCollection(args.rtt_ms / 1000)
+    started = time.perf_counter()
+    while len(collection.ids) < args.prefill:
+        collection.ids.add(random_id(6))
+    prefill_seconds = time.perf_counter() - started
+
+    names = [f"worker-{i}" for i in range(args.shards)]
+    ring = HashRing(names)
+    allocators = [
+        RoomIdAllocator(collection, lambda room_id, name=name: ring.owner(room_id) == name,
+                        batch=args.batch, worker_id=name)
+        for name in names
+    ]
+    latencies: List[float] = []
+    ids: List[str] = []
+    per_shard = args.ids // args.shards
+    started = time.perf_counter()
+    await asyncio.gather(*(allocate(a, per_shard, latencies, ids) for a in allocators))
+    elapsed = time.perf_counter() - started
+
+    return {
+        "allocated": len(ids),
+        "unique": len(set(ids)) == len(ids),
+        "prefilled": args.prefill,
+        "prefill_seconds": prefill_seconds,
+        "seconds": elapsed,
+        "ids_per_second": len(ids) / elapsed,
+        "p50_us": percentile(latencies, 0.50) * 1e6,
+        "p99_us": percentile(latencies, 0.99) * 1e6,
+        "round_trips": collection.round_trips,
+        "collisions": sum(a.collisions for a in allocators),
+        "naive_duplicates": naive_duplicates(args.prefill + len(ids)) if args.naive else None,
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ids", type=int, default=200_000, help="ids to allocate in total")
+    parser.add_argument("--shards", type=int, default=4)
+    parser.add_argument("--batch", type=int, default=32, help="ids reserved per round trip")
+    parser.add_argument("--prefill", type=int, default=1_000_000, help="ids already taken before the run")
+    parser.add_argument("--rtt-ms", type=float, default=0.0, help="simulated reservation round trip")
+    parser.add_argument("--no-naive", dest="naive", action="store_false",
+                        help="skip counting duplicates of the old unchecked scheme")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    print(f"allocated {report['allocated']} ids on {args.shards} shards with {report['prefilled']} already taken")
+    print(f"  {report['ids_per_second']:.0f} ids/s, p50 {report['p50_us']:.1f} us, p99 {report['p99_us']:.1f} us")
+    print(f"  {report['round_trips']} reservation round trips, {report['collisions']} collisions rejected")
+    print(f"  all unique: {report['unique']}")
+    if report["naive_duplicates"] is not None:
+        print(f"  unchecked random.choices ids: {report['naive_duplicates']} silent duplicates")
+    return 0 if report["unique"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+"""Async load generator for The Locked Study backend.
+
+Creates rooms over the REST API, connects one Socket.IO client per player and
+drives movement, chat and puzzle traffic, then reports event latency,
+throughput and server memory.
+
+    python load_test.py --rooms 500 --players 4 --duration 60 --server-pid $(pgrep -f uvicorn)
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from collections import Counter, OrderedDict, defaultdict, deque
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import aiohttp
+import socketio
+
+sys.path.insert(0, str(Path(__file__).parent / "backend"))
+from wire import unpack_positions  # noqa: E402
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def read_rss(pid: int) -> Optional[int]:
+    """Resident memory of a local process in bytes (Linux only)"""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        return None
+    return None
+
+
+class LoadStats:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)  # event kind -> seconds
+        self.sent: Counter = Counter()
+        self.received: Counter = Counter()
+        self.errors: Counter = Counter()
+        self.memory: List[int] = []
+
+    def report(self, elapsed: float) -> dict:
+        latency = {
+            kind: {
+                "count": len(values),
+                "p50_ms": round(percentile(values, 0.50) * 1000, 2),
+                "p99_ms": round(percentile(values, 0.99) * 1000, 2),
+                "max_ms": round(max(values) * 1000, 2)
+            }
+            for kind, values in sorted(self.latencies.items()) if values
+        }
+        report = {
+            "elapsed_s": round(elapsed, 2),
+            "latency": latency,
+            "sent_per_s": round(sum(self.sent.values()) / elapsed, 1),
+            "received_per_s": round(sum(self.received.values()) / elapsed, 1),
+            "sent": dict(self.sent),
+            "received": dict(self.received),
+            "errors": dict(self.errors)
+        }
+        if self.memory:
+            report["server_rss_mb"] = {
+                "start": round(self.memory[0] / 2 ** 20, 1),
+                "peak": round(max(self.memory) / 2 ** 20, 1),
+                "end": round(self.memory[-1] / 2 ** 20, 1)
+            }
+        return report
+
+
+class SimulatedPlayer:
+    """One Socket.IO client that plays like a (very busy) human"""
+
+    def __init__(self, args, stats: LoadStats, room_id: str, player_id: str):
+        self.args = args
+        self.stats = stats
+        self.room_id = room_id
+        self.player_id = player_id
+        self.sio = socketio.AsyncClient(reconnection=False)
+        # Set from the spawn point in the first room_state: moves from anywhere
+        # else get clamped by the server's speed limit and never echo back as sent
+        self.x = self.y = None
+        # Send times keyed by what the server will echo back
+        self.moves: "OrderedDict[tuple, float]" = OrderedDict()
+        self.chats: Dict[str, float] = {}
+        self.puzzles: deque = deque()
+        self.joined = asyncio.Event()
+        self.chat_count = 0
+        self._register()
+
+    def _register(self):
+        @self.sio.on("room_state")
+        async def on_room_state(data):
+            self.stats.received["room_state"] += 1
+            if self.x is None:
+                position = data["players"][self.player_id]["position"]
+                # Integer coordinates survive the float32 binary encoding exactly
+                self.x, self.y = round(position["x"]), round(position["y"])
+            self.joined.set()
+
+        @self.sio.on("players_moved")
+        async def on_players_moved(data):
+            self.stats.received["players_moved"] += 1
+            positions = unpack_positions(data) if isinstance(data, bytes) else data["positions"]
+            position = positions.get(self.player_id)
+            if position is None:
+                return
+            sent_at = self.moves.pop((position["x"], position["y"]), None)
+            if sent_at is not None:
+                self.stats.latencies["player_move"].append(time.perf_counter() - sent_at)
+
+        @self.sio.on("new_message")
+        async def on_new_message(data):
+            self.stats.received["new_message"] += 1
+            if data.get("player_id") == self.player_id:
+                sent_at = self.chats.pop(data.get("message"), None)
+                if sent_at is not None:
+                    self.stats.latencies["send_message"].append(time.perf_counter() - sent_at)
+
+        @self.sio.on("puzzle_failed")
+        async def on_puzzle_failed(data):
+            self.stats.received["puzzle_failed"] += 1
+            if self.puzzles:
+                self.stats.latencies["solve_puzzle"].append(time.perf_counter() - self.puzzles.popleft())
+
+        @self.sio.on("*")
+        async def on_other(event, data):
+            self.stats.received[event] += 1
+
+    async def emit(self, event: str, data: dict):
+        self.stats.sent[event] += 1
+        await self.sio.emit(event, {"room_id": self.room_id, "player_id": self.player_id, **data})
+
+    async def connect(self):
+        started = time.perf_counter()
+        await self.sio.connect(
+            f"{self.args.url}?room_id={self.room_id}&protocol={self.args.protocol}",
+            transports=["websocket"],
+            socketio_path="/api/socket.io"
+        )
+        await self.emit("join_room", {})
+        await asyncio.wait_for(self.joined.wait(), self.args.timeout)
+        self.stats.latencies["join_room"].append(time.perf_counter() - started)
+
+    async def move(self):
+        # Integer coordinates survive the float32 binary encoding exactly
+        self.x = min(800, max(0, self.x + random.randint(-4, 4)))
+        self.y = min(600, max(0, self.y + random.randint(-4, 4)))
+        self.moves[(self.x, self.y)] = time.perf_counter()
+        self.moves.move_to_end((self.x, self.y))
+        while len(self.moves) > 256:
+            self.moves.popitem(last=False)
+        await self.emit("player_move", {"position": {"x": self.x, "y": self.y}})
+
+    async def chat(self):
+        self.chat_count += 1
+        message = f"load {self.player_id} {self.chat_count}"
+        self.chats[message] = time.perf_counter()
+        await self.emit("send_message", {"message": message})
+
+    async def solve(self):
+        # A wrong code always gets a puzzle_failed reply to this socket only
+        self.puzzles.append(time.perf_counter())
+        await self.emit("solve_puzzle", {"puzzle_id": "code_lock", "answer": "wrong"})
+
+    async def play(self, deadline: float):
+        loop = asyncio.get_running_loop()
+        interval = 1.0 / self.args.move_rate
+        next_move = loop.time() + random.random() * interval
+        next_chat = loop.time() + random.expovariate(1.0 / self.args.chat_interval)
+        next_puzzle = loop.time() + random.expovariate(1.0 / self.args.puzzle_interval)
+        while loop.time() < deadline:
+            now = loop.time()
+            if now >= next_chat:
+                await self.chat()
+                next_chat = now + random.expovariate(1.0 / self.args.chat_interval)
+            if now >= next_puzzle:
+                await self.solve()
+                next_puzzle = now + random.expovariate(1.0 / self.args.puzzle_interval)
+            await self.move()
+            next_move += interval
+            await asyncio.sleep(max(0.0, next_move - loop.time()))
+
+    async def close(self):
+        await self.sio.disconnect()
+
+
+class LoadTest:
+    def __init__(self, args):
+        self.args = args
+        self.api_url = f"{args.url}/api"
+        self.stats = LoadStats()
+        self.players: List[SimulatedPlayer] = []
+
+    async def post(self, session: aiohttp.ClientSession, path: str, payload: dict) -> dict:
+        started = time.perf_counter()
+        async with session.post(f"{self.api_url}{path}", json=payload) as response:
+            response.raise_for_status()
+            data = await response.json()
+        self.stats.latencies[f"POST {path}"].append(time.perf_counter() - started)
+        return data
+
+    async def setup_room(self, session: aiohttp.ClientSession, index: int, limit: asyncio.Semaphore):
+        async with limit:
+            try:
+                host = await self.post(session, "/rooms/create", {"player_name": f"load{index}-0"})
+                room_id = host["room_id"]
+                player_ids = [host["player_id"]]
+                for n in range(1, self.args.players):
+                    joined = await self.post(session, "/rooms/join", {"room_id": room_id, "player_name": f"load{index}-{n}"})
+                    player_ids.append(joined["player_id"])
+                players = [SimulatedPlayer(self.args, self.stats, room_id, pid) for pid in player_ids]
+                self.players.extend(players)
+                await asyncio.gather(*(p.connect() for p in players))
+                await players[0].emit("start_game", {})
+            except Exception as e:
+                self.stats.errors[f"setup: {type(e).__name__}"] += 1
+
+    async def sample_memory(self):
+        while True:
+            rss = read_rss(self.args.server_pid)
+            if rss is not None:
+                self.stats.memory.append(rss)
+            await asyncio.sleep(1)
+
+    async def run(self) -> dict:
+        sampler = asyncio.create_task(self.sample_memory()) if self.args.server_pid else None
+        limit = asyncio.Semaphore(self.args.concurrency)
+        timeout = aiohttp.ClientTimeout(total=self.args.timeout)
+        async with aiohttp.ClientSession(timeout=timeout) as session:
+            started = time.perf_counter()
+            await asyncio.gather(*(self.setup_room(session, i, limit) for i in range(self.args.rooms)))
+            print(f"Connected {len(self.players)} players in {time.perf_counter() - started:.1f}s")
+
+            # Only steady-state traffic counts towards throughput
+            self.stats.sent.clear()
+            self.stats.received.clear()
+            deadline = asyncio.get_running_loop().time() + self.args.duration
+            started = time.perf_counter()
+            results = await asyncio.gather(*(p.play(deadline) for p in self.players), return_exceptions=True)
+            elapsed = time.perf_counter() - started
+            for result in results:
+                if isinstance(result, Exception):
+                    self.stats.errors[f"play: {type(result).__name__}"] += 1
+            await asyncio.gather(*(p.close() for p in self.players), return_exceptions=True)
+
+        if sampler is not None:
+            sampler.cancel()
+        return self.stats.report(elapsed)
+
+
+def print_report(report: dict):
+    print(f"\n{'event':<22}{'count':>10}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for kind, row in report["latency"].items():
+        print(f"{kind:<22}{row['count']:>10}{row['p50_ms']:>10}{row['p99_ms']:>10}{row['max_ms']:>10}")
+    print(f"\nThroughput: {report['sent_per_s']} events/s sent, {report['received_per_s']} events/s received")
+    if "server_rss_mb" in report:
+        rss = report["server_rss_mb"]
+        print(f"Server RSS: {rss['start']} MB -> {rss['end']} MB (peak {rss['peak']} MB)")
+    if report["errors"]:
+        print(f"Errors: {report['errors']}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8001", help="backend base URL")
+    parser.add_argument("--rooms", type=int, default=100)
+    parser.add_argument("--players", type=int, default=4, help="players per room (max 4)")
+    parser.add_argument("--duration", type=float, default=30, help="seconds of steady-state traffic")
+    parser.add_argument("--move-rate", type=float, default=60, help="player_move events per second per player")
+    parser.add_argument("--chat-interval", type=float, default=10, help="mean seconds between chat messages")
+    parser.add_argument("--puzzle-interval", type=float, default=15, help="mean seconds between puzzle attempts")
+    parser.add_argument("--protocol", choices=["json", "binary"], default="json")
+    parser.add_argument("--concurrency", type=int, default=50, help="rooms set up in parallel")
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--server-pid", type=int, help="sample this local process's memory")
+    parser.add_argument("--output", help="write the report as JSON")
+    parser.add_argument("--max-p99-ms", type=float, help="exit non-zero if any event's p99 exceeds this")
+    args = parser.parse_args()
+
+    report = asyncio.run(LoadTest(args).run())
+    print_report(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if report["errors"]:
+        return 1
+    if args.max_p99_ms is not None:
+        slow = [kind for kind, row in report["latency"].items() if row["p99_ms"] > args.max_p99_ms]
+        if slow:
+            print(f"p99 over {args.max_p99_ms} ms: {', '.join(slow)}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -58,7 +58,7 @@ if not exist "venv" (
 )
 
 call venv\Scripts\activate.bat
-pip install -r requirements.txt
+pip install -r requirements-dev.txt
 
 if not exist ".env" (
     copy .env.example .env
@@ -87,7 +87,7 @@ echo.
 echo   Terminal 1 (Backend):
 echo     cd backend
 echo     venv\Scripts\activate
-echo     uvicorn server:app --host 0.0.0.0 --port 8001 --reload
+echo     uvicorn --factory server:create_app --host 0.0.0.0 --port 8001 --reload
 echo.
 echo   Terminal 2 (Frontend):
 echo     cd frontend
@@ -53,7 +53,7 @@ fi
 
 source venv/bin/activate 2>/dev/null || source venv/Scripts/activate 2>/dev/null
 
-pip install -r requirements.txt
+pip install -r requirements-dev.txt
 
 if [ ! -f ".env" ]; then
     cp .env.example .env
@@ -82,7 +82,7 @@ echo ""
 echo "  Terminal 1 (Backend):"
 echo "    cd backend"
 echo "    source venv/bin/activate  # or venv\\Scripts\\activate on Windows"
-echo "    uvicorn server:app --host 0.0.0.0 --port 8001 --reload"
+echo "    uvicorn --factory server:create_app --host 0.0.0.0 --port 8001 --reload"
 echo ""
 echo "  Terminal 2 (Frontend):"
 echo "    cd frontend"
@@ -0,0 +1,227 @@
+"""Test harness: the `game` fixture and the benchmark suite.
+
+`game` runs the real server module on in-memory stand-ins for MongoDB, the
+room store and the Engine.IO transport (see tests/standins.py), and sets
+rooms up through the same REST and Socket.IO handlers clients use. Most
+test modules build on it; `bench` adds timing for the benchmarks.
+
+    python -m pytest tests/                  # fail on regressions against stored baselines
+    python -m pytest tests/ --bench-update   # store this machine's numbers as the baselines
+
+Each benchmark reports ops/s (from the 10th percentile per-call time, which
+is steadier on a busy machine than the median) and the peak
+memory a call allocates. A run fails when ops/s falls more than
+--bench-tolerance below the baseline, or allocations grow by more than a
+quarter. Baselines are machine specific; refresh them on the machine that
+runs the check.
+"""
+
+import gc
+import json
+import logging
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+from collections import OrderedDict
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, NamedTuple, Optional
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "backend"))
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "escape_room_bench")
+
+import game_room  # noqa: E402
+import server  # noqa: E402
+from lobby import LobbyIndex  # noqa: E402
+from room_store import LocalRoomStore  # noqa: E402
+from sessions import SessionIndex  # noqa: E402
+from tests.standins import InMemoryCollection, InMemoryEngineIO, asgi_request  # noqa: E402
+
+BASELINES = Path(__file__).parent / "benchmarks" / "baselines.json"
+ALLOC_TOLERANCE = 0.25
+ALLOC_SLACK = 1024  # bytes; small allocations jitter with dict and list resizes
+
+
+class BenchResult(NamedTuple):
+    ops_per_sec: float
+    p99_us: float
+    peak_bytes: int  # median memory allocated at the high point of one call
+    retained_bytes: float  # memory still held afterwards, per call
+
+    def baseline(self) -> dict:
+        return {"ops_per_sec": round(self.ops_per_sec), "peak_bytes": self.peak_bytes}
+
+
+results: Dict[str, BenchResult] = {}
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("benchmarks")
+    group.addoption("--bench-update", action="store_true", help="store the measured numbers as new baselines")
+    group.addoption("--bench-tolerance", type=float, default=float(os.environ.get("BENCH_TOLERANCE", "0.5")),
+                    help="allowed drop in ops/s below the baseline, as a fraction (default 0.5)")
+
+
+class Benchmark:
+    """Times an async operation call by call, then measures what one call allocates"""
+
+    def __init__(self, name: str, baseline: Optional[dict], tolerance: float, update: bool):
+        self.name = name
+        self.baseline = baseline
+        self.tolerance = tolerance
+        self.update = update
+
+    async def __call__(self, op: Callable[..., Awaitable], setup: Optional[Callable[[], Awaitable]] = None,
+                       rounds: int = 300, warmup: int = 30) -> BenchResult:
+        async def prepare():
+            return await setup() if setup is not None else None
+
+        for _ in range(warmup):
+            await op(await prepare())
+
+        timings = []
+        # Collector pauses land on whichever call happens to trigger them
+        gc.collect()
+        gc.disable()
+        try:
+            for _ in range(rounds):
+                arg = await prepare()
+                started = time.perf_counter_ns()
+                await op(arg)
+                timings.append(time.perf_counter_ns() - started)
+        finally:
+            gc.enable()
+        timings.sort()
+
+        # tracemalloc slows everything down, so allocations get their own pass
+        peaks = []
+        retained = 0
+        tracemalloc.start()
+        try:
+            for _ in range(rounds):
+                arg = await prepare()
+                before, _ = tracemalloc.get_traced_memory()
+                tracemalloc.reset_peak()
+                await op(arg)
+                after, peak = tracemalloc.get_traced_memory()
+                peaks.append(peak - before)
+                retained += after - before
+        finally:
+            tracemalloc.stop()
+
+        result = BenchResult(
+            ops_per_sec=1e9 / timings[len(timings) // 10],
+            p99_us=timings[min(len(timings) - 1, int(0.99 * len(timings)))] / 1000,
+            peak_bytes=int(statistics.median(peaks)),
+            retained_bytes=retained / rounds,
+        )
+        results[self.name] = result
+        self.check(result)
+        return result
+
+    def check(self, result: BenchResult):
+        if self.update or self.baseline is None:
+            return
+        floor = self.baseline["ops_per_sec"] * (1 - self.tolerance)
+        if result.ops_per_sec < floor:
+            pytest.fail(f"{self.name}: {result.ops_per_sec:.0f} ops/s, baseline {self.baseline['ops_per_sec']} "
+                        f"(allowed down to {floor:.0f})")
+        ceiling = self.baseline["peak_bytes"] * (1 + ALLOC_TOLERANCE) + ALLOC_SLACK
+        if result.peak_bytes > ceiling:
+            pytest.fail(f"{self.name}: allocates {result.peak_bytes} bytes per call, "
+                        f"baseline {self.baseline['peak_bytes']} (allowed up to {ceiling:.0f})")
+
+
+@pytest.fixture(scope="session")
+def baselines() -> Dict[str, dict]:
+    return json.loads(BASELINES.read_text()) if BASELINES.exists() else {}
+
+
+@pytest.fixture
+def bench(request, baselines) -> Benchmark:
+    name = request.node.name
+    return Benchmark(name, baselines.get(name), request.config.getoption("--bench-tolerance"),
+                     request.config.getoption("--bench-update"))
+
+
+class Game:
+    """The backend on in-memory stand-ins, with helpers that set rooms up through the real API"""
+
+    def __init__(self, monkeypatch):
+        self.engine = InMemoryEngineIO(server.sio)
+        self.engine.install(monkeypatch)
+        for owner, attr in [(server.room_persister, "collection"), (server.event_log, "events"),
+                            (server.event_log, "snapshots"), (server.room_ids, "collection"),
+                            (server.chat_log, "collection")]:
+            monkeypatch.setattr(owner, attr, InMemoryCollection())
+        store = LocalRoomStore()
+        monkeypatch.setattr(server, "room_store", store)
+        monkeypatch.setattr(server.shard_router, "store", store)
+        for name, fresh in [("game_rooms", OrderedDict()), ("sessions", SessionIndex()),
+                            ("lobby", LobbyIndex(server.MAX_PLAYERS)), ("listing", LobbyIndex(server.MAX_PLAYERS)),
+                            ("room_views", {}),
+                            ("spectators", {}), ("spectating", {}), ("wire_protocols", {})]:
+            monkeypatch.setattr(server, name, fresh)
+        for limiter in (server.rate_limiter, server.player_rate_limiter):
+            monkeypatch.setattr(limiter, "limits", {k: v._replace(burst=10 ** 9) for k, v in limiter.limits.items()})
+        # Benchmarks send moves far faster than a player walks; keep the check, not the cap
+        monkeypatch.setattr(game_room, "MAX_MOVE_SPEED", 1e9)
+        monkeypatch.setattr(game_room, "MOVE_BURST", 1e9)
+        self.app = server.create_app()
+        # Per-event INFO logging would dominate the cheaper handlers
+        logging.disable(logging.INFO)
+
+    async def create_room(self, player_name: str = "host"):
+        status, body = await asgi_request(self.app, "POST", "/api/rooms/create", {"player_name": player_name})
+        assert status == 200, body
+        return body["room_id"], body["player_id"]
+
+    async def join(self, room_id: str, player_name: str) -> str:
+        status, body = await asgi_request(self.app, "POST", "/api/rooms/join",
+                                          {"room_id": room_id, "player_name": player_name})
+        assert status == 200, body
+        return body["player_id"]
+
+    async def connect(self, room_id: str, player_id: str) -> str:
+        sid = await self.engine.connect()
+        await self.engine.event(sid, "join_room", {"room_id": room_id, "player_id": player_id})
+        return sid
+
+    async def room(self, players: int = 2, start: bool = False):
+        """A room with connected players; returns its id and their sids, host first"""
+        room_id, host = await self.create_room()
+        player_ids = [host] + [await self.join(room_id, f"player{i}") for i in range(1, players)]
+        sids = [await self.connect(room_id, pid) for pid in player_ids]
+        if start:
+            await self.engine.event(sids[0], "start_game", {"room_id": room_id})
+        return room_id, sids
+
+    def close(self):
+        logging.disable(logging.NOTSET)
+
+
+@pytest.fixture
+def game(monkeypatch):
+    game = Game(monkeypatch)
+    yield game
+    game.close()
+
+
+def pytest_terminal_summary(terminalreporter, config):
+    if not results:
+        return
+    terminalreporter.section("benchmarks")
+    terminalreporter.write_line(f"{'name':<32} {'ops/s':>10} {'p99 us':>9} {'peak B':>9} {'retained B':>11}")
+    for name, r in sorted(results.items()):
+        terminalreporter.write_line(
+            f"{name:<32} {r.ops_per_sec:>10.0f} {r.p99_us:>9.1f} {r.peak_bytes:>9} {r.retained_bytes:>11.1f}")
+    if config.getoption("--bench-update"):
+        stored = json.loads(BASELINES.read_text()) if BASELINES.exists() else {}
+        stored.update({name: r.baseline() for name, r in results.items()})
+        BASELINES.parent.mkdir(exist_ok=True)
+        BASELINES.write_text(json.dumps(dict(sorted(stored.items())), indent=2) + "\n")
+        terminalreporter.write_line(f"baselines written to {BASELINES}")
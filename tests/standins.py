@@ -0,0 +1,180 @@
+"""In-memory stand-ins for the test suite: MongoDB collections, the
+Engine.IO transport and an ASGI client. Handler code runs unchanged; only
+the network edges are replaced, so the numbers are CPU cost alone."""
+
+import asyncio
+import json
+from typing import Dict, List, Optional, Tuple
+
+from pymongo.errors import BulkWriteError
+
+DUPLICATE_KEY = 11000
+
+
+OPERATORS = {
+    "$gt": lambda value, arg: value is not None and value > arg,
+    "$gte": lambda value, arg: value is not None and value >= arg,
+    "$lt": lambda value, arg: value is not None and value < arg,
+    "$lte": lambda value, arg: value is not None and value <= arg,
+    "$exists": lambda value, arg: (value is not None) == arg,
+}
+
+
+def matches(doc: dict, query: dict) -> bool:
+    for key, condition in query.items():
+        if key == "$or":
+            if not any(matches(doc, q) for q in condition):
+                return False
+        elif isinstance(condition, dict):
+            if not all(OPERATORS[op](doc.get(key), arg) for op, arg in condition.items()):
+                return False
+        elif doc.get(key) != condition:
+            return False
+    return True
+
+
+def project(doc: dict, projection: Optional[dict]) -> dict:
+    hidden = {k for k, v in (projection or {}).items() if not v}
+    return {k: v for k, v in doc.items() if k not in hidden}
+
+
+class InMemoryCursor:
+    def __init__(self, docs: List[dict]):
+        self.docs = docs
+
+    def sort(self, key, direction: int = 1):
+        keys = [(key, direction)] if isinstance(key, str) else key
+        for field, order in reversed(keys):
+            self.docs.sort(key=lambda d: d[field], reverse=order < 0)
+        return self
+
+    def limit(self, n: int):
+        self.docs = self.docs[:n]
+        return self
+
+    async def to_list(self, length=None):
+        return list(self.docs)
+
+
+class InMemoryCollection:
+    """The subset of a motor collection the backend uses, with a unique _id"""
+
+    def __init__(self):
+        self.docs: Dict[object, dict] = {}
+        self.writes = 0
+
+    def _insert(self, doc: dict) -> bool:
+        key = doc.get("_id", len(self.docs))
+        if key in self.docs:
+            return False
+        self.docs[key] = doc
+        return True
+
+    async def insert_one(self, doc: dict):
+        self.writes += 1
+        self._insert(doc)
+
+    async def insert_many(self, docs: List[dict], ordered: bool = True):
+        self.writes += 1
+        errors = [{"index": i, "code": DUPLICATE_KEY} for i, doc in enumerate(docs) if not self._insert(doc)]
+        if errors:
+            raise BulkWriteError({"writeErrors": errors})
+
+    async def bulk_write(self, requests, ordered: bool = True):
+        self.writes += 1
+
+    def find(self, query: Optional[dict] = None, projection: Optional[dict] = None) -> InMemoryCursor:
+        return InMemoryCursor([project(d, projection) for d in self.docs.values() if matches(d, query or {})])
+
+    async def find_one(self, query: Optional[dict] = None, projection: Optional[dict] = None,
+                       sort=None) -> Optional[dict]:
+        cursor = self.find(query, projection)
+        if sort is not None:
+            cursor.sort(sort)
+        return cursor.docs[0] if cursor.docs else None
+
+    async def create_index(self, *args, **kwargs):
+        pass
+
+
+class InMemoryEngineIO:
+    """Takes the place of the Engine.IO transport under the Socket.IO server.
+
+    Everything above it - rooms, the client manager, packet encoding, frame
+    caching - is the real code; packets are counted instead of written to a
+    socket, and clients are attached without a handshake.
+    """
+
+    def __init__(self, sio):
+        self.sio = sio
+        self.packets = 0
+        self.bytes = 0
+
+    def install(self, monkeypatch):
+        monkeypatch.setattr(self.sio.eio, "send", self.send)
+        monkeypatch.setattr(self.sio.eio, "send_packet", self.send_packet)
+
+    async def send(self, eio_sid: str, data):
+        self.packets += 1
+        self.bytes += len(data)
+
+    async def send_packet(self, eio_sid: str, pkt):
+        self.packets += 1
+        self.bytes += len(pkt.data) if pkt.data is not None else 0
+
+    async def connect(self, environ: Optional[dict] = None) -> str:
+        """Attach a client to the default namespace and run the connect handler"""
+        sid = await self.sio.manager.connect(self.sio.eio.generate_id(), '/')
+        await self.sio._trigger_event('connect', '/', sid, environ or {})
+        return sid
+
+    async def event(self, sid: str, event: str, data=None):
+        """Deliver an event from a client through the server's normal dispatch"""
+        return await self.sio._trigger_event(event, '/', sid, data)
+
+
+async def asgi_call(app, method: str, path: str, body: Optional[dict] = None,
+                    headers: Optional[Dict[str, str]] = None) -> Tuple[int, Dict[str, str], bytes]:
+    """One HTTP request through an ASGI app, without a server or socket; returns status, headers and body"""
+    payload = json.dumps(body).encode() if body is not None else b""
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": method, "path": path, "raw_path": path.encode(), "query_string": b"",
+        "scheme": "http", "server": ("testserver", 80), "client": ("127.0.0.1", 1234), "root_path": "",
+        "headers": [(b"host", b"testserver"), (b"content-type", b"application/json"),
+                    (b"content-length", str(len(payload)).encode())]
+                   + [(k.lower().encode(), v.encode()) for k, v in (headers or {}).items()],
+    }
+    received = False
+    done = asyncio.Event()
+    status = 0
+    response_headers = {}
+    chunks = []
+
+    async def receive():
+        nonlocal received
+        if received:
+            # Like a real server, the client only goes away once the response is complete
+            await done.wait()
+            return {"type": "http.disconnect"}
+        received = True
+        return {"type": "http.request", "body": payload, "more_body": False}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+            response_headers.update((k.decode(), v.decode()) for k, v in message.get("headers", ()))
+        elif message["type"] == "http.response.body":
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body", False):
+                done.set()
+
+    await app(scope, receive, send)
+    return status, response_headers, b"".join(chunks)
+
+
+async def asgi_request(app, method: str, path: str, body: Optional[dict] = None) -> Tuple[int, dict]:
+    """One HTTP request through an ASGI app, with the JSON response decoded"""
+    status, _, raw = await asgi_call(app, method, path, body)
+    return status, json.loads(raw) if raw else {}
@@ -0,0 +1,122 @@
+"""Per-handler micro-benchmarks; see conftest.py for how they are measured and checked."""
+
+import asyncio
+import itertools
+
+import server
+from game_room import GameRoom, Player
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_game_room_init(bench):
+    async def op(_):
+        GameRoom("bench1", "host")
+
+    run(bench(op, rounds=2000))
+
+
+def test_game_room_to_dict(bench):
+    room = GameRoom("bench1", "p0")
+    for i in range(4):
+        room.add_player(Player(f"p{i}", f"player{i}", 400 + i * 50, 300, "#ffffff", i == 0))
+
+    async def op(_):
+        room.to_dict()
+
+    run(bench(op, rounds=2000))
+
+
+def test_create_room(bench, game):
+    async def op(_):
+        await game.create_room()
+
+    run(bench(op))
+
+
+def test_join_room(bench, game):
+    """Socket join of a player already added over REST: binding, room_state and the join broadcast"""
+    async def setup():
+        room_id, host = await game.create_room()
+        player_id = await game.join(room_id, "guest")
+        await game.connect(room_id, host)
+        return room_id, player_id, await game.engine.connect()
+
+    async def op(arg):
+        room_id, player_id, sid = arg
+        await game.engine.event(sid, "join_room", {"room_id": room_id, "player_id": player_id})
+
+    run(bench(op, setup=setup))
+
+
+def test_player_move(bench, game):
+    async def scenario():
+        room_id, sids = await game.room(players=4, start=True)
+        positions = itertools.cycle([{"x": 300, "y": 300}, {"x": 340, "y": 320}])
+
+        async def op(_):
+            await game.engine.event(sids[0], "player_move", {"room_id": room_id, "position": next(positions)})
+
+        await bench(op, rounds=2000)
+
+    run(scenario())
+
+
+def test_solve_puzzle(bench, game):
+    """Correct code lock answer: validation, reward, state patch and broadcast"""
+    async def setup():
+        room_id, sids = await game.room(players=2, start=True)
+        return room_id, sids[0], server.game_rooms[room_id].secrets["code"]
+
+    async def op(arg):
+        room_id, sid, code = arg
+        await game.engine.event(sid, "solve_puzzle", {"room_id": room_id, "puzzle_id": "code_lock", "answer": code})
+
+    run(bench(op, setup=setup))
+
+
+def test_solve_puzzle_wrong_answer(bench, game):
+    async def scenario():
+        room_id, sids = await game.room(players=2, start=True)
+
+        async def op(_):
+            await game.engine.event(sids[0], "solve_puzzle",
+                                    {"room_id": room_id, "puzzle_id": "code_lock", "answer": "wrong"})
+
+        await bench(op, rounds=2000)
+
+    run(scenario())
+
+
+def test_use_item(bench, game):
+    """UV lamp on the note, standing next to it"""
+    async def scenario():
+        room_id, sids = await game.room(players=2, start=True)
+        x, y = server.ROOM_DEFINITIONS["locked_study"].layout.objects["note"].center
+        await game.engine.event(sids[0], "player_move", {"room_id": room_id, "position": {"x": x, "y": y}})
+
+        async def op(_):
+            await game.engine.event(sids[0], "use_item", {"room_id": room_id, "item_id": "uv_lamp", "target_id": "note"})
+
+        await bench(op, rounds=2000)
+        assert server.game_rooms[room_id].object_flag("note", "uv_revealed")
+
+    run(scenario())
+
+
+def test_send_message(bench, game):
+    async def scenario():
+        room_id, sids = await game.room(players=4, start=True)
+
+        async def op(_):
+            await game.engine.event(sids[1], "send_message", {"room_id": room_id, "message": "Over here!"})
+
+        sent = game.engine.packets
+        await bench(op, rounds=2000)
+        assert len(server.chat_log.pending) >= 2000
+        # Two passes of 2000 messages, each delivered to all four sockets
+        assert game.engine.packets - sent >= 2 * 2000 * 4
+
+    run(scenario())
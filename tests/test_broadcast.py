@@ -0,0 +1,95 @@
+"""Spectators and the FrameCache that fans room snapshots out to them."""
+
+import asyncio
+from collections import OrderedDict
+
+import server
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def record_errors(monkeypatch) -> list:
+    errors = []
+    emit = server.sio.emit
+
+    async def recording(event, data=None, to=None, **kwargs):
+        if event == "error":
+            errors.append((to, data["message"]))
+        await emit(event, data, to=to, **kwargs)
+
+    monkeypatch.setattr(server.sio, "emit", recording)
+    return errors
+
+
+async def spectate(game, room_id: str) -> str:
+    sid = await game.engine.connect()
+    await game.engine.event(sid, "spectate_room", {"room_id": room_id})
+    return sid
+
+
+def test_spectators_share_one_encoded_snapshot_per_version(game, monkeypatch):
+    cache = server.frame_cache
+    monkeypatch.setattr(cache, "frames", OrderedDict())
+
+    async def scenario():
+        room_id, sids = await game.room(players=1)
+        hits, misses, packets = cache.hits, cache.misses, game.engine.packets
+        for _ in range(3):
+            await spectate(game, room_id)
+        # The joining player's room_state was encoded already
+        assert (cache.hits - hits, cache.misses - misses) == (3, 0)
+        # Frames are written straight to each Engine.IO socket
+        assert game.engine.packets - packets == 3
+
+        await game.engine.event(sids[0], "start_game", {})
+        await spectate(game, room_id)
+        await spectate(game, room_id)
+        assert (cache.hits - hits, cache.misses - misses) == (4, 1)
+        assert len(server.spectators[room_id]) == 5
+
+    run(scenario())
+
+
+def test_spectators_are_cleaned_up_on_disconnect_and_eviction(game, monkeypatch):
+    monkeypatch.setattr(server.frame_cache, "frames", OrderedDict())
+
+    async def scenario():
+        room_id, _ = await game.room(players=1)
+        first, second = await spectate(game, room_id), await spectate(game, room_id)
+        await server.disconnect(first)
+        assert first not in server.spectating and server.spectators[room_id] == {second}
+        assert first not in server.shard_router.connections
+
+        await server.room_actors.run(room_id, lambda: server.evict_room(room_id, "lru"))
+        assert server.spectators == {} and server.spectating == {}
+        assert not any(key[0] == room_id for key in server.frame_cache.frames)
+        await server.disconnect(second)
+        assert room_id not in server.game_rooms
+
+    run(scenario())
+
+
+def test_a_socket_is_either_a_player_or_a_spectator_of_one_room(game, monkeypatch):
+    errors = record_errors(monkeypatch)
+
+    async def scenario():
+        room_a, players = await game.room(players=1)
+        room_b, _ = await game.room(players=1)
+        await game.engine.event(players[0], "spectate_room", {"room_id": room_a})
+        await game.engine.event(players[0], "spectate_room", {"room_id": room_b})
+        assert server.spectating == {}
+        assert server.sessions.get(players[0]).room_id == room_a
+
+        watcher = await spectate(game, room_a)
+        player_id = server.game_rooms[room_a].host_id
+        await game.engine.event(watcher, "join_room", {"room_id": room_a, "player_id": player_id})
+        assert server.sessions.get(watcher) is None
+        assert server.sessions.get(players[0]).room_id == room_a
+        return players[0], watcher
+
+    player, watcher = run(scenario())
+    assert errors == [(player, "Players cannot spectate"),
+                      (player, "This connection is already in another room"),
+                      (watcher, "Spectators cannot join as players")]
@@ -0,0 +1,139 @@
+import asyncio
+
+import pytest
+from pymongo.errors import BulkWriteError
+
+from chat import ChatLog, InvalidCursor
+from tests.standins import InMemoryCollection
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def message(n: int) -> dict:
+    return {"player_id": "p1", "player_name": "Ada", "message": f"m{n}", "timestamp": f"2026-01-01T00:00:{n:02}"}
+
+
+class FlakyCollection(InMemoryCollection):
+    """Stores the first `partial` documents of the next insert, then fails it"""
+
+    def __init__(self):
+        super().__init__()
+        self.partial = None
+        self.error = None
+
+    async def insert_many(self, docs, ordered=True):
+        if self.partial is None:
+            return await super().insert_many(docs, ordered)
+        stored, self.partial = self.partial, None
+        for doc in docs[:stored]:
+            self._insert(doc)
+        raise self.error or ConnectionError("connection reset")
+
+
+def test_flush_retries_only_unstored_messages():
+    async def scenario():
+        collection = FlakyCollection()
+        chat = ChatLog(collection)
+        for n in range(4):
+            chat.append("room1", message(n))
+
+        collection.partial = 2
+        try:
+            await chat.flush()
+        except ConnectionError:
+            pass
+        assert len(chat.pending) == 4
+
+        # The retry hits duplicate keys for the two stored messages
+        assert await chat.flush() == 4
+        assert chat.pending == []
+        assert sorted(d["message"] for d in collection.docs.values()) == ["m0", "m1", "m2", "m3"]
+
+    run(scenario())
+
+
+def test_flush_keeps_messages_that_failed_for_other_reasons():
+    async def scenario():
+        collection = FlakyCollection()
+        chat = ChatLog(collection)
+        for n in range(3):
+            chat.append("room1", message(n))
+        failed = chat.pending[2]
+
+        collection.partial = 2
+        collection.error = BulkWriteError({"writeErrors": [{"index": 2, "code": 121}]})
+        try:
+            await chat.flush()
+        except BulkWriteError:
+            pass
+        assert chat.pending == [failed]
+        assert await chat.flush() == 1
+        assert len(collection.docs) == 3
+
+    run(scenario())
+
+
+def test_page_walks_history_newest_first_across_flushed_and_pending_messages():
+    async def scenario():
+        chat = ChatLog(InMemoryCollection())
+        for n in range(5):
+            chat.append("room1", message(n))
+        await chat.flush()
+        for n in range(5, 8):
+            chat.append("room1", message(n))
+        chat.append("room2", message(9))
+
+        texts, cursor = [], None
+        while True:
+            page = await chat.page("room1", before=cursor, limit=3)
+            assert all("room_id" not in m and isinstance(m["id"], str) for m in page["messages"])
+            texts.append([m["message"] for m in page["messages"]])
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+        return texts
+
+    assert run(scenario()) == [["m5", "m6", "m7"], ["m2", "m3", "m4"], ["m0", "m1"]]
+
+
+def test_page_cursor_splits_equal_timestamps_without_repeats_or_gaps():
+    async def scenario():
+        chat = ChatLog(InMemoryCollection())
+        for n in range(5):
+            chat.append("room1", {**message(n), "timestamp": "2026-01-01T00:00:00"})
+        await chat.flush()
+        chat.append("room1", {**message(5), "timestamp": "2026-01-01T00:00:00"})
+
+        seen, cursor = [], None
+        while True:
+            page = await chat.page("room1", before=cursor, limit=2)
+            seen.extend(m["message"] for m in page["messages"])
+            cursor = page["next_cursor"]
+            if cursor is None:
+                return seen
+
+    assert sorted(run(scenario())) == [f"m{n}" for n in range(6)]
+
+
+def test_page_of_an_exact_multiple_has_no_next_cursor():
+    async def scenario():
+        chat = ChatLog(InMemoryCollection())
+        for n in range(4):
+            chat.append("room1", message(n))
+        await chat.flush()
+        first = await chat.page("room1", limit=2)
+        second = await chat.page("room1", before=first["next_cursor"], limit=2)
+        return second
+
+    page = run(scenario())
+    assert [m["message"] for m in page["messages"]] == ["m0", "m1"]
+    assert page["next_cursor"] is None
+
+
+def test_page_rejects_a_malformed_cursor():
+    chat = ChatLog(InMemoryCollection())
+    for cursor in ("garbage", "2026-01-01T00:00:00~not-an-id"):
+        with pytest.raises(InvalidCursor):
+            run(chat.page("room1", before=cursor))
@@ -0,0 +1,104 @@
+"""Graceful drain: the admin endpoint, readiness and the hand-off snapshot."""
+
+import asyncio
+
+import server
+from tests.standins import asgi_call, asgi_request
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def drainable(monkeypatch, token="s3cret"):
+    """Restore the module-level drain state after the test"""
+    monkeypatch.setattr(server, "DRAIN_TOKEN", token)
+    monkeypatch.setattr(server, "draining", False)
+    monkeypatch.setattr(server.shard_router, "left", False)
+
+    async def reachable(timeout=None):
+        return True
+
+    monkeypatch.setattr(server.db, "ping", reachable)
+
+
+def test_drain_endpoint_is_off_without_a_token_and_checks_it(game, monkeypatch):
+    drainable(monkeypatch, token=None)
+
+    async def scenario():
+        drain = "/api/admin/drain"
+        assert (await asgi_call(game.app, "POST", drain, headers={"Authorization": "Bearer "}))[0] == 404
+        monkeypatch.setattr(server, "DRAIN_TOKEN", "s3cret")
+        assert (await asgi_call(game.app, "POST", drain))[0] == 401
+        assert (await asgi_call(game.app, "POST", drain, headers={"Authorization": "Bearer wrong"}))[0] == 401
+        assert (await asgi_call(game.app, "POST", drain, headers={"Authorization": "s3cret"}))[0] == 401
+        assert not server.draining
+        status, _, body = await asgi_call(game.app, "POST", drain, headers={"Authorization": "Bearer s3cret"})
+        assert (status, body) == (200, b'{"rooms":0}')
+        assert server.draining
+
+    run(scenario())
+
+
+def test_a_draining_worker_turns_unready_and_refuses_new_work(game, monkeypatch):
+    drainable(monkeypatch)
+
+    async def scenario():
+        room_id, _ = await game.room(players=1)
+        assert await asgi_request(game.app, "GET", "/api/ready") == (200, {"status": "ready"})
+
+        assert await server.drain_worker() == 1
+        assert await server.drain_worker() == 0  # already draining
+        assert await asgi_request(game.app, "GET", "/api/ready") == (503, {"status": "draining"})
+        assert await server.connect("late-sid", {}) is False
+        status, _ = await asgi_request(game.app, "POST", "/api/rooms/create", {"player_name": "Ada"})
+        assert status == 503
+        status, _ = await asgi_request(game.app, "POST", "/api/rooms/join",
+                                       {"room_id": room_id, "player_name": "Grace"})
+        assert status == 503
+        assert server.shard_router.left
+
+    run(scenario())
+
+
+def test_drained_rooms_are_handed_off_with_their_players_disconnected(game, monkeypatch):
+    drainable(monkeypatch)
+    told = []
+    emit = server.sio.emit
+
+    async def recording(event, data=None, to=None, **kwargs):
+        if event == "server_draining":
+            told.append(to)
+        await emit(event, data, to=to, **kwargs)
+
+    monkeypatch.setattr(server.sio, "emit", recording)
+
+    async def scenario():
+        room_id, sids = await game.room(players=2, start=True)
+        await server.drain_worker()
+
+        assert server.game_rooms == {} and len(server.sessions) == 0
+        snapshot = await server.room_store.load(room_id)
+        assert snapshot["status"] == "playing" and len(snapshot["players"]) == 2
+        assert all(p["disconnected"] and p["sid"] is None for p in snapshot["players"])
+        assert await server.room_store.owner(room_id) is None
+        # Flushed to MongoDB before the sockets were told to go
+        assert server.room_persister.collection.writes == 1 and not server.room_persister.dirty
+        assert server.event_log.pending == []
+        assert set(told) >= set(sids)
+        return room_id, snapshot
+
+    room_id, snapshot = run(scenario())
+
+    # The next worker resumes the room, and each player's join reconnects them
+    monkeypatch.setattr(server, "draining", False)
+
+    async def resume():
+        room = await server.resolve_room(room_id)
+        assert room.version == snapshot["version"]
+        assert set(room.disconnected_since) == set(room.players)
+        sid = await game.connect(room_id, room.host_id)
+        assert not room.players[room.host_id].disconnected
+        assert server.sessions.get(sid).room_id == room_id
+
+    run(resume())
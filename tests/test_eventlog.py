@@ -0,0 +1,94 @@
+import asyncio
+
+from eventlog import EventLog, replay
+from game_room import GameRoom, Player
+from tests.standins import InMemoryCollection
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def play(room: GameRoom, log: EventLog):
+    """A short game, logged the way broadcast_patch does after each handler"""
+    steps = [
+        lambda: room.add_player(Player("p2", "Grace", 450, 300, "#10b981", False)),
+        lambda: room.set_status("playing"),
+        lambda: (room.set_object_flag("uv_lamp", "picked_up"), room.add_item("uv_lamp")),
+        lambda: room.set_object_flag("note", "uv_revealed"),
+        lambda: room.place_piece("jigsaw", 3),
+        lambda: room.remove_item("uv_lamp"),
+        lambda: room.update_player("p2", disconnected=True),
+        lambda: room.set_solved("code_lock"),
+        lambda: room.remove_player("p2"),
+    ]
+    for step in steps:
+        step()
+        log.append(room, room.drain_patch())
+
+
+def new_room() -> GameRoom:
+    room = GameRoom("room1", "p1")
+    room.add_player(Player("p1", "Ada", 400, 300, "#D4AF37", True))
+    return room
+
+
+def test_replaying_every_event_rebuilds_the_room():
+    log = EventLog(InMemoryCollection(), InMemoryCollection(), snapshot_every=1000)
+    room = new_room()
+    start = room.to_snapshot()
+    log.append(room, room.drain_patch())
+    play(room, log)
+
+    rebuilt = replay({**start, "version": 0, "players": []}, log.pending)
+    assert rebuilt.to_snapshot() == room.to_snapshot()
+
+
+def test_replay_stops_at_a_version_and_at_gaps():
+    log = EventLog(InMemoryCollection(), InMemoryCollection(), snapshot_every=1000)
+    room = new_room()
+    log.append(room, room.drain_patch())
+    snapshot = log.pending_snapshots[0]["state"]
+    play(room, log)
+
+    assert replay(snapshot, log.pending, until=3).version == 3
+    assert replay(snapshot, log.pending, until=3).status == "playing"
+    with_gap = [e for e in log.pending if e["version"] != 5]
+    assert replay(snapshot, with_gap).version == 4
+
+
+def test_load_starts_from_the_nearest_snapshot_and_reads_flushed_and_pending_events():
+    async def scenario():
+        log = EventLog(InMemoryCollection(), InMemoryCollection(), snapshot_every=4)
+        room = new_room()
+        log.append(room, room.drain_patch())
+        play(room, log)
+        history = {}
+        for version in range(1, room.version + 1):
+            history[version] = (await log.load("room1", version)).to_snapshot()
+
+        await log.flush()
+        room.set_status("won")
+        log.append(room, room.drain_patch())  # pending, not flushed
+
+        assert len(log.snapshots.docs) > 1
+        for version, snapshot in history.items():
+            assert (await log.load("room1", version)).to_snapshot() == snapshot
+        assert (await log.load("room1")).to_snapshot() == room.to_snapshot()
+        assert await log.load("other") is None
+
+    run(scenario())
+
+
+def test_fast_forward_applies_events_newer_than_a_stale_snapshot():
+    async def scenario():
+        log = EventLog(InMemoryCollection(), InMemoryCollection())
+        room = new_room()
+        log.append(room, room.drain_patch())
+        stale = room.to_snapshot()
+        play(room, log)
+        await log.flush()
+        assert await log.fast_forward(stale) == room.to_snapshot()
+        assert await log.fast_forward(room.to_snapshot()) == room.to_snapshot()
+
+    run(scenario())
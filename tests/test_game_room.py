@@ -0,0 +1,115 @@
+import math
+
+import game_room
+from game_room import GameRoom, Player
+
+
+def room_with_player(x: float = 400, y: float = 300) -> GameRoom:
+    room = GameRoom("room1", "p1")
+    room.add_player(Player("p1", "Ada", x, y, "#ffffff", True))
+    room.drain_patch()
+    return room
+
+
+def test_a_move_cannot_cover_more_than_the_burst(monkeypatch):
+    monkeypatch.setattr(game_room, "MAX_MOVE_SPEED", 300)
+    monkeypatch.setattr(game_room, "MOVE_BURST", 100)
+    room = room_with_player(400, 300)
+    player = room.players["p1"]
+    player.move_budget, player.moved_at = 100, 0.0
+    monkeypatch.setattr(game_room.time, "monotonic", lambda: 0.0)
+
+    # A teleport across the room only gets as far as the banked distance
+    assert room.move_player("p1", {"x": 700, "y": 700})
+    assert math.hypot(player.x - 400, player.y - 300) == 100
+    # With nothing banked and no time passed, the player stays put
+    assert not room.move_player("p1", {"x": 700, "y": 700})
+
+
+def test_move_budget_refills_with_time(monkeypatch):
+    monkeypatch.setattr(game_room, "MAX_MOVE_SPEED", 300)
+    monkeypatch.setattr(game_room, "MOVE_BURST", 100)
+    room = room_with_player(100, 100)
+    player = room.players["p1"]
+    player.move_budget, player.moved_at = 0.0, 0.0
+    clock = [0.1]
+    monkeypatch.setattr(game_room.time, "monotonic", lambda: clock[0])
+
+    assert room.move_player("p1", {"x": 130, "y": 100})  # 30 px in 0.1 s is walking pace
+    assert (player.x, player.y) == (130, 100)
+    clock[0] = 10.0
+    assert room.move_player("p1", {"x": 500, "y": 100})  # a long pause still banks only the burst
+    assert (player.x, player.y) == (230, 100)
+
+
+def test_moves_are_clamped_to_the_room(monkeypatch):
+    monkeypatch.setattr(game_room, "MAX_MOVE_SPEED", 0)
+    room = room_with_player()
+    room.move_player("p1", {"x": -50, "y": 10 ** 6})
+    layout = room.definition.layout
+    assert (room.players["p1"].x, room.players["p1"].y) == (0, layout.height)
+    assert not room.move_player("p1", {"x": "1", "y": 2})
+
+
+def apply_json_patch(doc: dict, ops: list) -> dict:
+    """The subset of RFC 6902 the room emits, as a client applies it"""
+    for op in ops:
+        *parents, last = [k.replace('~1', '/').replace('~0', '~') for k in op["path"].split('/')[1:]]
+        target = doc
+        for key in parents:
+            target = target[int(key)] if isinstance(target, list) else target[key]
+        if op["op"] == "remove":
+            if isinstance(target, list):
+                del target[int(last)]
+            else:
+                del target[last]
+        elif isinstance(target, list) and last == "-":
+            target.append(op["value"])
+        else:
+            target[last] = op["value"]
+    return doc
+
+
+def mutate(room: GameRoom):
+    room.add_player(Player("p2", "Grace", 450, 300, "#10b981", False))
+    room.set_status("playing")
+    room.add_item("uv_lamp")
+    room.set_object_flag("note", "examined")
+    room.set_solved("code_lock")
+    room.update_player("p2", disconnected=True)
+
+
+def test_drained_patch_turns_the_old_state_into_the_new_one():
+    room = room_with_player()
+    before = room.to_dict()
+    mutate(room)
+    patch = room.drain_patch()
+    assert (patch["base"], patch["version"]) == (1, room.version)
+    after = apply_json_patch(before, patch["ops"])
+    after["version"] = patch["version"]  # clients take the version from the patch itself
+    assert after == room.to_dict()
+    assert room.drain_patch() is None
+
+
+def test_unchanged_values_record_no_ops():
+    room = room_with_player()
+    room.set_status("lobby")
+    room.update_player("p1", disconnected=False)
+    room.set_object_flag("note", "examined", False)
+    assert room.drain_patch() is None and room.version == 1
+
+
+def test_patch_since_covers_the_history_window(monkeypatch):
+    monkeypatch.setattr(game_room, "PATCH_HISTORY", 4)
+    room = room_with_player()
+    mutate(room)  # six ops, versions 2..7
+    room.drain_patch()
+
+    assert room.patch_since(room.version) == {"base": 7, "version": 7, "ops": []}
+    recent = room.patch_since(5)
+    assert recent["base"] == 5
+    assert [op["path"] for op in recent["ops"]] == ["/puzzle_states/code_lock/solved", "/players/p2/disconnected"]
+    assert len(room.patch_since(3)["ops"]) == 4
+    # Older than the last four ops, or ahead of the room: the client needs a full resync
+    assert room.patch_since(2) is None
+    assert room.patch_since(8) is None
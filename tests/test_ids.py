@@ -0,0 +1,92 @@
+import asyncio
+
+import pytest
+
+import ids
+import server
+from ids import RoomIdAllocator, RoomIdsExhausted, player_id_for, random_id
+from tests.standins import InMemoryCollection, asgi_request
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def scripted_ids(monkeypatch, sequence):
+    """Make random_id return the given ids in order"""
+    draws = iter(sequence)
+    monkeypatch.setattr(ids, "random_id", lambda length: next(draws))
+
+
+def test_random_ids_are_base36_of_the_requested_length():
+    for _ in range(200):
+        room_id = random_id(6)
+        assert len(room_id) == 6 and set(room_id) <= set(ids.ALPHABET)
+    assert player_id_for(set()) != player_id_for(set())
+
+
+def test_ids_are_reserved_in_batches_as_mongo_ids():
+    async def scenario():
+        collection = InMemoryCollection()
+        allocator = RoomIdAllocator(collection, lambda room_id: True, batch=4, worker_id="w1")
+        allocated = [await allocator.allocate() for _ in range(6)]
+        assert len(set(allocated)) == 6
+        assert collection.writes == 2
+        assert set(collection.docs) >= set(allocated) and len(collection.docs) == 8
+        assert {doc["worker"] for doc in collection.docs.values()} == {"w1"}
+
+    run(scenario())
+
+
+def test_only_ids_owned_by_this_worker_are_reserved_and_handed_out(monkeypatch):
+    scripted_ids(monkeypatch, ["aa0001", "bb0002", "aa0003", "bb0004", "aa0005"])
+    local = {"aa0001", "aa0003", "aa0005"}
+
+    async def scenario():
+        allocator = RoomIdAllocator(InMemoryCollection(), lambda room_id: room_id in local, batch=3)
+        assert [await allocator.allocate() for _ in range(2)] == ["aa0001", "aa0003"]
+        # The ring moved aa0005 to another worker after it was reserved
+        local.discard("aa0005")
+        scripted_ids(monkeypatch, ["cc0006"])
+        local.add("cc0006")
+        monkeypatch.setattr(allocator, "batch", 1)
+        assert await allocator.allocate() == "cc0006"
+
+    run(scenario())
+
+
+def test_collisions_are_skipped_and_retried(monkeypatch):
+    async def scenario():
+        collection = InMemoryCollection()
+        await collection.insert_many([{"_id": "taken1"}, {"_id": "taken2"}, {"_id": "taken3"}])
+        allocator = RoomIdAllocator(collection, lambda room_id: True, batch=2)
+        scripted_ids(monkeypatch, ["taken1", "free01", "taken2", "taken3", "free02", "free03"])
+        allocated = [await allocator.allocate() for _ in range(3)]
+        assert allocated == ["free01", "free02", "free03"]
+        assert allocator.collisions == 3
+
+    run(scenario())
+
+
+def test_allocation_gives_up_when_every_reservation_collides(monkeypatch):
+    async def scenario():
+        collection = InMemoryCollection()
+        await collection.insert_many([{"_id": "taken1"}])
+        allocator = RoomIdAllocator(collection, lambda room_id: True, batch=1, max_reservations=3)
+        scripted_ids(monkeypatch, ["taken1"] * 3 + ["free01"])
+        with pytest.raises(RoomIdsExhausted):
+            await allocator.allocate()
+        assert allocator.collisions == 3
+        # The next create starts a fresh round of attempts
+        assert await allocator.allocate() == "free01"
+
+    run(scenario())
+
+
+def test_create_room_answers_503_when_no_id_can_be_reserved(game, monkeypatch):
+    async def exhausted():
+        raise RoomIdsExhausted("no free room id")
+
+    monkeypatch.setattr(server.room_ids, "allocate", exhausted)
+    status, _ = run(asgi_request(game.app, "POST", "/api/rooms/create", {"player_name": "Ada"}))
+    assert status == 503
@@ -0,0 +1,39 @@
+from interest import InterestManager
+
+
+def sends(interest, room_id, viewers, moves):
+    """sid -> positions it is sent in one filtered tick"""
+    sent = {}
+    for _, sids, visible in interest.groups(room_id, viewers, interest.changed(room_id, moves)):
+        for sid in sids:
+            sent[sid] = visible
+    return sent
+
+
+def test_unchanged_positions_are_not_resent():
+    interest = InterestManager(quantum=10)
+    assert interest.changed("r", {"p1": {"x": 101, "y": 99}}) == {"p1": {"x": 100, "y": 100}}
+    assert interest.changed("r", {"p1": {"x": 104, "y": 103}}) == {}
+    assert interest.changed("r", {"p1": {"x": 106, "y": 103}}) == {"p1": {"x": 110, "y": 100}}
+
+
+def test_viewers_only_receive_nearby_movers():
+    interest = InterestManager(radius=100)
+    viewers = [("near", "json", 50, 50), ("far", "json", 950, 950)]
+    sent = sends(interest, "r", viewers, {"p1": {"x": 120, "y": 80}})
+    assert sent == {"near": {"p1": {"x": 120, "y": 80}}}
+
+
+def test_viewer_entering_a_cell_sees_players_that_moved_while_out_of_range():
+    interest = InterestManager(radius=100)
+    # p1 walks to (550, 550) while the viewer is far away, then stops
+    assert sends(interest, "r", [("v", "json", 50, 50)], {"p1": {"x": 550, "y": 550}, "v": {"x": 50, "y": 50}}) \
+        == {"v": {"v": {"x": 50, "y": 50}}}
+
+    # The viewer walks over; p1 sends nothing new but must show up where it stopped
+    sent = sends(interest, "r", [("v", "json", 480, 480)], {"v": {"x": 480, "y": 480}})
+    assert sent["v"]["p1"] == {"x": 550, "y": 550}
+
+    # Moving within the same cell only carries actual moves again
+    assert sends(interest, "r", [("v", "json", 490, 480)], {"v": {"x": 490, "y": 480}}) \
+        == {"v": {"v": {"x": 490, "y": 480}}}
@@ -0,0 +1,66 @@
+import asyncio
+import json
+
+import server
+from lobby import LobbyIndex
+from tests.standins import asgi_request
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def entry(room_id: str, players: int) -> dict:
+    return {"room_id": room_id, "host": "host", "players": players, "max_players": 4}
+
+
+def test_match_prefers_the_fullest_then_the_oldest_room():
+    lobby = LobbyIndex(4)
+    lobby.update("a", entry("a", 1))
+    lobby.update("b", entry("b", 3))
+    lobby.update("c", entry("c", 3))
+    assert lobby.match() == "b"
+    lobby.update("b", entry("b", 4))  # full rooms leave the index
+    assert lobby.match() == "c"
+    lobby.discard("c")
+    assert lobby.match() == "a"
+    lobby.discard("a")
+    assert lobby.match() is None and len(lobby) == 0
+
+
+def test_pages_are_cached_until_the_index_changes():
+    lobby = LobbyIndex(4)
+    for i in range(3):
+        lobby.update(f"r{i}", entry(f"r{i}", 1))
+    etag, body = lobby.page(0, 2)
+    assert json.loads(body) == {"rooms": [entry("r0", 1), entry("r1", 1)], "total": 3, "next_offset": 2}
+    assert lobby.page(0, 2) == (etag, body)
+    lobby.update("r1", entry("r1", 1))  # unchanged entries keep the cached page
+    assert lobby.page(0, 2)[0] == etag
+    lobby.update("r1", entry("r1", 2))
+    assert lobby.page(0, 2)[0] != etag
+
+
+def test_listing_and_quick_match_include_other_workers_rooms(game):
+    async def scenario():
+        local_room, _ = await game.create_room()
+        store = server.room_store
+        await store.heartbeat("other-worker", 30)
+        await store.save_lobby("other-worker", [entry("remote1", 3)], 30)
+        await server.sync_lobby()
+
+        status, body = await asgi_request(game.app, "GET", "/api/rooms")
+        assert status == 200
+        assert {r["room_id"] for r in body["rooms"]} == {local_room, "remote1"}
+
+        # The remote room is closest to full but cannot be joined from here;
+        # quick-match moves on to the next open room
+        status, body = await asgi_request(game.app, "POST", "/api/rooms/quick-match", {"player_name": "guest"})
+        assert status == 200 and body["room_id"] == local_room
+
+        # Rooms a worker stops publishing drop out of the listing
+        await store.save_lobby("other-worker", [], 30)
+        await server.sync_lobby()
+        assert list(server.listing.open) == [local_room]
+
+    run(scenario())
@@ -0,0 +1,62 @@
+import asyncio
+
+import metrics
+import server
+from metrics import Counter, Registry
+
+
+def test_label_values_are_escaped():
+    registry = Registry()
+    counter = registry.register(Counter("events_total", "Events", label="event"))
+    counter.inc(label_value='evil"} 1\nfake_metric{a="\\')
+
+    lines = registry.render().splitlines()
+    assert lines[-1] == 'events_total{event="evil\\"} 1\\nfake_metric{a=\\"\\\\"} 1'
+    assert not any(line.startswith("fake_metric") for line in lines)
+
+
+def test_unregistered_events_share_one_series(game):
+    async def scenario():
+        sid = await game.engine.connect()
+        for i in range(3):
+            await game.engine.event(sid, f"junk{i}", {})
+        await game.engine.event(sid, "sync_state", {})
+
+    before = dict(metrics.handler_latency.series)
+    asyncio.run(scenario())
+    new = set(metrics.handler_latency.series) - set(before)
+    assert not any(str(label).startswith("junk") for label in new)
+    assert metrics.UNHANDLED_EVENT in metrics.handler_latency.series
+
+
+def samples(event: str) -> int:
+    series = metrics.handler_latency.series.get(event)
+    return sum(series[0]) if series is not None else 0
+
+
+def test_forwarded_events_are_timed_once_on_the_owner(game, monkeypatch):
+    published = []
+
+    async def publish(worker_id, message):
+        published.append(message)
+
+    async def scenario():
+        room_id, sids = await game.room(players=2, start=True)
+        before = samples("send_message")
+        await game.engine.event(sids[0], "send_message", {"message": "local"})
+        assert samples("send_message") == before + 1
+
+        # Another worker owns the room: this one only forwards the event
+        with monkeypatch.context() as m:
+            m.setattr(server.shard_router, "owner", lambda room_id: "elsewhere")
+            m.setattr(server.shard_router.store, "publish", publish)
+            await game.engine.event(sids[0], "send_message", {"message": "forwarded"})
+        assert [message["event"] for message in published] == ["send_message"]
+        assert samples("send_message") == before + 1
+
+        # ... and the owner times the handler when the message arrives
+        await server.shard_router._dispatch(published[0])
+        await server.room_actors.run(room_id, lambda: asyncio.sleep(0))  # runs after the queued event
+        assert samples("send_message") == before + 2
+
+    asyncio.run(scenario())
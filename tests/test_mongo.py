@@ -0,0 +1,94 @@
+"""LazyMongo and the readiness probe built on its ping."""
+
+import asyncio
+
+import pytest
+
+import server
+from mongo import LazyCollection, LazyMongo
+from tests.standins import asgi_request
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+class FakeAdmin:
+    def __init__(self, reachable):
+        self.reachable = reachable
+        self.pings = 0
+
+    async def command(self, name):
+        self.pings += 1
+        if not self.reachable:
+            raise ConnectionError("no servers found")
+        return {"ok": 1}
+
+
+class FakeClient:
+    def __init__(self, reachable=True):
+        self.admin = FakeAdmin(reachable)
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def test_nothing_connects_until_a_collection_is_used():
+    mongo = LazyMongo("mongodb://127.0.0.1:1", "escape_room", timeout=0.2)
+    rooms = mongo.rooms
+    assert isinstance(rooms, LazyCollection) and isinstance(mongo["events"], LazyCollection)
+    assert mongo._client is None
+
+    assert rooms.name == "rooms"
+    assert rooms.find_one is not None  # first real use creates the client
+    client = mongo._client
+    assert client is not None and mongo.client is client
+    assert mongo.database.name == "escape_room"
+    mongo.close()
+    assert mongo._client is None
+
+    with pytest.raises(AttributeError):
+        mongo._private
+
+
+def test_using_mongo_without_a_url_is_an_error():
+    mongo = LazyMongo(None, "escape_room")
+    rooms = mongo.rooms  # handing out collections is still fine
+    with pytest.raises(RuntimeError, match="MONGO_URL and DB_NAME"):
+        rooms.find_one
+    with pytest.raises(RuntimeError):
+        LazyMongo("mongodb://localhost:27017", None).database
+
+
+def test_ping_reports_reachability_without_raising():
+    mongo = LazyMongo("mongodb://127.0.0.1:1", "escape_room", timeout=5)
+    mongo._client = FakeClient(reachable=False)
+    assert run(mongo.ping()) is False
+    mongo._client = FakeClient(reachable=True)
+    assert run(mongo.ping()) is True
+
+    class Hanging(FakeAdmin):
+        async def command(self, name):
+            await asyncio.sleep(10)
+
+    mongo._client.admin = Hanging(True)
+    assert run(mongo.ping(timeout=0.01)) is False
+    assert run(LazyMongo(None, None).ping()) is False
+
+
+def test_ready_is_503_until_mongo_answers_a_ping(game, monkeypatch):
+    monkeypatch.setattr(server, "draining", False)
+    client = FakeClient(reachable=False)
+    monkeypatch.setattr(server.db, "_client", client)
+
+    async def scenario():
+        assert await asgi_request(game.app, "GET", "/api/ready") == (503, {"status": "waiting for MongoDB"})
+        # Ordinary requests are served meanwhile
+        status, _ = await asgi_request(game.app, "GET", "/api/")
+        assert status == 200
+        client.admin.reachable = True
+        assert await asgi_request(game.app, "GET", "/api/ready") == (200, {"status": "ready"})
+        assert client.admin.pings == 2
+
+    run(scenario())
@@ -0,0 +1,197 @@
+"""The data-driven puzzle engine: validators, compile_room checks and effects."""
+
+import asyncio
+
+import pytest
+
+import game_room
+import server
+from game_room import GameRoom, Player
+from puzzles import apply_item_use, apply_puzzle_solution, compile_room
+
+VAULT = {
+    "name": "The Vault",
+    "secrets": {"pin": {"length": 6, "alphabet": "AB"}, "dial": {"length": 2, "separator": "/"}},
+    "objects": {
+        "terminal": {"flags": ["examined"], "clue": "PIN {pin}, dial {dial}"},
+        "crate": {"flags": ["open"], "contains": "crowbar"},
+        "mosaic": {"flags": ["complete"]},
+        "door": {"flags": ["unlocked"]}
+    },
+    "puzzles": {
+        "pin_pad": {"validator": {"type": "secret", "secret": "pin"}, "set_flags": [["crate", "open"]],
+                    "reward_from": "crate", "fail_message": "Denied"},
+        "riddle": {"validator": {"type": "normalized", "answer": "an echo"}},
+        "lever": {"validator": {"type": "exact", "answer": 42}},
+        "minigame": {"validator": {"type": "true"}, "item_found": "nothing"},
+        "mosaic": {"validator": {"type": "pieces", "count": 3}, "set_flags": [["mosaic", "complete"]],
+                   "progress_event": "mosaic_progress"},
+        "tiles": {"validator": {"type": "pieces", "count": 2}},
+        "door": {}
+    },
+    "item_uses": [
+        {"item": "crowbar", "target": "door", "requires": ["crowbar", "badge"], "set_flags": [["door", "unlocked"]],
+         "solve": "door", "status": "won", "event": "game_won"},
+        {"item": "glue", "consume": ["shard_a", "shard_b"], "grant": "vase", "event": "items_combined",
+         "message": "Good as new"}
+    ]
+}
+
+
+def vault() -> GameRoom:
+    return GameRoom("room1", "p1", compile_room("vault", VAULT))
+
+
+def study() -> GameRoom:
+    room = GameRoom("room1", "p1")
+    room.add_player(Player("p1", "Ada", 400, 300, "#ffffff", True))
+    room.drain_patch()
+    return room
+
+
+def test_secret_validator_compares_against_the_rooms_own_secret():
+    room = vault()
+    check = room.definition.puzzles["pin_pad"].validate
+    assert set(room.secrets["pin"]) <= {"A", "B"} and len(room.secrets["pin"]) == 6
+    assert check(room, {"answer": room.secrets["pin"]}) is True
+    assert check(room, {"answer": "C" * 6}) is False
+    assert check(room, {}) is False
+    assert room.pending_ops == []
+
+
+def test_answer_validators():
+    room = vault()
+    puzzles = room.definition.puzzles
+    assert puzzles["riddle"].validate(room, {"answer": "  An Echo "}) is True
+    assert puzzles["riddle"].validate(room, {"answer": "a shadow"}) is False
+    assert puzzles["riddle"].validate(room, {"answer": 7}) is False
+    assert puzzles["lever"].validate(room, {"answer": 42}) is True
+    assert puzzles["lever"].validate(room, {"answer": "42"}) is False
+    assert puzzles["minigame"].validate(room, {"answer": True}) is True
+    assert puzzles["minigame"].validate(room, {"answer": "true"}) is False
+
+
+def test_pieces_validator_reports_progress_then_solves():
+    room = vault()
+    check = room.definition.puzzles["mosaic"].validate
+    for ignored in (None, -1, 3, True, "0"):
+        assert check(room, {"piece_index": ignored}) is None
+    assert room.pending_ops == []
+
+    assert check(room, {"piece_index": 2}) == {"pieces": [False, False, True]}
+    assert check(room, {"piece_index": 2}) == {"pieces": [False, False, True]}
+    assert check(room, {"piece_index": 0}) == {"pieces": [True, False, True]}
+    assert check(room, {"piece_index": 1}) is True
+    assert [op["path"] for op in room.drain_patch()["ops"]] == ["/progress/mosaic"] * 3
+    # Each piece puzzle keeps its own progress
+    assert room.pieces("tiles") == [False, False]
+
+
+def test_clues_and_snapshots_use_the_definitions_secrets(monkeypatch):
+    room = vault()
+    monkeypatch.setitem(game_room.ROOM_DEFINITIONS, "vault", room.definition)
+    room.secrets = {"pin": "ABABAB", "dial": "42"}
+    room.place_piece("tiles", 1)
+    assert room.object_clue("terminal") == "PIN ABABAB, dial 4/2"
+    assert room.object_clue("crate") is None
+
+    restored = GameRoom.from_snapshot(room.to_snapshot())
+    assert restored.definition is room.definition
+    assert restored.secrets == room.secrets
+    assert restored.to_dict() == room.to_dict()
+    assert restored.to_dict()["progress"] == {"mosaic": 0, "tiles": 2}
+
+
+def test_snapshots_from_before_generic_secrets_still_load():
+    room = study()
+    snapshot = room.to_snapshot()
+    del snapshot["room_type"], snapshot["secrets"], snapshot["progress"]
+    snapshot.update(code="1234", combination="567", jigsaw=5)
+    restored = GameRoom.from_snapshot(snapshot)
+    assert restored.object_clue("painting") == "Behind the frame: 5-6-7"
+    assert restored.pieces("jigsaw")[:3] == [True, False, True]
+
+
+def broken(**changes) -> dict:
+    definition = {**VAULT, "puzzles": dict(VAULT["puzzles"]), "objects": dict(VAULT["objects"])}
+    for key, value in changes.items():
+        section, _, name = key.partition("__")
+        if name:
+            definition[section][name] = value
+        else:
+            definition[section] = value
+    return definition
+
+
+@pytest.mark.parametrize("definition, error", [
+    (broken(puzzles__riddle={"validator": {"type": "telepathy"}}), "unknown validator 'telepathy'"),
+    (broken(puzzles__riddle={"validator": {"type": "secret", "secret": "nope"}}), "unknown secret 'nope'"),
+    (broken(puzzles__riddle={"validator": {"type": "true"}, "reward_from": "door"}), "'door' does not contain"),
+    (broken(puzzles__riddle={"validator": {"type": "true"}, "reward_from": "ghost"}), "'ghost' does not contain"),
+    (broken(puzzles__riddle={"validator": {"type": "true"}, "set_flags": [["ghost", "open"]]}),
+     "puzzle riddle: unknown object 'ghost'"),
+    (broken(item_uses=[{"item": "x", "set_flags": [["ghost", "open"]], "event": "e"}]),
+     "item use x: unknown object 'ghost'"),
+    (broken(item_uses=[{"item": "x", "solve": "ghost", "event": "e"}]), "unknown puzzle 'ghost'"),
+    (broken(objects__note={"clue": "Try {password}"}), "unknown secret 'password'"),
+])
+def test_compile_room_rejects_broken_definitions(definition, error):
+    with pytest.raises(ValueError, match=error):
+        compile_room("broken", definition)
+
+
+def test_item_use_checks_requires_and_consume():
+    room = vault()
+    definition = room.definition
+    door = definition.item_use("crowbar", "door")
+    glue = definition.item_use("glue", "anything")  # target-less uses match any target
+    assert definition.item_use("crowbar", "crate") is None
+
+    room.add_item("crowbar")
+    room.add_item("shard_a")
+    room.drain_patch()
+    assert apply_item_use(room, door) is None
+    assert apply_item_use(room, glue) is None
+    assert room.drain_patch() is None
+
+    room.add_item("badge")
+    room.add_item("shard_b")
+    assert apply_item_use(room, glue) == {"result": "vase", "message": "Good as new"}
+    assert apply_item_use(room, glue) is None  # the shards are gone
+    assert apply_item_use(room, door) == {}
+    # Required items are kept, consumed ones are not
+    assert room.inventory == ["crowbar", "badge", "vase"]
+    assert room.is_solved("door") and room.object_flag("door", "unlocked") and room.status == "won"
+
+
+def test_re_solving_a_puzzle_changes_nothing():
+    room = vault()
+    pin_pad = room.definition.puzzles["pin_pad"]
+    assert apply_puzzle_solution(room, pin_pad) == {"puzzle_id": "pin_pad", "item_found": "crowbar"}
+    version = room.version
+    assert apply_puzzle_solution(room, pin_pad) is None
+    assert room.version == version
+    assert room.inventory == ["crowbar"]
+
+
+def test_solve_puzzle_twice_grants_the_reward_once(game, monkeypatch):
+    solved = []
+    emit = server.sio.emit
+
+    async def recording(event, data=None, **kwargs):
+        if event == "puzzle_solved":
+            solved.append(data["puzzle_id"])
+        await emit(event, data, **kwargs)
+
+    monkeypatch.setattr(server.sio, "emit", recording)
+
+    async def scenario():
+        room_id, sids = await game.room(players=2, start=True)
+        room = server.game_rooms[room_id]
+        for sid in sids:
+            await game.engine.event(sid, "solve_puzzle", {"puzzle_id": "code_lock", "answer": room.secrets["code"]})
+        return room
+
+    room = asyncio.run(scenario())
+    assert solved == ["code_lock"]
+    assert room.inventory == ["key_piece_1"]
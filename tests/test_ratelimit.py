@@ -0,0 +1,122 @@
+import asyncio
+
+import server
+from ratelimit import Limit, RateLimiter
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_drop_policy_rejects_over_burst():
+    limiter = RateLimiter({"chat": Limit(0.001, 2)})
+    dropped = []
+
+    async def on_drop(sid, event):
+        dropped.append((sid, event))
+
+    limiter.on_drop = on_drop
+    seen = []
+
+    @limiter.limit
+    async def chat(sid, data):
+        seen.append(data)
+
+    async def scenario():
+        for n in range(4):
+            await chat("s1", n)
+        await chat("s2", 9)
+
+    run(scenario())
+    assert seen == [0, 1, 9]
+    assert dropped == [("s1", "chat"), ("s1", "chat")]
+
+
+def test_coalesce_policy_delivers_only_the_latest_held_event():
+    limiter = RateLimiter({"move": Limit(50, 1, "coalesce")})
+    seen = []
+
+    @limiter.limit
+    async def move(sid, data):
+        seen.append(data)
+
+    async def scenario():
+        for n in range(5):
+            await move("s1", n)
+        assert seen == [0]
+        await asyncio.sleep(0.05)
+
+    run(scenario())
+    assert seen == [0, 4]
+
+
+def test_deferred_deliveries_are_held_until_done_and_failures_logged(caplog):
+    limiter = RateLimiter({"move": Limit(50, 1, "coalesce")})
+    started, finish = asyncio.Event(), None
+
+    @limiter.limit
+    async def move(sid, data):
+        if data == 1:
+            started.set()
+            await finish.wait()
+            raise ValueError("boom")
+
+    async def scenario():
+        nonlocal finish
+        finish = asyncio.Event()
+        await move("s1", 0)
+        await move("s1", 1)
+        await asyncio.wait_for(started.wait(), 1)
+        # The running delivery is referenced by the limiter, not only the loop
+        assert len(limiter.releasing) == 1
+        finish.set()
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        assert limiter.releasing == set()
+
+    run(scenario())
+    assert "Deferred move failed" in caplog.text
+
+
+def test_forget_cancels_held_events():
+    limiter = RateLimiter({"move": Limit(50, 1, "coalesce")})
+    seen = []
+
+    @limiter.limit
+    async def move(sid, data):
+        seen.append(data)
+
+    async def scenario():
+        await move("s1", 0)
+        await move("s1", 1)
+        limiter.forget("s1")
+        await asyncio.sleep(0.05)
+
+    run(scenario())
+    assert seen == [0]
+    assert limiter.held == {} and limiter.timers == {}
+
+
+def test_puzzle_attempts_survive_a_reconnect(game, monkeypatch):
+    monkeypatch.setattr(server.player_rate_limiter, "limits", {"solve_puzzle": Limit(0.001, 2)})
+    dropped = []
+
+    async def on_drop(sid, event):
+        dropped.append(sid)
+
+    monkeypatch.setattr(server.player_rate_limiter, "on_drop", on_drop)
+
+    async def scenario():
+        room_id, sids = await game.room(players=2, start=True)
+        player_id = server.sessions.get(sids[0]).player_id
+        for answer in ("000", "001", "002"):
+            await game.engine.event(sids[0], "solve_puzzle", {"puzzle_id": "code_lock", "answer": answer})
+        # A fresh socket for the same player does not get a fresh burst
+        sid = await game.connect(room_id, player_id)
+        await game.engine.event(sid, "solve_puzzle", {"puzzle_id": "code_lock", "answer": "003"})
+        # Another player in the room has a bucket of their own
+        await game.engine.event(sids[1], "solve_puzzle", {"puzzle_id": "code_lock", "answer": "004"})
+        return sid
+
+    sid = run(scenario())
+    assert dropped[1:] == [sid] and len(dropped) == 2
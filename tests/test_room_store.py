@@ -0,0 +1,73 @@
+import asyncio
+
+import pytest
+
+from room_store import LocalRoomStore, RedisRoomStore, RoomStore
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+class RacyRedis:
+    """Just enough of redis.asyncio for claim(): the lease is taken by `thief` after our GET"""
+
+    def __init__(self, owner, thief=None):
+        self.keys = {"escape_room:room:r1:owner": owner} if owner else {}
+        self.thief = thief
+
+    async def set(self, key, value, nx=False, px=None):
+        if nx and key in self.keys:
+            return None
+        self.keys[key] = value
+        return True
+
+    async def get(self, key):
+        value = self.keys.get(key)
+        if self.thief is not None:
+            self.keys[key], self.thief = self.thief, None
+        return value
+
+    async def renew(self, keys, args):
+        owner = self.keys.get(keys[0])
+        if owner is None or owner == args[0]:
+            self.keys[keys[0]] = args[0]
+            return 1
+        return 0
+
+
+def redis_store(redis) -> RedisRoomStore:
+    store = RedisRoomStore.__new__(RedisRoomStore)
+    store.redis, store.prefix, store._renew = redis, "escape_room", redis.renew
+    return store
+
+
+def test_room_store_is_abstract():
+    with pytest.raises(TypeError):
+        RoomStore()
+
+
+def test_claim_reports_a_worker_that_took_the_lease_after_our_read():
+    # Our own lease is read back, then w2 takes it over before the renew script runs
+    assert run(redis_store(RacyRedis("w1", thief="w2")).claim("r1", "w1", 30)) == "w2"
+
+
+def test_claim_renews_our_own_lease():
+    store = redis_store(RacyRedis("w1"))
+    assert run(store.claim("r1", "w1", 30)) == "w1"
+    assert run(store.claim("r1", "w2", 30)) == "w1"
+
+
+def test_local_leases_expire_and_release_only_for_the_owner():
+    async def scenario():
+        store = LocalRoomStore()
+        assert await store.claim("r1", "w1", 30) == "w1"
+        assert await store.claim("r1", "w2", 30) == "w1"
+        await store.release("r1", "w2")
+        assert await store.owner("r1") == "w1"
+        await store.release("r1", "w1")
+        assert await store.claim("r1", "w2", 0.01) == "w2"
+        await asyncio.sleep(0.02)
+        assert await store.owner("r1") is None
+
+    run(scenario())
@@ -0,0 +1,200 @@
+"""Room lifecycle on the owning worker: eviction, reaping and hand-off."""
+
+import asyncio
+
+import server
+from tests.standins import asgi_call, asgi_request
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+async def hold_actor(room_id: str) -> asyncio.Event:
+    """Occupy a room's actor until the returned event is set, like a handler awaiting I/O"""
+    release = asyncio.Event()
+    server.room_actors.post(room_id, release.wait)
+    await asyncio.sleep(0)
+    return release
+
+
+def test_reaper_waits_for_the_rooms_inflight_events(game, monkeypatch):
+    async def scenario():
+        room_id, _ = await game.create_room()
+        monkeypatch.setattr(server, "ROOM_TTLS", {status: -1 for status in server.ROOM_TTLS})
+        release = await hold_actor(room_id)
+
+        reaping = asyncio.create_task(server.reap_rooms())
+        await asyncio.sleep(0.01)
+        assert room_id in server.game_rooms
+        release.set()
+        await reaping
+        assert room_id not in server.game_rooms
+
+    run(scenario())
+
+
+def test_lru_eviction_runs_on_the_evicted_rooms_actor(game, monkeypatch):
+    async def scenario():
+        monkeypatch.setattr(server, "MAX_RESIDENT_ROOMS", 1)
+        oldest, _ = await game.create_room()
+        release = await hold_actor(oldest)
+
+        newest, _ = await game.create_room()
+        await asyncio.sleep(0.01)
+        assert oldest in server.game_rooms
+        release.set()
+        await asyncio.sleep(0.01)
+        assert list(server.game_rooms) == [newest]
+
+    run(scenario())
+
+
+def test_hand_off_waits_for_the_rooms_inflight_events(game, monkeypatch):
+    async def scenario():
+        room_id, _ = await game.create_room()
+        release = await hold_actor(room_id)
+        monkeypatch.setattr(server.shard_router, "is_local", lambda rid: False)
+
+        handing_off = asyncio.create_task(server.hand_off_rooms())
+        await asyncio.sleep(0.01)
+        assert room_id in server.game_rooms
+        release.set()
+        await handing_off
+        assert room_id not in server.game_rooms
+        assert await server.room_store.load(room_id) is not None
+
+    run(scenario())
+
+
+def test_evicted_rooms_sockets_are_sent_to_reconnect(game, monkeypatch):
+    emitted = []
+    emit = server.sio.emit
+
+    async def recording(event, data=None, to=None, **kwargs):
+        emitted.append((event, to))
+        await emit(event, data, to=to, **kwargs)
+
+    monkeypatch.setattr(server.sio, "emit", recording)
+
+    async def scenario():
+        room_id, sids = await game.room(players=2)
+        player_id = server.sessions.get(sids[1]).player_id
+        await server.room_actors.run(room_id, lambda: server.evict_room(room_id, "lru"))
+        assert sorted(to for event, to in emitted if event == "server_draining") == sorted(sids)
+
+        # The client's reconnect re-sends join_room, which rehydrates the room
+        sid = await game.connect(room_id, player_id)
+        assert room_id in server.game_rooms
+        assert server.sessions.get(sid).room_id == room_id
+
+    run(scenario())
+
+
+def test_rooms_left_by_a_crashed_worker_start_their_players_reconnect_window(game, monkeypatch):
+    emitted = []
+    emit = server.sio.emit
+
+    async def recording(event, data=None, to=None, **kwargs):
+        emitted.append((event, to))
+        await emit(event, data, to=to, **kwargs)
+
+    monkeypatch.setattr(server.sio, "emit", recording)
+
+    async def scenario():
+        room_id, sids = await game.room(players=2, start=True)
+        # The owner dies: memory and lease are gone, the shared snapshot is not
+        server.game_rooms.pop(room_id)
+        server.sessions.drop_room(room_id)
+        server.room_store.leases.clear()
+
+        room = await server.resolve_room(room_id)
+        assert all(p.disconnected and p.sid is None for p in room.players.values())
+        assert set(room.disconnected_since) == set(room.players)
+        assert all(server.sessions.get(sid) is None for sid in sids)
+        assert sorted(to for event, to in emitted if event == "server_draining") == sorted(sids)
+        assert all(p["disconnected"] for p in (await server.room_store.load(room_id))["players"])
+
+        monkeypatch.setattr(server, "PLAYER_DISCONNECT_TTL", -1)
+        await server.reap_room(room_id)
+        assert room.players == {}
+
+    run(scenario())
+
+
+def test_a_handed_off_room_keeps_its_sockets(game):
+    async def scenario():
+        room_id, sids = await game.room(players=2)
+        await server.room_actors.run(room_id, lambda: server.release_room(room_id))
+        assert (await server.room_store.load(room_id))["handed_off"]
+
+        room = await server.resolve_room(room_id)
+        assert not any(p.disconnected for p in room.players.values())
+        assert [server.sessions.get(sid).room_id for sid in sids] == [room_id, room_id]
+        # Only the first adoption after a release counts as a hand-off
+        assert "handed_off" not in await server.room_store.load(room_id)
+
+    run(scenario())
+
+
+def test_disconnects_without_a_binding_do_not_rehydrate_the_room(game):
+    async def scenario():
+        room_id, sids = await game.room(players=2)
+        await server.room_actors.run(room_id, lambda: server.evict_room(room_id, "lru"))
+        for sid in sids + ["stranger"]:
+            await server.player_disconnected.__wrapped__(sid, {"room_id": room_id})
+        assert room_id not in server.game_rooms
+
+    run(scenario())
+
+
+def test_get_room_waits_for_the_rooms_inflight_events(game):
+    async def scenario():
+        room_id, _ = await game.create_room()
+        release = await hold_actor(room_id)
+
+        request = asyncio.create_task(asgi_request(game.app, "GET", f"/api/rooms/{room_id}"))
+        await asyncio.sleep(0.01)
+        assert not request.done()
+        release.set()
+        status, body = await request
+        assert status == 200 and body["room_id"] == room_id
+
+    run(scenario())
+
+
+def test_room_etag_revalidation(game):
+    async def scenario():
+        room_id, sids = await game.room(players=1)
+        path = f"/api/rooms/{room_id}"
+        status, headers, body = await asgi_call(game.app, "GET", path)
+        assert status == 200 and headers["cache-control"] == "no-cache"
+        etag = headers["etag"]
+        assert etag.startswith('"') and etag.endswith('"')
+        assert b'"room_id"' in body
+
+        for if_none_match in (etag, f"W/{etag}", f'"stale", W/{etag}', "*"):
+            status, headers, body = await asgi_call(game.app, "GET", path, headers={"If-None-Match": if_none_match})
+            assert (status, headers["etag"], body) == (304, etag, b""), if_none_match
+        status, _, _ = await asgi_call(game.app, "GET", path, headers={"If-None-Match": '"stale"'})
+        assert status == 200
+
+        # Serialized once per state, whatever the number of polls
+        assert server.room_views[room_id][1] == etag
+
+        await game.engine.event(sids[0], "start_game", {})
+        status, headers, _ = await asgi_call(game.app, "GET", path, headers={"If-None-Match": etag})
+        assert status == 200 and headers["etag"] != etag
+
+        # The owner leaves the body out of its reply when the caller's copy is current
+        view = await server.room_state_for_client({"room_id": room_id, "etag": headers["etag"]})
+        assert view == {"etag": headers["etag"], "body": None}
+
+    run(scenario())
+
+
+def test_etag_matches():
+    assert server.etag_matches('"a", W/"b"', '"b"')
+    assert server.etag_matches(' W/"a" ', '"a"')
+    assert not server.etag_matches('"ab"', '"a"')
+    assert not server.etag_matches(None, '"a"') and not server.etag_matches("", '"a"')
@@ -0,0 +1,61 @@
+import asyncio
+
+import server
+from sessions import SessionIndex
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_rebinding_a_player_unbinds_its_previous_socket():
+    sessions = SessionIndex()
+    assert sessions.bind("s1", "r1", "p1") is None
+    assert sessions.bind("s2", "r1", "p1") == "s1"
+    assert sessions.get("s1") is None
+    assert sessions.sid_for("r1", "p1") == "s2"
+    assert sessions.room_sids("r1") == {"s2"}
+
+
+def test_binding_a_socket_to_another_room_leaves_the_first():
+    sessions = SessionIndex()
+    sessions.bind("s1", "r1", "p1")
+    sessions.bind("s1", "r2", "p7")
+    assert sessions.sid_for("r1", "p1") is None
+    assert sessions.room_sids("r1") == set()
+    assert sessions.get("s1").room_id == "r2"
+
+
+def test_drop_room_unbinds_every_socket():
+    sessions = SessionIndex()
+    sessions.bind("s1", "r1", "p1")
+    sessions.bind("s2", "r1", "p2")
+    sessions.bind("s3", "r2", "p1")
+    assert sorted(sessions.drop_room("r1")) == ["s1", "s2"]
+    assert len(sessions) == 1 and sessions.by_room == {"r2": {"s3"}}
+
+
+def test_disconnect_for_another_room_keeps_the_session(game):
+    async def scenario():
+        room_a, sids = await game.room(players=2)
+        room_b, _ = await game.room(players=1)
+        # Delivered for a room the socket is not bound to, e.g. by a stale route
+        await server.player_disconnected.__wrapped__(sids[1], {"room_id": room_b})
+        assert server.sessions.get(sids[1]).room_id == room_a
+        assert len(server.game_rooms[room_a].players) == 2
+
+        await server.player_disconnected(sids[1], {"room_id": room_b})
+        assert server.sessions.get(sids[1]) is None
+        assert len(server.game_rooms[room_a].players) == 1
+
+    run(scenario())
+
+
+def test_only_join_and_spectate_set_the_sockets_room(game):
+    async def scenario():
+        room_a, sids = await game.room(players=1)
+        room_b, _ = await game.room(players=1)
+        await game.engine.event(sids[0], "send_message", {"room_id": room_b, "message": "hi"})
+        assert server.shard_router.connections[sids[0]] == room_a
+
+    run(scenario())
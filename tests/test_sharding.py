@@ -0,0 +1,190 @@
+import asyncio
+
+import server
+from actors import RoomActors
+from room_store import LocalRoomStore
+from sharding import HashRing, ShardRouter
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+class RecordingStore:
+    def __init__(self):
+        self.published = []
+
+    async def publish(self, worker_id, message):
+        self.published.append((worker_id, message))
+
+
+def actor_rooms(monkeypatch):
+    """Room ids that events were run under, in order"""
+    rooms = []
+    run_job = server.room_actors.run
+
+    async def recording(room_id, job):
+        rooms.append(room_id)
+        return await run_job(room_id, job)
+
+    monkeypatch.setattr(server.room_actors, "run", recording)
+    return rooms
+
+
+def test_events_run_on_the_bound_rooms_actor(game, monkeypatch):
+    async def scenario():
+        room_a, sids_a = await game.room(players=2, start=True)
+        room_b, _ = await game.room(players=2, start=True)
+        rooms = actor_rooms(monkeypatch)
+        code = server.game_rooms[room_a].secrets["code"]
+
+        # No room id at all, then another room's id: both are room A's events
+        await game.engine.event(sids_a[0], "solve_puzzle", {"puzzle_id": "code_lock", "answer": "wrong"})
+        await game.engine.event(sids_a[0], "solve_puzzle",
+                                {"room_id": room_b, "puzzle_id": "code_lock", "answer": code})
+        assert rooms == [room_a, room_a]
+        assert server.game_rooms[room_a].is_solved("code_lock")
+        assert not server.game_rooms[room_b].is_solved("code_lock")
+
+    run(scenario())
+
+
+def test_unbound_socket_events_are_ignored(game, monkeypatch):
+    async def scenario():
+        room_id, _ = await game.room(players=2, start=True)
+        rooms = actor_rooms(monkeypatch)
+        sid = await game.engine.connect()
+        await game.engine.event(sid, "solve_puzzle", {"room_id": room_id, "puzzle_id": "code_lock",
+                                                      "answer": server.game_rooms[room_id].secrets["code"]})
+        assert rooms == []
+        assert not server.game_rooms[room_id].is_solved("code_lock")
+
+    run(scenario())
+
+
+def test_only_binding_events_record_the_connection():
+    async def scenario():
+        store = RecordingStore()
+        router = ShardRouter(store, "w1", actors=RoomActors())
+        router.ring.add("w2")
+        calls = []
+
+        @router.event(binds=True)
+        async def join_room(sid, data):
+            calls.append(("join", data["room_id"]))
+
+        @router.event
+        async def chat(sid, data):
+            calls.append(("chat", data["room_id"]))
+
+        remote = next(f"room{i}" for i in range(100) if router.owner(f"room{i}") == "w2")
+        local = next(f"room{i}" for i in range(100) if router.is_local(f"room{i}"))
+        await join_room("s1", {"room_id": local})
+        await chat("s1", {"room_id": remote})
+        assert calls == [("join", local), ("chat", local)]
+        assert router.connections == {"s1": local}
+        assert store.published == []
+
+    run(scenario())
+
+
+def test_routed_event_for_another_bound_room_is_dropped():
+    async def scenario():
+        router = ShardRouter(RecordingStore(), "w1", actors=RoomActors())
+        router.locate = {"s1": "room_a"}.get
+        calls = []
+
+        @router.event
+        async def chat(sid, data):
+            calls.append(data["room_id"])
+
+        await router._dispatch({"type": "event", "event": "chat", "sid": "s1", "data": {"room_id": "room_b"}})
+        await router._dispatch({"type": "event", "event": "chat", "sid": "s1", "data": {"room_id": "room_a"}})
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        assert calls == ["room_a"]
+
+    run(scenario())
+
+
+def test_leaving_worker_stops_heartbeating():
+    async def scenario():
+        store = LocalRoomStore()
+        router = ShardRouter(store, "w1", heartbeat_ttl=0.03, actors=RoomActors())
+        membership = asyncio.create_task(router.run_membership())
+        await asyncio.sleep(0.02)
+        assert await store.workers() == ["w1"]
+
+        await router.leave()
+        await asyncio.sleep(0.05)
+        assert await store.workers() == []
+        assert membership.done()
+
+    run(scenario())
+
+
+class DroppingStore(LocalRoomStore):
+    """Its first subscription fails like a dropped Redis connection"""
+
+    def __init__(self):
+        super().__init__()
+        self.subscriptions = 0
+
+    async def subscribe(self, worker_id):
+        self.subscriptions += 1
+        if self.subscriptions == 1:
+            raise ConnectionError("connection lost")
+        async for message in super().subscribe(worker_id):
+            yield message
+
+
+def test_listen_resubscribes_after_the_connection_drops():
+    async def scenario():
+        store = DroppingStore()
+        router = ShardRouter(store, "w1", actors=RoomActors())
+        seen = []
+
+        @router.event
+        async def chat(sid, data):
+            seen.append(data["room_id"])
+
+        listening = asyncio.create_task(router.listen())
+        await store.publish("w1", {"type": "event", "event": "chat", "sid": "s1", "data": {"room_id": "room1"}})
+        await asyncio.sleep(0.2)
+        listening.cancel()
+        assert store.subscriptions == 2
+        assert seen == ["room1"]
+
+    run(scenario())
+
+
+ROOMS = [f"room{n}" for n in range(4000)]
+
+
+def test_hash_ring_owner_is_deterministic_and_none_when_empty():
+    assert HashRing().owner("room1") is None
+    ring = HashRing(["w1", "w2", "w3"])
+    again = HashRing(["w3", "w1", "w2"])
+    assert all(ring.owner(r) == again.owner(r) for r in ROOMS)
+    for node in ("w1", "w2", "w3"):
+        ring.remove(node)
+    assert ring.owner("room1") is None
+
+
+def test_hash_ring_adding_a_node_moves_about_one_nth_only_onto_it():
+    ring = HashRing(["w1", "w2", "w3"])
+    before = {r: ring.owner(r) for r in ROOMS}
+    ring.add("w4")
+    moved = [r for r in ROOMS if ring.owner(r) != before[r]]
+    assert all(ring.owner(r) == "w4" for r in moved)
+    assert 0.15 < len(moved) / len(ROOMS) < 0.35
+
+
+def test_hash_ring_removing_a_node_moves_only_its_rooms():
+    ring = HashRing(["w1", "w2", "w3", "w4"])
+    before = {r: ring.owner(r) for r in ROOMS}
+    ring.remove("w2")
+    moved = {r for r in ROOMS if ring.owner(r) != before[r]}
+    assert moved == {r for r in ROOMS if before[r] == "w2"}
+    assert 0.15 < len(moved) / len(ROOMS) < 0.35
+    assert {ring.owner(r) for r in moved} == {"w1", "w3", "w4"}
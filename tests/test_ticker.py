@@ -0,0 +1,98 @@
+import asyncio
+
+import server
+from interest import InterestManager
+from ticker import MovementTicker
+from wire import unpack_positions
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+class RecordingSio:
+    def __init__(self):
+        self.emitted = []
+
+    async def emit(self, event, data=None, to=None, **kwargs):
+        self.emitted.append((event, data, to))
+
+
+def test_moves_within_a_tick_are_coalesced_into_one_frame_per_protocol():
+    sio = RecordingSio()
+    ticker = MovementTicker(sio, interest=InterestManager(quantum=1))
+    for x in (100, 110, 120):
+        ticker.queue("r1", "p1", {"x": x, "y": 50})
+    ticker.queue("r1", "p2", {"x": 300, "y": 300})
+    ticker.queue("r2", "p9", {"x": 5, "y": 5})
+    run(ticker.flush())
+
+    assert [(to, data) for _, data, to in sio.emitted if to.endswith(":json")] == [
+        ("r1:json", {"positions": {"p1": {"x": 120, "y": 50}, "p2": {"x": 300, "y": 300}}}),
+        ("r2:json", {"positions": {"p9": {"x": 5, "y": 5}}}),
+    ]
+    binary = {to: data for _, data, to in sio.emitted if to.endswith(":binary")}
+    assert unpack_positions(binary["r1:binary"]) == {"p1": {"x": 120, "y": 50}, "p2": {"x": 300, "y": 300}}
+    assert ticker.pending == {}
+
+    # Nothing queued, nothing sent; a repeated position is not re-sent either
+    sio.emitted.clear()
+    run(ticker.flush())
+    ticker.queue("r1", "p1", {"x": 120, "y": 50})
+    run(ticker.flush())
+    assert sio.emitted == []
+
+
+def test_discarded_rooms_and_players_get_no_more_ticks():
+    sio = RecordingSio()
+    ticker = MovementTicker(sio, protocols=("json",), interest=InterestManager(quantum=1))
+    ticker.queue("r1", "p1", {"x": 1, "y": 1})
+    ticker.queue("r1", "p2", {"x": 2, "y": 2})
+    ticker.discard("r1", "p2")
+    run(ticker.flush())
+    assert sio.emitted == [("players_moved", {"positions": {"p1": {"x": 1, "y": 1}}}, "r1:json")]
+
+    sio.emitted.clear()
+    ticker.queue("r1", "p1", {"x": 5, "y": 5})
+    ticker.discard("r1")
+    run(ticker.flush())
+    assert sio.emitted == [] and ticker.pending == {}
+    assert "r1" not in ticker.interest.last_sent
+
+
+def test_the_tick_loop_flushes_at_its_rate_and_on_stop():
+    sio = RecordingSio()
+    ticker = MovementTicker(sio, tick_rate=100, protocols=("json",), interest=InterestManager(quantum=1))
+
+    async def scenario():
+        ticker.start()
+        ticker.queue("r1", "p1", {"x": 1, "y": 1})
+        await asyncio.sleep(0.05)
+        assert len(sio.emitted) == 1
+        # stop() sends what the loop had not got to yet
+        ticker.queue("r1", "p1", {"x": 2, "y": 2})
+        await ticker.stop()
+        assert ticker._task is None and len(sio.emitted) == 2
+
+    run(scenario())
+
+
+def test_emptied_and_evicted_rooms_leave_nothing_in_the_ticker(game):
+    async def scenario():
+        room_id, sids = await game.room(players=2)
+        host, guest = sids
+        await game.engine.event(guest, "player_move", {"position": {"x": 420, "y": 310}})
+        assert room_id in server.movement_ticker.pending
+        # In the lobby, leaving removes the player and its queued move
+        await server.disconnect(guest)
+        assert server.movement_ticker.pending[room_id] == {}
+
+        await game.engine.event(host, "player_move", {"position": {"x": 390, "y": 290}})
+        await server.movement_ticker.flush()
+        assert room_id in server.movement_ticker.interest.last_sent
+        await game.engine.event(host, "player_move", {"position": {"x": 380, "y": 280}})
+        await server.room_actors.run(room_id, lambda: server.evict_room(room_id, "lru"))
+        assert room_id not in server.movement_ticker.pending
+        assert room_id not in server.movement_ticker.interest.last_sent
+
+    run(scenario())
@@ -0,0 +1,41 @@
+import struct
+
+import pytest
+
+from wire import negotiate_protocol, pack_positions, unpack_positions
+
+
+def test_positions_round_trip_through_float32():
+    positions = {"p1": {"x": 400, "y": 300}, "ñandú-玩家": {"x": 0.1, "y": -12.345678}}
+    unpacked = unpack_positions(pack_positions(positions))
+    assert list(unpacked) == list(positions)
+    assert unpacked["p1"] == {"x": 400.0, "y": 300.0}
+    # Coordinates come back as the nearest float32, not the original double
+    x, y = unpacked["ñandú-玩家"].values()
+    assert (x, y) == struct.unpack("<ff", struct.pack("<ff", 0.1, -12.345678))
+    assert x != 0.1 and x == pytest.approx(0.1, rel=1e-7)
+
+
+def test_id_lengths_are_counted_in_utf8_bytes():
+    longest = "é" * 127 + "a"  # 255 bytes
+    assert list(unpack_positions(pack_positions({longest: {"x": 1, "y": 2}}))) == [longest]
+    with pytest.raises(ValueError):
+        pack_positions({"é" * 128: {"x": 1, "y": 2}})
+    with pytest.raises(ValueError):
+        pack_positions({"a" * 256: {"x": 1, "y": 2}})
+    assert pack_positions({}) == b"" and unpack_positions(b"") == {}
+
+
+def test_truncated_frames_are_rejected():
+    frame = pack_positions({"p1": {"x": 1, "y": 2}, "p2": {"x": 3, "y": 4}})
+    for cut in (1, 3, 5, len(frame) - 1):
+        with pytest.raises(ValueError):
+            unpack_positions(frame[:-cut])
+    assert unpack_positions(frame[:len(frame) // 2]) == {"p1": {"x": 1, "y": 2}}
+
+
+def test_protocol_negotiation_falls_back_to_json():
+    assert negotiate_protocol({"QUERY_STRING": "EIO=4&protocol=binary"}) == "binary"
+    assert negotiate_protocol({"QUERY_STRING": "protocol=binary"}, enabled=("json",)) == "json"
+    assert negotiate_protocol({"QUERY_STRING": "protocol=xml"}) == "json"
+    assert negotiate_protocol({}) == "json"